@@ -1,39 +1,35 @@
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer
 from pydantic import BaseModel
 from typing import List
 from dotenv import load_dotenv
 import logging
-from routes import todos, habits, analytics, smart, ai_agents
+from routes import todos, habits, analytics, smart, ai_agents, documents
 # from routes import google_calendar  # Commenté temporairement
 from datetime import datetime
 from passlib.context import CryptContext
-from prometheus_client import Counter, Histogram
-import time
-import sentry_sdk
-from supabase_service import add_task
-
-# Configuration de Sentry
-sentry_sdk.init(
-    dsn=os.getenv("SENTRY_DSN"),
-    traces_sample_rate=1.0,
-    environment=os.getenv("ENVIRONMENT", "production")
-)
-
-# Configuration du logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+from services.supabase_service import supabase_service
+from services.container import container
+from services.monitoring import init_sentry
+from services.llm_gateway import llm_gateway
+from services.request_cache import request_scope
+from services.embedding_cache import embedding_cache
+from services.metrics import PrometheusMiddleware, mark_worker_exit, prepare_multiprocess_dir, render_metrics
+from services.logging_config import LogContextMiddleware, configure_logging
+from services.static_files import static_manifest
+from services.vector_index import vector_index
+from services.lexical_index import lexical_index
+
+# Configuration du logging (file d'attente et thread d'écriture, voir services/logging_config.py)
+configure_logging()
 logger = logging.getLogger(__name__)
 
-# Métriques Prometheus
-REQUEST_COUNT = Counter('http_requests_total', 'Total des requêtes HTTP', ['method', 'endpoint', 'status'])
-REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'Latence des requêtes HTTP')
+# Configuration de Sentry (avant la création de l'application et de ses routes)
+init_sentry()
 
 # Configuration de sécurité
 SECRET_KEY = os.getenv("SECRET_KEY", "votre_clé_secrète")
@@ -46,6 +42,24 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 # Chargement des variables d'environnement depuis le fichier .env
 load_dotenv()
 
+# Cycle de vie de l'application: les clients (Supabase, OpenAI, Redis, encodeurs) sont créés au
+# premier usage dans chaque worker; au démarrage, le manifeste des fichiers du frontend est
+# construit et les index de documents activés sont chargés (puis synchronisés en tâche de fond);
+# à l'arrêt, les ressources créées sont fermées et le cache d'embeddings est écrit sur disque
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    static_manifest.load()
+    document_indexes = [index for index in (vector_index, lexical_index) if index.enabled]
+    for index in document_indexes:
+        await index.start()
+    yield
+    for index in document_indexes:
+        await index.stop()
+    await container.aclose()
+    await llm_gateway.aclose()
+    embedding_cache.flush()
+    mark_worker_exit()
+
 # Création de l'application FastAPI
 app = FastAPI(
     title="Tasky API",
@@ -53,7 +67,8 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/api/docs",
     redoc_url="/api/redoc",
-    openapi_url="/api/openapi.json"
+    openapi_url="/api/openapi.json",
+    lifespan=lifespan
 )
 
 # Configuration CORS
@@ -65,19 +80,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Middleware pour les métriques
+# Middleware de mémoïsation des appels de service pendant une requête
 @app.middleware("http")
-async def metrics_middleware(request: Request, call_next):
-    start_time = time.time()
-    response = await call_next(request)
-    duration = time.time() - start_time
-    REQUEST_COUNT.labels(
-        method=request.method,
-        endpoint=request.url.path,
-        status=response.status_code
-    ).inc()
-    REQUEST_LATENCY.observe(duration)
-    return response
+async def request_cache_middleware(request: Request, call_next):
+    with request_scope():
+        return await call_next(request)
+
+# Contexte de journalisation de la requête (identifiant, échantillonnage des journaux)
+app.add_middleware(LogContextMiddleware)
+
+# Middleware pour les métriques (ajouté en dernier: il englobe les autres middlewares)
+app.add_middleware(PrometheusMiddleware)
 
 # Modèles Pydantic
 class TaskBase(BaseModel):
@@ -101,7 +114,11 @@ class Task(TaskBase):
 
 # Routes de base
 @app.get("/")
-async def root():
+async def root(request: Request):
+    # Page d'accueil de la SPA si le frontend est construit
+    response = static_manifest.response("", request.headers)
+    if response is not None:
+        return response
     return {"message": "Bienvenue sur l'API Tasky"}
 
 @app.get("/health")
@@ -112,6 +129,13 @@ async def health_check():
         "version": "1.0.0"
     }
 
+# Exposition des métriques Prometheus (fonction synchrone: la lecture des fichiers
+# multiprocessus se fait dans le pool de threads)
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
+
 # Routes des tâches
 @app.post("/api/tasks", response_model=Task)
 async def create_task(task: TaskCreate):
@@ -119,7 +143,7 @@ async def create_task(task: TaskCreate):
         task_data = task.dict()
         if "user_id" not in task_data:
             task_data["user_id"] = "test_user"
-        created_task = add_task(task_data)
+        created_task = await supabase_service.create_task(task_data)
         if not created_task:
             raise HTTPException(status_code=500, detail="Erreur lors de la création de la tâche")
         return created_task
@@ -133,41 +157,29 @@ app.include_router(habits.router, prefix="/api", tags=["Habits"])
 app.include_router(analytics.router, prefix="/api", tags=["Analytics"])
 app.include_router(smart.router, prefix="/api", tags=["SMART"])
 app.include_router(ai_agents.router, prefix="/api", tags=["AI Agents"])
+app.include_router(documents.router, prefix="/api", tags=["Documents"])
 # app.include_router(google_calendar.router)  # Commenté temporairement
 
-# Montage des fichiers statiques de Vite
-vite_dist_path = os.path.abspath("../frontend/dist")
-if os.path.exists(f"{vite_dist_path}/assets"):
-    app.mount("/assets", StaticFiles(directory=f"{vite_dist_path}/assets"), name="assets")
-    logger.info(f"Fichiers statiques montés depuis {vite_dist_path}/assets")
-else:
-    logger.warning(f"Dossier {vite_dist_path}/assets non trouvé. Les fichiers statiques ne seront pas servis.")
-
-# Route par défaut pour servir l'application React (doit être la dernière route)
+# Route par défaut pour servir l'application React et ses fichiers statiques (doit être la dernière route)
+# depuis le manifeste en mémoire du build Vite (services/static_files.py)
 @app.get("/{path:path}")
-async def serve_react(path: str = ""):
+async def serve_react(request: Request, path: str = ""):
     """Sert l'application React ou les fichiers statiques"""
     # Ne pas traiter les routes /api ici
     if path.startswith("api"):
         return {"detail": "Not Found"}
-        
-    # Vérifier d'abord dans le dossier dist (Vite)
-    vite_path = os.path.join(vite_dist_path, path)
-    if os.path.isfile(vite_path):
-        return FileResponse(vite_path)
-    
-    # Si le chemin n'existe pas, servir index.html pour permettre le routage côté client
-    # D'abord vérifier dans dist
-    index_path = os.path.join(vite_dist_path, "index.html")
-    if os.path.isfile(index_path):
-        return FileResponse(index_path)
-    
+
+    response = static_manifest.response(path, request.headers)
+    if response is not None:
+        return response
+
     # Si aucun index.html n'existe, retourner un message
     return {"message": "L'application frontend n'est pas encore construite. Exécutez `npm run build` dans le dossier frontend."}
 
 # Point d'entrée pour Uvicorn
 if __name__ == "__main__":
     import uvicorn
+    prepare_multiprocess_dir()
     uvicorn.run(
         "app_fastapi:app",
         host="0.0.0.0",
@@ -1,20 +1,26 @@
 """
 Routes pour les agents IA, conversations et messages.
 """
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
 from typing import Dict, Any, Optional
 import logging
 import uuid
 import os
+import json
+import time
+import asyncio
 from datetime import datetime
+import anyio
 from pydantic import BaseModel
-from openai import OpenAI
 
 from services.supabase_service import supabase_service
-from services.llm_service import generate_response
+from services.llm_service import generate_response, stream_response
+from services.context_builder import CONTEXT_FETCH_LIMIT, unsummarized_messages, schedule_summary_refresh
+from services.pagination import encode_cursor, decode_cursor
+from services.llm_gateway import llm_gateway
 
 # Configuration du logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
@@ -174,113 +180,235 @@ async def delete_conversation(conversation_id: str):
     return {"success": True, "message": f"Conversation {conversation_id} supprimée avec succès"}
 
 # Routes pour les messages
-@router.post("/messages", tags=["AI Agents"])
-async def add_message(data: Dict[str, Any]):
-    """Ajoute un nouveau message et génère une réponse"""
-    if "conversation_id" not in data or "content" not in data:
-        raise HTTPException(status_code=400, detail="Les champs 'conversation_id' et 'content' sont requis")
-    
-    # Récupérer le modèle à utiliser (optionnel)
-    model = data.get("model", os.environ.get("MODEL_OPENAI", "gpt-3.5-turbo"))
+def resolve_model(requested: Optional[str]) -> str:
+    """Retourne le modèle demandé s'il est valide, sinon le modèle par défaut"""
+    default_model = os.environ.get("MODEL_OPENAI", "gpt-3.5-turbo")
+    model = requested or default_model
     
     # Vérifier que le modèle est valide
     valid_models = [m["id"] for m in AVAILABLE_MODELS]
     if model not in valid_models:
         logger.warning(f"Modèle {model} non valide, utilisation du modèle par défaut")
-        model = os.environ.get("MODEL_OPENAI", "gpt-3.5-turbo")
+        model = default_model
+    return model
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Formate un événement Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+def new_message(conversation_id: str, role: str, content: str) -> Dict[str, Any]:
+    """Construit un message (identifiant et date fixés côté serveur, avant l'enregistrement)"""
+    return {
+        "id": str(uuid.uuid4()),
+        "conversation_id": conversation_id,
+        "role": role,
+        "content": content,
+        "created_at": datetime.now().isoformat()
+    }
+
+async def load_message_context(conversation_id: str):
+    """
+    Charge en parallèle la conversation avec son agent (une seule requête jointe)
+    et les derniers messages pas encore intégrés au résumé, utilisés comme contexte.
     
-    # Vérifier que la conversation existe
-    conversation = await supabase_service.get_conversation_by_id(data["conversation_id"])
+    Returns:
+        (conversation, agent, conversation_history)
+    """
+    (conversation, agent), conversation_history = await asyncio.gather(
+        supabase_service.get_conversation_with_agent(conversation_id),
+        supabase_service.get_recent_messages(conversation_id, limit=CONTEXT_FETCH_LIMIT)
+    )
     if not conversation:
-        raise HTTPException(status_code=404, detail=f"Conversation {data['conversation_id']} non trouvée")
-    
-    # Récupérer l'agent associé à la conversation
-    agent = await supabase_service.get_agent_by_id(conversation["agent_id"])
+        raise HTTPException(status_code=404, detail=f"Conversation {conversation_id} non trouvée")
     if not agent:
         raise HTTPException(status_code=404, detail=f"Agent {conversation['agent_id']} non trouvé")
+    return conversation, agent, unsummarized_messages(conversation_history, conversation.get("summarized_until"))
+
+@router.post("/messages", tags=["AI Agents"])
+async def add_message(data: Dict[str, Any]):
+    """
+    Ajoute un nouveau message et génère une réponse.
+    La conversation, l'agent et l'historique sont chargés en parallèle; le message utilisateur est
+    enregistré pendant la génération de la réponse, puis la réponse de l'agent est enregistrée seule.
+    """
+    if "conversation_id" not in data or "content" not in data:
+        raise HTTPException(status_code=400, detail="Les champs 'conversation_id' et 'content' sont requis")
     
-    # Créer le message utilisateur
-    user_message = {
-        "id": str(uuid.uuid4()),
-        "conversation_id": data["conversation_id"],
-        "role": "user",
-        "content": data["content"],
-        "created_at": datetime.now().isoformat()
-    }
+    # Récupérer le modèle à utiliser (optionnel)
+    model = resolve_model(data.get("model"))
     
-    # Enregistrer le message utilisateur
-    saved_user_message = await supabase_service.add_message(user_message)
-    if not saved_user_message:
-        raise HTTPException(status_code=500, detail="Erreur lors de l'enregistrement du message utilisateur")
+    start_time = time.perf_counter()
+    conversation, agent, conversation_history = await load_message_context(data["conversation_id"])
+    context_time = time.perf_counter()
     
-    # Récupérer l'historique de la conversation pour le contexte
-    conversation_history = await supabase_service.get_messages_by_conversation(data["conversation_id"])
+    user_message = new_message(data["conversation_id"], "user", data["content"])
     
-    try:
-        # Générer une réponse avec le modèle d'IA en utilisant le prompt de l'agent
+    async def generate():
         logger.info(f"Génération de réponse avec le modèle: {model}")
-        agent_response = generate_response(
+        return await generate_response(
             user_message=data["content"],
             conversation_history=conversation_history,
             agent_prompt=agent["prompt"],
-            model=model
+            model=model,
+            summary=conversation.get("summary")
         )
-        
-        # Créer le message de réponse de l'agent
-        assistant_message = {
-            "id": str(uuid.uuid4()),
-            "conversation_id": data["conversation_id"],
-            "role": "assistant",
-            "content": agent_response,
-            "created_at": datetime.now().isoformat()
-        }
-        
-        # Enregistrer la réponse de l'agent
-        saved_assistant_message = await supabase_service.add_message(assistant_message)
-        if not saved_assistant_message:
-            raise HTTPException(status_code=500, detail="Erreur lors de l'enregistrement de la réponse de l'agent")
-        
+    
+    # Enregistrer le message utilisateur pendant l'appel au modèle
+    saved_user, agent_response = await asyncio.gather(
+        supabase_service.add_messages([user_message]),
+        generate(),
+        return_exceptions=True
+    )
+    llm_time = time.perf_counter()
+    
+    failed = isinstance(agent_response, Exception)
+    if failed:
+        logger.error(f"Erreur lors de la génération de la réponse: {str(agent_response)}")
+        # En cas d'erreur, enregistrer une réponse de secours simple
+        agent_response = (
+            f"Désolé, je n'ai pas pu traiter votre demande en raison d'une erreur technique. Erreur: {str(agent_response)}"
+        )
+
+    # Réponse de l'agent enregistrée seule; le message utilisateur l'accompagne si sa propre écriture a échoué
+    assistant_message = new_message(data["conversation_id"], "assistant", agent_response)
+    user_saved = not isinstance(saved_user, Exception) and len(saved_user) == 1
+    to_save = [assistant_message] if user_saved else [user_message, assistant_message]
+    saved_messages = await supabase_service.add_messages(to_save)
+    if len(saved_messages) != len(to_save):
+        if not failed:
+            raise HTTPException(status_code=500, detail="Erreur lors de l'enregistrement de la réponse")
+        saved_messages = to_save
+    if user_saved:
+        saved_messages = [saved_user[0], *saved_messages]
+    
+    if failed:
         return {
-            "user_message": saved_user_message,
-            "assistant_message": saved_assistant_message,
-            "model_used": model
+            "user_message": saved_messages[0],
+            "assistant_message": saved_messages[1]
         }
     
-    except Exception as e:
-        logger.error(f"Erreur lors de la génération de la réponse: {str(e)}")
-        # En cas d'erreur, générer une réponse de secours simple
+    # Intégrer au résumé les messages sortis de la fenêtre récente (en tâche de fond)
+    schedule_summary_refresh(conversation)
+    
+    logger.info(
+        f"Message traité pour la conversation {data['conversation_id']}: "
+        f"contexte {(context_time - start_time) * 1000:.0f} ms, "
+        f"LLM {(llm_time - context_time) * 1000:.0f} ms, "
+        f"enregistrement {(time.perf_counter() - llm_time) * 1000:.0f} ms"
+    )
+    
+    return {
+        "user_message": saved_messages[0],
+        "assistant_message": saved_messages[1],
+        "model_used": model
+    }
+
+@router.post("/messages/stream", tags=["AI Agents"])
+async def add_message_stream(data: Dict[str, Any]):
+    """
+    Ajoute un nouveau message et transmet la réponse de l'agent au fil de sa génération (Server-Sent Events).
+    
+    Événements émis:
+    - start: message utilisateur et modèle utilisé (envoyé immédiatement)
+    - delta: fragment de texte de la réponse
+    - done: message de l'agent, enregistré avec le message utilisateur une fois le flux terminé
+    - error: erreur pendant la génération (le texte déjà reçu, ou un message de secours, est enregistré)
+    Si le client se déconnecte, le message utilisateur et la réponse partielle sont enregistrés.
+    """
+    if "conversation_id" not in data or "content" not in data:
+        raise HTTPException(status_code=400, detail="Les champs 'conversation_id' et 'content' sont requis")
+    
+    model = resolve_model(data.get("model"))
+    
+    # Vérifier que la conversation et l'agent existent avant d'ouvrir le flux
+    conversation, agent, conversation_history = await load_message_context(data["conversation_id"])
+    user_message = new_message(data["conversation_id"], "user", data["content"])
+    
+    async def save_messages(messages):
+        # L'enregistrement ne doit pas être interrompu par la déconnexion du client
+        with anyio.CancelScope(shield=True):
+            saved = await supabase_service.add_messages(messages)
+        return saved if len(saved) == len(messages) else messages
+    
+    async def event_stream():
+        parts = []
+        completed = False
         try:
-            fallback_content = f"Désolé, je n'ai pas pu traiter votre demande en raison d'une erreur technique. Erreur: {str(e)}"
+            yield sse_event("start", {"user_message": user_message, "model_used": model})
             
-            # Créer un message de réponse de secours
-            fallback_message = {
-                "id": str(uuid.uuid4()),
-                "conversation_id": data["conversation_id"],
-                "role": "assistant",
-                "content": fallback_content,
-                "created_at": datetime.now().isoformat()
-            }
+            logger.info(f"Génération de réponse en streaming avec le modèle: {model}")
+            async for delta in stream_response(
+                user_message=data["content"],
+                conversation_history=conversation_history,
+                agent_prompt=agent["prompt"],
+                model=model,
+                summary=conversation.get("summary")
+            ):
+                parts.append(delta)
+                yield sse_event("delta", {"content": delta})
             
-            # Enregistrer la réponse de secours
-            saved_fallback = await supabase_service.add_message(fallback_message)
-            
-            return {
-                "user_message": saved_user_message,
-                "assistant_message": saved_fallback or fallback_message
-            }
-        except Exception as inner_e:
-            logger.error(f"Erreur lors de la génération de la réponse de secours: {str(inner_e)}")
-            raise HTTPException(status_code=500, detail="Erreur critique lors du traitement de la demande")
+            completed = True
+            saved_messages = await save_messages(
+                [user_message, new_message(data["conversation_id"], "assistant", "".join(parts))]
+            )
+            schedule_summary_refresh(conversation)
+            yield sse_event("done", {"assistant_message": saved_messages[1], "model_used": model})
+        except Exception as e:
+            logger.error(f"Erreur lors de la génération de la réponse en streaming: {str(e)}")
+            completed = True
+            content = "".join(parts) or (
+                f"Désolé, je n'ai pas pu traiter votre demande en raison d'une erreur technique. Erreur: {str(e)}"
+            )
+            saved_messages = await save_messages(
+                [user_message, new_message(data["conversation_id"], "assistant", content)]
+            )
+            yield sse_event("error", {"detail": str(e), "assistant_message": saved_messages[1]})
+        finally:
+            # Déconnexion du client: conserver le message utilisateur et la réponse partielle
+            if not completed:
+                logger.info(f"Client déconnecté, enregistrement de la réponse partielle ({len(parts)} fragments)")
+                messages = [user_message]
+                if parts:
+                    messages.append(new_message(data["conversation_id"], "assistant", "".join(parts)))
+                await save_messages(messages)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @router.get("/messages/conversation/{conversation_id}", tags=["AI Agents"])
-async def get_conversation_messages(conversation_id: str):
-    """Récupère tous les messages d'une conversation"""
+async def get_conversation_messages(
+    conversation_id: str,
+    limit: int = Query(50, ge=1, le=500, description="Nombre maximum de messages par page"),
+    cursor: Optional[str] = Query(None, description="Curseur vers les messages plus anciens (next_cursor)")
+):
+    """
+    Récupère les messages d'une conversation par pages, des plus récents aux plus anciens.
+    Chaque page est renvoyée dans l'ordre chronologique; next_cursor permet de charger les messages précédents.
+    """
+    try:
+        decoded_cursor = decode_cursor(cursor, key_types={"created_at": str, "id": str}) if cursor else None
+        if decoded_cursor:
+            uuid.UUID(str(decoded_cursor["id"]))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Curseur invalide")
+    
     conversation = await supabase_service.get_conversation_by_id(conversation_id)
     if not conversation:
         raise HTTPException(status_code=404, detail=f"Conversation {conversation_id} non trouvée")
     
-    messages = await supabase_service.get_messages_by_conversation(conversation_id)
-    return {"messages": messages}
+    try:
+        messages, next_cursor = await supabase_service.get_messages_page(conversation_id, limit=limit, cursor=decoded_cursor)
+    except Exception as e:
+        logger.error(f"Erreur lors de la récupération des messages de la conversation {conversation_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Erreur interne: {str(e)}")
+    
+    return {
+        "messages": messages,
+        "next_cursor": encode_cursor(next_cursor) if next_cursor else None
+    }
 
 # Nouvelle route pour la génération de tâches IA
 @router.post("/generate-tasks", tags=["AI Agents"])
@@ -300,9 +428,7 @@ async def generate_smart_tasks(request: TaskGenerationRequest):
         }
         
         # Utiliser OpenAI pour générer des tâches SMART
-        client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-        
-        response = client.chat.completions.create(
+        response = await llm_gateway.chat_completion(
             model=request.model,
             messages=[
                 {"role": "system", "content": """Tu es un assistant de productivité qui génère des tâches SMART.
@@ -359,9 +485,7 @@ async def recommend_next_task(request: TaskRecommendationRequest):
         pending_tasks = await supabase_service.get_user_pending_tasks(request.user_id)
         
         # Utiliser OpenAI pour recommander la prochaine tâche
-        client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-        
-        response = client.chat.completions.create(
+        response = await llm_gateway.chat_completion(
             model=request.model,
             messages=[
                 {"role": "system", "content": """Tu es un assistant de productivité qui recommande la prochaine tâche à faire.
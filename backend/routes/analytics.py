@@ -5,8 +5,9 @@ from fastapi import APIRouter
 import json
 import os
 import logging
-from openai import OpenAI
 from services.supabase_service import supabase_service
+from services.llm_gateway import llm_gateway
+from services.cache import get_response_cache, llm_cache_inputs
 
 
 # Configuration du logging
@@ -15,6 +16,10 @@ logger = logging.getLogger(__name__)
 # Création du router
 router = APIRouter(tags=["analytics"])
 
+# Réponses du LLM mises en cache (clé: empreinte du modèle et du prompt, données incluses)
+WEEKLY_REVIEW_CACHE_TTL = 24 * 3600
+weekly_review_cache = get_response_cache("weekly_review", ttl=WEEKLY_REVIEW_CACHE_TTL)
+
 
 # API pour obtenir une revue hebdomadaire
 @router.get("/weekly-review")
@@ -43,32 +48,33 @@ async def get_weekly_review():
         # Récupérer les objectifs SMART
         smart_objectives = await supabase_service.get_smart_objectives()
         
-        # Utiliser OpenAI pour générer un résumé
-        client = OpenAI(
-            api_key=os.environ.get("OPENAI_API_KEY"),
-        )
-        
-        response = client.chat.completions.create(
-            model=os.environ.get("MODEL_OPENAI", "gpt-4o-mini"),
-            messages=[
-                {"role": "system", "content": f"""Tu es un coach en productivité qui analyse les données de tâches d'un utilisateur.
-                
-                Voici les statistiques de l'utilisateur pour cette semaine:
-                {json.dumps(stats, ensure_ascii=False, indent=2)}
-                
-                Génère une analyse personnalisée en français avec:
-                - Une évaluation des performances de la semaine
-                - Identification des points forts
-                - Suggestion d'amélioration pour la semaine prochaine
-                - Un ton encourageant et motivant
-                
-                Réponds en texte simple, sans formatage JSON.
-                """}
-            ],
-            temperature=0.7,
-        )
-        
-        message = response.choices[0].message.content.strip()
+        # Utiliser OpenAI pour générer un résumé (mis en cache tant que les statistiques ne changent pas)
+        model = os.environ.get("MODEL_OPENAI", "gpt-4o-mini")
+        messages = [
+            {"role": "system", "content": f"""Tu es un coach en productivité qui analyse les données de tâches d'un utilisateur.
+            
+            Voici les statistiques de l'utilisateur pour cette semaine:
+            {json.dumps(stats, ensure_ascii=False, indent=2)}
+            
+            Génère une analyse personnalisée en français avec:
+            - Une évaluation des performances de la semaine
+            - Identification des points forts
+            - Suggestion d'amélioration pour la semaine prochaine
+            - Un ton encourageant et motivant
+            
+            Réponds en texte simple, sans formatage JSON.
+            """}
+        ]
+        cache_inputs = llm_cache_inputs(model, messages, temperature=0.7)
+        message = await weekly_review_cache.get(cache_inputs)
+        if message is None:
+            response = await llm_gateway.chat_completion(
+                model=model,
+                messages=messages,
+                temperature=0.7,
+            )
+            message = response.choices[0].message.content.strip()
+            await weekly_review_cache.set(cache_inputs, message)
         
         return {
             "message": message,
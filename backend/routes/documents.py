@@ -0,0 +1,82 @@
+"""
+Routes pour l'ingestion des documents (base de connaissances des agents)
+"""
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form
+from fastapi.responses import JSONResponse
+from typing import Optional
+import os
+import json
+import asyncio
+import logging
+import tempfile
+from services.supabase_service import supabase_service
+from services.document_ingestion import document_ingestion_service, copy_and_hash, IngestionInProgress
+
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+
+# Création du router
+router = APIRouter(tags=["documents"])
+
+
+# API pour ingérer un document texte
+@router.post("/documents/ingest", status_code=202)
+async def ingest_document(
+    file: UploadFile = File(..., description="Fichier texte (UTF-8)"),
+    document_id: Optional[str] = Form(None, description="Identifiant stable du document (par défaut: empreinte du fichier)"),
+    metadata: Optional[str] = Form(None, description="Métadonnées JSON ajoutées à chaque chunk"),
+    user_id: Optional[str] = Form(None, description="ID de l'utilisateur"),
+):
+    """
+    Lance l'ingestion d'un document en tâche de fond (découpage, embeddings, écriture par pages)
+    et retourne sa progression. Renvoyer le même fichier reprend une ingestion interrompue.
+    """
+    try:
+        extra_metadata = json.loads(metadata) if metadata else {}
+        if not isinstance(extra_metadata, dict):
+            raise ValueError("les métadonnées doivent être un objet JSON")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Métadonnées invalides: {str(e)}")
+
+    # Copie du fichier (il est fermé à la fin de la requête) et empreinte de son contenu
+    fd, path = tempfile.mkstemp(prefix="ingestion-", suffix=".txt")
+    os.close(fd)
+    try:
+        source_hash = await asyncio.to_thread(copy_and_hash, file.file, path)
+        ingestion = await document_ingestion_service.prepare(
+            document_id or source_hash,
+            source_hash,
+            filename=file.filename,
+            metadata=extra_metadata,
+            user_id=user_id,
+        )
+    except IngestionInProgress:
+        os.remove(path)
+        raise HTTPException(status_code=409, detail="Une ingestion de ce document est déjà en cours")
+    except Exception as e:
+        os.remove(path)
+        logger.error(f"Erreur lors de la préparation de l'ingestion: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Erreur interne: {str(e)}")
+
+    if ingestion["status"] == "completed":
+        os.remove(path)
+        return JSONResponse(status_code=200, content={"ingestion": ingestion})
+
+    document_ingestion_service.start(ingestion, path)
+    return {"ingestion": ingestion}
+
+
+# API pour suivre la progression d'une ingestion
+@router.get("/documents/ingestions/{document_key}")
+async def get_ingestion(document_key: str):
+    """Retourne la progression de l'ingestion d'un document"""
+    try:
+        ingestion = await supabase_service.get_document_ingestion(document_key)
+    except Exception as e:
+        logger.error(f"Erreur lors de la récupération de l'ingestion: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Erreur interne: {str(e)}")
+    if not ingestion:
+        raise HTTPException(status_code=404, detail="Ingestion non trouvée")
+    return {"ingestion": ingestion}
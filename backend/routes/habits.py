@@ -179,28 +179,12 @@ async def get_habit_streak(
 # Nouvelle route pour obtenir un rapport hebdomadaire des habitudes
 @router.get("/habits/weekly-report")
 async def get_weekly_habit_report(
-    user_id: str = Query(..., description="ID de l'utilisateur")
+    user_id: str = Query(..., description="ID de l'utilisateur"),
+    refresh: bool = Query(False, description="Régénérer le rapport même s'il est en cache pour la semaine")
 ):
-    """Génère un rapport hebdomadaire personnalisé des habitudes"""
+    """Génère un rapport hebdomadaire personnalisé des habitudes (mis en cache par semaine ISO)"""
     try:
-        # Récupérer les statistiques de la semaine
-        weekly_stats = await habits_service.get_detailed_habit_stats(user_id, "week")
-        
-        # Récupérer les habitudes qui ont besoin d'attention
-        habits_needing_attention = await habits_service.get_habits_needing_attention(user_id)
-        
-        # Générer un rapport personnalisé avec l'IA
-        report = await habits_service.generate_weekly_report(
-            user_id=user_id,
-            weekly_stats=weekly_stats,
-            habits_needing_attention=habits_needing_attention
-        )
-        
-        return {
-            "weekly_stats": weekly_stats,
-            "habits_needing_attention": habits_needing_attention,
-            "report": report
-        }
+        return await habits_service.get_weekly_report(user_id, refresh=refresh)
     except Exception as e:
         logger.error(f"Erreur lors de la génération du rapport hebdomadaire: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erreur interne: {str(e)}")
@@ -215,18 +199,18 @@ async def complete_habit(
 ):
     """Marque une habitude comme complétée pour aujourd'hui et met à jour son streak"""
     try:
-        completion = await habits_service.complete_habit(habit_id, user_id, notes)
-        if not completion:
+        # La complétion met à jour le streak de façon incrémentale
+        result = await habits_service.complete_habit(habit_id, user_id, notes)
+        if not result:
             raise HTTPException(status_code=404, detail=f"Habitude {habit_id} non trouvée")
         
-        # Calculer le nouveau streak
-        streak = await habits_service.calculate_habit_streak(habit_id, user_id)
-        
         return {
-            "completion": completion,
-            "streak": streak,
+            "completion": result["completion"],
+            "streak": result["streak"],
             "message": "Habitude complétée avec succès"
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Erreur lors de la complétion de l'habitude {habit_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erreur interne: {str(e)}")
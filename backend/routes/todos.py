@@ -7,8 +7,10 @@ import json
 import os
 import logging
 import re
-from openai import OpenAI
 from services.supabase_service import supabase_service
+from services.llm_gateway import llm_gateway
+from services.pagination import encode_cursor, decode_cursor
+from services.cache import get_response_cache, llm_cache_inputs
 from pydantic import BaseModel
 
 # Configuration du logging
@@ -17,6 +19,12 @@ logger = logging.getLogger(__name__)
 # Création du router
 router = APIRouter(tags=["tasks"])
 
+# Réponses du LLM mises en cache (clé: empreinte du modèle et du prompt, données incluses)
+RECOMMENDATIONS_CACHE_TTL = 15 * 60
+WEEKLY_REVIEW_CACHE_TTL = 24 * 3600
+recommendations_cache = get_response_cache("recommendations", ttl=RECOMMENDATIONS_CACHE_TTL)
+weekly_review_cache = get_response_cache("weekly_review", ttl=WEEKLY_REVIEW_CACHE_TTL)
+
 # Modèles Pydantic pour la validation des données
 class TaskBase(BaseModel):
     title: str
@@ -77,41 +85,77 @@ async def get_categories():
 @router.get("/tasks-all")
 async def get_all_tasks_test():
     try:
-        logger.info("🔄 Route test /tasks-all")
         tasks = await supabase_service.get_all_tasks()
-        logger.info(f"✅ Récupéré {len(tasks)} tâches")
+        logger.info("GET /api/tasks-all: %d tâches", len(tasks))
         return {"tasks": tasks}
     except Exception as e:
-        logger.error(f"❌ Erreur: {str(e)}")
-        import traceback
-        logger.error(f"❌ Traceback: {traceback.format_exc()}")
+        logger.exception("Erreur GET /api/tasks-all: %s", e)
         raise HTTPException(status_code=500, detail=f"Erreur interne: {str(e)}")
 
-# API pour récupérer toutes les tâches
+# Colonnes de la table tasks pouvant être demandées via le paramètre fields
+TASK_FIELDS = {
+    "id", "title", "text", "theme", "hashtags", "eisenhower", "estimated_time",
+    "deadline", "category", "priority", "completed", "user_id", "created_at", "updated_at"
+}
+
+# Taille des pages sans limit explicite
+TASKS_PAGE_SIZE = 100
+
+# API pour récupérer les tâches (paginées par curseur: suivre next_cursor pour les pages suivantes)
 @router.get("/tasks")
-async def get_all_tasks():
-    logger.info("🔥 === DÉBUT GET /api/tasks ===")
+async def get_all_tasks(
+    limit: int = Query(TASKS_PAGE_SIZE, ge=1, le=500, description="Nombre maximum de tâches par page"),
+    cursor: Optional[str] = Query(None, description="Curseur de la page suivante (next_cursor)"),
+    fields: Optional[str] = Query(None, description="Colonnes à retourner, séparées par des virgules"),
+    user_id: Optional[str] = Query(None, description="ID de l'utilisateur"),
+    completed: Optional[bool] = Query(None, description="Filtrer sur l'état de complétion"),
+    theme: Optional[str] = Query(None, description="Filtrer par thème"),
+    category: Optional[str] = Query(None, description="Filtrer par catégorie"),
+    eisenhower: Optional[str] = Query(None, description="Filtrer par quadrant d'Eisenhower"),
+    deadline_from: Optional[str] = Query(None, description="Deadline minimale (YYYY-MM-DD)"),
+    deadline_to: Optional[str] = Query(None, description="Deadline maximale (YYYY-MM-DD)")
+):
     try:
-        logger.info("🔄 Appel supabase_service.get_all_tasks()...")
-        tasks = await supabase_service.get_all_tasks()
-        logger.info(f"✅ Récupéré {len(tasks)} tâches depuis Supabase")
+        # Projection: id et created_at sont toujours inclus pour construire le curseur
+        selected_fields = None
+        if fields:
+            selected_fields = [f.strip() for f in fields.split(",") if f.strip()]
+            unknown_fields = set(selected_fields) - TASK_FIELDS
+            if unknown_fields:
+                raise HTTPException(status_code=400, detail=f"Champs inconnus: {', '.join(sorted(unknown_fields))}")
+            selected_fields = sorted(set(selected_fields) | {"id", "created_at"})
         
-        # Afficher un aperçu des tâches
-        for i, task in enumerate(tasks[:3]):  # Limiter à 3 pour les logs
-            logger.info(f"  📋 Tâche {i+1}: ID={task.get('id')}, text='{task.get('text', '')[:50]}...'")
+        try:
+            decoded_cursor = decode_cursor(cursor) if cursor else None
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        filters = {
+            "user_id": user_id,
+            "completed": completed,
+            "theme": theme,
+            "category": category,
+            "eisenhower": eisenhower,
+            "deadline_from": deadline_from,
+            "deadline_to": deadline_to
+        }
         
-        logger.info("🔄 Création de la réponse JSON...")
-        response = {"tasks": tasks}
-        logger.info(f"✅ Response créée avec {len(tasks)} tâches")
-        logger.info("🔥 === FIN GET /api/tasks (SUCCÈS) ===")
+        tasks, next_cursor = await supabase_service.get_tasks_page(
+            limit=limit,
+            cursor=decoded_cursor,
+            fields=selected_fields,
+            filters=filters
+        )
+        logger.info("GET /api/tasks: %d tâches (page suivante: %s)", len(tasks), next_cursor is not None)
         
-        return response
+        return {
+            "tasks": tasks,
+            "next_cursor": encode_cursor(next_cursor) if next_cursor else None
+        }
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"❌ === ERREUR GET /api/tasks ===")
-        logger.error(f"❌ Erreur: {str(e)}")
-        import traceback
-        logger.error(f"❌ Traceback: {traceback.format_exc()}")
-        logger.error(f"❌ === FIN GET /api/tasks (ERREUR) ===")
+        logger.exception("Erreur GET /api/tasks: %s", e)
         raise HTTPException(status_code=500, detail=f"Erreur interne: {str(e)}")
 
 # API pour créer une nouvelle tâche
@@ -154,31 +198,24 @@ async def update_task_test(
     task_id: int,
     data: Dict[str, Any] = Body(...)
 ):
-    logger.info(f"🔄 === DÉBUT PUT /api/tasks-update/{task_id} ===")
     try:
-        logger.info(f"🔄 Données reçues: {data}")
+        logger.debug("PUT /api/tasks-update/%s: données reçues %s", task_id, data)
         
         if not data:
             raise HTTPException(status_code=400, detail="Aucune donnée fournie")
         
         # Mettre à jour la tâche
-        logger.info(f"🔄 Appel supabase_service.update_task_by_id({task_id}, {data})")
         updated_task = await supabase_service.update_task_by_id(task_id, data)
-        logger.info(f"✅ Tâche mise à jour: {updated_task}")
         
         if not updated_task:
             raise HTTPException(status_code=404, detail=f"Tâche avec ID {task_id} non trouvée")
         
-        logger.info(f"🔥 === FIN PUT /api/tasks-update/{task_id} (SUCCÈS) ===")
+        logger.info("PUT /api/tasks-update/%s: tâche mise à jour", task_id)
         return {"task": updated_task}
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"❌ === ERREUR PUT /api/tasks-update/{task_id} ===")
-        logger.error(f"❌ Erreur: {str(e)}")
-        import traceback
-        logger.error(f"❌ Traceback: {traceback.format_exc()}")
-        logger.error(f"❌ === FIN PUT /api/tasks-update/{task_id} (ERREUR) ===")
+        logger.exception("Erreur PUT /api/tasks-update/%s: %s", task_id, e)
         raise HTTPException(status_code=500, detail=f"Erreur interne: {str(e)}")
 
 # API pour mettre à jour une tâche
@@ -187,35 +224,26 @@ async def update_task_by_id(
     updates: TaskUpdate,
     task_id: int = Path(..., title="ID de la tâche")
 ):
-    logger.info(f"🔄 === DÉBUT PUT /api/tasks/{task_id} ===")
     try:
-        logger.info(f"🔄 Données reçues: {updates}")
-        
         # Convertir le modèle Pydantic en dictionnaire, en excluant les None
         update_data = {k: v for k, v in updates.dict().items() if v is not None}
-        logger.info(f"🔄 Données filtrées: {update_data}")
+        logger.debug("PUT /api/tasks/%s: données %s", task_id, update_data)
         
         if not update_data:
             raise HTTPException(status_code=400, detail="Aucune donnée fournie pour la mise à jour")
         
         # Mettre à jour la tâche
-        logger.info(f"🔄 Appel supabase_service.update_task_by_id({task_id}, {update_data})")
         updated_task = await supabase_service.update_task_by_id(task_id, update_data)
-        logger.info(f"✅ Tâche mise à jour: {updated_task}")
         
         if not updated_task:
             raise HTTPException(status_code=404, detail=f"Tâche avec ID {task_id} non trouvée")
         
-        logger.info(f"🔥 === FIN PUT /api/tasks/{task_id} (SUCCÈS) ===")
+        logger.info("PUT /api/tasks/%s: tâche mise à jour", task_id)
         return {"task": updated_task}
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"❌ === ERREUR PUT /api/tasks/{task_id} ===")
-        logger.error(f"❌ Erreur: {str(e)}")
-        import traceback
-        logger.error(f"❌ Traceback: {traceback.format_exc()}")
-        logger.error(f"❌ === FIN PUT /api/tasks/{task_id} (ERREUR) ===")
+        logger.exception("Erreur PUT /api/tasks/%s: %s", task_id, e)
         raise HTTPException(status_code=500, detail=f"Erreur interne: {str(e)}")
 
 # API pour supprimer une tâche
@@ -256,39 +284,30 @@ async def generate_simple_tasks(data: Dict[str, Any] = Body(...)):
 # API pour générer des tâches avec OpenAI
 @router.post("/generate")
 async def generate_tasks(data: Dict[str, Any] = Body(...)):
-    logger.info("🚀 === DÉBUT POST /api/generate ===")
     try:
         if not data:
             raise HTTPException(status_code=400, detail="Données invalides")
         
         theme = data.get("theme", "").strip()
-        logger.info(f"🎯 Thème reçu: '{theme}'")
         if not theme:
             raise HTTPException(status_code=400, detail="Veuillez spécifier un thème")
         
         is_smart_objective = data.get("is_smart_objective", False)
-        logger.info(f"🧠 Mode SMART: {is_smart_objective}")
-        
         # Détection multi-tâches (virgule, point-virgule, retour à la ligne)
         split_themes = re.split(r"[,;\n]+", theme)
         split_themes = [t.strip() for t in split_themes if t.strip()]
         is_multi = len(split_themes) > 1
-        logger.info(f"📝 Multi-tâches détecté: {is_multi} ({len(split_themes)} thèmes)")
+        logger.info("POST /api/generate: thème %r (SMART: %s, %d thèmes)", theme, is_smart_objective, len(split_themes))
         
         # Vérifier si le thème existe déjà
         existing_tasks = await supabase_service.get_tasks_by_theme(theme)
-        logger.info(f"🔍 Tâches existantes pour '{theme}': {len(existing_tasks)}")
         if existing_tasks and not is_smart_objective and not is_multi:
-            logger.info("♻️ Retour des tâches existantes (pas de génération)")
+            logger.info("POST /api/generate: %d tâches existantes retournées (pas de génération)", len(existing_tasks))
             return {"theme": theme, "tasks": existing_tasks}
         
-        client = OpenAI(
-            api_key=os.environ.get("OPENAI_API_KEY"),
-        )
-        
         if is_smart_objective:
             # Générer un objectif SMART et des tâches associées
-            response = client.chat.completions.create(
+            response = await llm_gateway.chat_completion(
                 model=os.environ.get("MODEL_OPENAI"),
                 messages=[
                     {"role": "system", "content": f"""Tu es un assistant spécialisé dans la transformation d'objectifs vagues en objectifs SMART.
@@ -355,7 +374,7 @@ async def generate_tasks(data: Dict[str, Any] = Body(...)):
 Liste d'items :
 {split_themes}
 """
-            response = client.chat.completions.create(
+            response = await llm_gateway.chat_completion(
                 model=os.environ.get("MODEL_OPENAI"),
                 messages=[
                     {"role": "system", "content": prompt}
@@ -383,7 +402,7 @@ Liste d'items :
                 raise HTTPException(status_code=500, detail="Erreur lors de la génération des tâches multiples")
         else:
             # Générer une tâche unique
-            response = client.chat.completions.create(
+            response = await llm_gateway.chat_completion(
                 model=os.environ.get("MODEL_OPENAI"),
                 messages=[
                     {"role": "system", "content": f"""Tu es un assistant qui génère une tâche unique et détaillée avec un titre en 3/5 mots. 
@@ -433,11 +452,11 @@ Liste d'items :
                     # Supprimer l'ID pour laisser Supabase l'auto-générer
                     if "id" in task:
                         del task["id"]
-                    logger.info(f"[GEN] Tâche SMART à insérer: {task}")
+                    logger.debug("POST /api/generate: tâche SMART à insérer %s", task)
                 
                 # Sauvegarder l'objectif SMART et ses tâches
                 await supabase_service.save_smart_objective(theme, smart_objective, tasks)
-                logger.info(f"[GEN] Tâches SMART insérées dans Supabase")
+                logger.info("POST /api/generate: objectif SMART et %d tâches insérés", len(tasks))
                 
                 return {
                     "theme": theme,
@@ -464,11 +483,11 @@ Liste d'items :
                 # Supprimer l'ID pour laisser Supabase l'auto-générer
                 if "id" in task_data:
                     del task_data["id"]
-                logger.info(f"[GEN] Tâche simple à insérer: {task_data}")
+                logger.debug("POST /api/generate: tâche à insérer %s", task_data)
                 
                 # Sauvegarder la tâche
                 result = await supabase_service.create_task(task_data)
-                logger.info(f"[GEN] Résultat insertion Supabase: {result}")
+                logger.info("POST /api/generate: tâche insérée (id %s)", (result or {}).get("id"))
                 
                 return {"theme": theme, "tasks": [task_data]}
             except json.JSONDecodeError as e:
@@ -524,59 +543,51 @@ async def get_recommendations(
     energy_level: str = Query("medium", description="Niveau d'énergie (low, medium, high)")
 ):
     try:
-        # Utiliser OpenAI pour générer des recommandations
-        client = OpenAI(
-            api_key=os.environ.get("OPENAI_API_KEY"),
-        )
-        
-        # Récupérer toutes les tâches
-        all_themes = await supabase_service.get_all_themes()
-        all_tasks = []
-        
-        for theme in all_themes:
-            tasks = await supabase_service.get_tasks_by_theme(theme)
-            # Ne récupérer que les tâches non complétées
-            incomplete_tasks = [t for t in tasks if not t.get("completed", False)]
-            all_tasks.extend(incomplete_tasks)
+        # Récupérer les 20 tâches en attente les plus prioritaires (filtrées, classées et limitées côté base)
+        all_tasks = await supabase_service.get_pending_tasks_for_recommendation(limit=20)
         
         if not all_tasks:
             return {"message": "Aucune tâche disponible pour des recommandations", "recommendations": []}
         
-        # Limiter le nombre de tâches pour l'API
-        if len(all_tasks) > 20:
-            all_tasks = all_tasks[:20]
-            
         # Envoyer les tâches à OpenAI pour obtenir des recommandations
-        response = client.chat.completions.create(
-            model=os.environ.get("MODEL_OPENAI", "gpt-3.5-turbo"),
-            messages=[
-                {"role": "system", "content": f"""Tu es un assistant intelligent qui aide à prioriser les tâches.
-                
-                L'utilisateur a {available_time} de disponible et son niveau d'énergie est {energy_level}.
-                
-                Voici ses tâches en attente:
-                {json.dumps(all_tasks, ensure_ascii=False, indent=2)}
-                
-                Recommande 1 à 3 tâches qui seraient les plus appropriées à faire maintenant, en tenant compte:
-                - Du temps disponible
-                - Du niveau d'énergie actuel
-                - De la priorité Eisenhower de chaque tâche
-                - Des deadlines
-                
-                Réponds en français et au format JSON avec:
-                {{
-                    "message": "Un message personnalisé expliquant pourquoi ces tâches sont recommandées",
-                    "recommendations": [
-                        {{
-                            "task_id": "ID de la tâche recommandée",
-                            "text": "Description de la tâche court max 3/4 mots",
-                            "reason": "Explication courte de pourquoi cette tâche est recommandée maintenant"
-                        }},
-                        ...
-                    ]
-                }}
-                """}
-            ],
+        # (mises en cache tant que les tâches, le temps disponible et le niveau d'énergie sont identiques)
+        model = os.environ.get("MODEL_OPENAI", "gpt-3.5-turbo")
+        messages = [
+            {"role": "system", "content": f"""Tu es un assistant intelligent qui aide à prioriser les tâches.
+            
+            L'utilisateur a {available_time} de disponible et son niveau d'énergie est {energy_level}.
+            
+            Voici ses tâches en attente:
+            {json.dumps(all_tasks, ensure_ascii=False, indent=2)}
+            
+            Recommande 1 à 3 tâches qui seraient les plus appropriées à faire maintenant, en tenant compte:
+            - Du temps disponible
+            - Du niveau d'énergie actuel
+            - De la priorité Eisenhower de chaque tâche
+            - Des deadlines
+            
+            Réponds en français et au format JSON avec:
+            {{
+                "message": "Un message personnalisé expliquant pourquoi ces tâches sont recommandées",
+                "recommendations": [
+                    {{
+                        "task_id": "ID de la tâche recommandée",
+                        "text": "Description de la tâche court max 3/4 mots",
+                        "reason": "Explication courte de pourquoi cette tâche est recommandée maintenant"
+                    }},
+                    ...
+                ]
+            }}
+            """}
+        ]
+        cache_inputs = llm_cache_inputs(model, messages, temperature=0.7)
+        cached_recommendations = await recommendations_cache.get(cache_inputs)
+        if cached_recommendations is not None:
+            return cached_recommendations
+        
+        response = await llm_gateway.chat_completion(
+            model=model,
+            messages=messages,
             temperature=0.7,
         )
         
@@ -589,6 +600,7 @@ async def get_recommendations(
             
         try:
             recommendations = json.loads(response_text)
+            await recommendations_cache.set(cache_inputs, recommendations)
             return recommendations
         except json.JSONDecodeError as e:
             logger.error(f"Erreur lors du parsing JSON des recommandations: {str(e)}")
@@ -634,32 +646,33 @@ async def get_weekly_review():
         # Récupérer les objectifs SMART
         smart_objectives = await supabase_service.get_smart_objectives()
         
-        # Utiliser OpenAI pour générer un résumé
-        client = OpenAI(
-            api_key=os.environ.get("OPENAI_API_KEY"),
-        )
-        
-        response = client.chat.completions.create(
-            model=os.environ.get("MODEL_OPENAI", "gpt-4o-mini"),
-            messages=[
-                {"role": "system", "content": f"""Tu es un coach en productivité qui analyse les données de tâches d'un utilisateur.
-                
-                Voici les statistiques de l'utilisateur pour cette semaine:
-                {json.dumps(stats, ensure_ascii=False, indent=2)}
-                
-                Génère une analyse personnalisée en français avec:
-                - Une évaluation des performances de la semaine
-                - Identification des points forts
-                - Suggestion d'amélioration pour la semaine prochaine
-                - Un ton encourageant et motivant
-                
-                Réponds en texte simple, sans formatage JSON.
-                """}
-            ],
-            temperature=0.7,
-        )
-        
-        message = response.choices[0].message.content.strip()
+        # Utiliser OpenAI pour générer un résumé (mis en cache tant que les statistiques ne changent pas)
+        model = os.environ.get("MODEL_OPENAI", "gpt-4o-mini")
+        messages = [
+            {"role": "system", "content": f"""Tu es un coach en productivité qui analyse les données de tâches d'un utilisateur.
+            
+            Voici les statistiques de l'utilisateur pour cette semaine:
+            {json.dumps(stats, ensure_ascii=False, indent=2)}
+            
+            Génère une analyse personnalisée en français avec:
+            - Une évaluation des performances de la semaine
+            - Identification des points forts
+            - Suggestion d'amélioration pour la semaine prochaine
+            - Un ton encourageant et motivant
+            
+            Réponds en texte simple, sans formatage JSON.
+            """}
+        ]
+        cache_inputs = llm_cache_inputs(model, messages, temperature=0.7)
+        message = await weekly_review_cache.get(cache_inputs)
+        if message is None:
+            response = await llm_gateway.chat_completion(
+                model=model,
+                messages=messages,
+                temperature=0.7,
+            )
+            message = response.choices[0].message.content.strip()
+            await weekly_review_cache.set(cache_inputs, message)
         
         return {
             "message": message,
@@ -684,16 +697,14 @@ async def get_weekly_review():
 # API simple pour marquer une tâche comme terminée
 @router.patch("/tasks/{task_id}/complete")
 async def mark_task_complete(task_id: int, body: Dict[str, Any] = Body(...)):
-    logger.info(f"🔄 === PATCH /api/tasks/{task_id}/complete ===")
     try:
         completed = body.get("completed", True)
-        logger.info(f"🔄 Marquage tâche {task_id} comme completed = {completed}")
         
         # Mise à jour directe via Supabase
         updated_task = await supabase_service.update_task_by_id(task_id, {"completed": completed})
         
         if updated_task:
-            logger.info(f"✅ Tâche {task_id} mise à jour: completed = {updated_task.get('completed')}")
+            logger.info("PATCH /api/tasks/%s/complete: completed = %s", task_id, updated_task.get("completed"))
             return {"success": True, "task": updated_task}
         else:
             raise HTTPException(status_code=404, detail=f"Tâche {task_id} non trouvée")
@@ -701,5 +712,5 @@ async def mark_task_complete(task_id: int, body: Dict[str, Any] = Body(...)):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"❌ Erreur PATCH /api/tasks/{task_id}/complete: {str(e)}")
+        logger.exception("Erreur PATCH /api/tasks/%s/complete: %s", task_id, e)
         raise HTTPException(status_code=500, detail=f"Erreur interne: {str(e)}")
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Job de réparation des streaks d'habitudes.
+
+Le streak est normalement maintenu de façon incrémentale à chaque complétion
+(HabitsService.complete_habit). Ce script recalcule entièrement l'état de streak
+(streak, longest_streak, last_completion_date, completion_count) à partir de
+l'historique des complétions, par exemple après une import de données ou une correction manuelle.
+
+Usage:
+    python scripts/backfill_habit_streaks.py                 # toutes les habitudes
+    python scripts/backfill_habit_streaks.py --user-id abc   # habitudes d'un utilisateur
+    python scripts/backfill_habit_streaks.py --habit-id 42   # une seule habitude
+"""
+import sys
+import asyncio
+import argparse
+from pathlib import Path
+
+# Ajouter le répertoire parent au chemin pour pouvoir importer des modules
+parent_dir = str(Path(__file__).resolve().parent.parent)
+sys.path.insert(0, parent_dir)
+
+from dotenv import load_dotenv
+from services.supabase_service import supabase_service
+from services.habits_service import habits_service
+
+# Chargement des variables d'environnement
+load_dotenv()
+
+
+async def list_habit_ids(user_id=None):
+    """Liste les IDs des habitudes à réparer"""
+    if user_id:
+        habits = await supabase_service.get_user_habits(user_id)
+    else:
+        response = await supabase_service.supabase.table("habits").select("id").execute()
+        habits = response.data
+    return [habit["id"] for habit in habits]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Recalcul complet des streaks d'habitudes")
+    parser.add_argument("--user-id", help="Limiter aux habitudes de cet utilisateur")
+    parser.add_argument("--habit-id", type=int, help="Réparer une seule habitude")
+    args = parser.parse_args()
+
+    habit_ids = [args.habit_id] if args.habit_id else await list_habit_ids(args.user_id)
+    print(f"🔄 Recalcul des streaks de {len(habit_ids)} habitude(s)...")
+
+    failures = 0
+    for habit_id in habit_ids:
+        try:
+            state = await habits_service.recompute_habit_streak(habit_id)
+            print(f"  ✅ Habitude {habit_id}: streak={state['streak']}, longest={state['longest_streak']}, "
+                  f"complétions={state['completion_count']}")
+        except Exception as e:
+            failures += 1
+            print(f"  ❌ Habitude {habit_id}: {str(e)}")
+
+    print(f"🎉 Terminé ({failures} échec(s))")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Benchmark de l'ingestion d'un document: un appel d'embedding par chunk (ancien parcours)
+contre des requêtes groupées et concurrentes (EmbeddingService.get_embeddings).
+
+Par défaut, l'API OpenAI est appelée (OPENAI_API_KEY requis). Avec --simulate-ms, chaque
+requête est remplacée par une attente fixe, ce qui mesure uniquement le gain en allers-retours.
+
+Usage:
+    python scripts/bench_embeddings.py --chunks 200
+    python scripts/bench_embeddings.py --chunks 2000 --simulate-ms 150
+"""
+import sys
+import time
+import random
+import asyncio
+import argparse
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+# Ajouter le répertoire parent au chemin pour pouvoir importer des modules
+parent_dir = str(Path(__file__).resolve().parent.parent)
+sys.path.insert(0, parent_dir)
+
+from dotenv import load_dotenv
+from services.embedding_service import embedding_service
+from services.llm_gateway import llm_gateway
+
+# Chargement des variables d'environnement
+load_dotenv()
+
+WORDS = "tâche objectif habitude semaine priorité énergie projet réunion client produit équipe".split()
+
+
+def build_chunks(count):
+    """Génère des chunks de texte d'environ 200 mots"""
+    rng = random.Random(42)
+    return [" ".join(rng.choice(WORDS) for _ in range(200)) for _ in range(count)]
+
+
+def simulate(latency):
+    """Remplace les appels HTTP d'embedding par une attente fixe par requête"""
+    def fake_response(inputs):
+        inputs = inputs if isinstance(inputs, list) else [inputs]
+        return SimpleNamespace(data=[SimpleNamespace(index=i, embedding=[0.0] * 1536) for i in range(len(inputs))])
+
+    def sync_create(model, input):
+        time.sleep(latency)
+        return fake_response(input)
+
+    async def async_create(model, input):
+        await asyncio.sleep(latency)
+        return fake_response(input)
+
+    return [
+        mock.patch.object(embedding_service.client.embeddings, "create", sync_create),
+        mock.patch.object(llm_gateway.client.embeddings, "create", async_create),
+    ]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark des embeddings par lots")
+    parser.add_argument("--chunks", type=int, default=200, help="Nombre de chunks à encoder")
+    parser.add_argument("--simulate-ms", type=float, default=None, help="Simuler l'API avec cette latence par requête (ms)")
+    parser.add_argument("--skip-serial", action="store_true", help="Ne pas mesurer l'ancien parcours")
+    args = parser.parse_args()
+
+    chunks = build_chunks(args.chunks)
+    patches = simulate(args.simulate_ms / 1000) if args.simulate_ms is not None else []
+    for patch in patches:
+        patch.start()
+    try:
+        if not args.skip_serial:
+            start = time.perf_counter()
+            for chunk in chunks:
+                embedding_service.get_embedding(chunk)
+            serial = time.perf_counter() - start
+            print(f"Avant (1 requête par chunk): {serial:.2f} s, {args.chunks / serial:.1f} chunks/s")
+
+        start = time.perf_counter()
+        embeddings = await embedding_service.get_embeddings(chunks)
+        batched = time.perf_counter() - start
+        print(f"Après (lots concurrents)   : {batched:.2f} s, {args.chunks / batched:.1f} chunks/s "
+              f"({sum(e is not None for e in embeddings)}/{args.chunks} embeddings)")
+        if not args.skip_serial:
+            print(f"Gain de débit: x{serial / batched:.1f}")
+    finally:
+        for patch in patches:
+            patch.stop()
+        await llm_gateway.aclose()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
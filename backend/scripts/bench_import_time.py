@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Mesure du temps d'import de l'application (démarrage à froid d'un worker uvicorn) avec
+`python -X importtime`, et garde-fou contre les régressions.
+
+Chaque mesure importe le module dans un nouvel interpréteur. Le script affiche la médiane du
+temps d'import, les modules importés directement les plus coûteux (temps cumulé) et les
+modules au temps propre le plus élevé. Il échoue (code de sortie 1) si:
+- la médiane dépasse --budget-ms, ou la référence enregistrée (--baseline) de plus de --tolerance;
+- un module interdit à l'import a été chargé (SDK chargés au premier usage: openai, supabase, ...);
+- une ressource du conteneur (services/container.py) a été créée pendant l'import.
+
+Usage:
+    python scripts/bench_import_time.py
+    python scripts/bench_import_time.py --runs 10 --budget-ms 2000
+    python scripts/bench_import_time.py --save-baseline import_time.json
+    python scripts/bench_import_time.py --baseline import_time.json --tolerance 0.15
+"""
+import os
+import sys
+import json
+import asyncio
+import argparse
+import statistics
+from pathlib import Path
+
+# Ajouter le répertoire parent au chemin pour pouvoir importer des modules
+parent_dir = str(Path(__file__).resolve().parent.parent)
+sys.path.insert(0, parent_dir)
+
+from dotenv import load_dotenv
+
+# Chargement des variables d'environnement
+load_dotenv()
+
+# Modules qui ne doivent être chargés qu'au premier usage, pas à l'import de l'application
+FORBIDDEN_MODULES = ["openai", "supabase", "sentry_sdk", "tiktoken", "aiohttp"]
+
+# L'import ne doit faire aucun appel réseau: des valeurs factices suffisent
+DUMMY_ENV = {
+    "SUPABASE_URL": "https://example.supabase.co",
+    "SUPABASE_KEY": "bench",
+    "SUPABASE_SERVICE_KEY": "bench",
+    "OPENAI_API_KEY": "bench",
+}
+
+PROBE = """
+import json, sys
+import {module}
+from services.container import container
+print(json.dumps({{"modules": [m for m in {forbidden!r} if m in sys.modules], "resources": container.created()}}))
+"""
+
+
+def subprocess_env(args):
+    env = dict(os.environ)
+    for name, value in DUMMY_ENV.items():
+        env.setdefault(name, value)
+    if not args.with_sentry:
+        env.pop("SENTRY_DSN", None)
+    return env
+
+
+async def run_python(arguments, env):
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, *arguments,
+        cwd=parent_dir, env=env,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+    )
+    stdout, stderr = await process.communicate()
+    if process.returncode != 0:
+        raise RuntimeError(f"Échec de l'import:\n{stderr.decode(errors='replace')[-2000:]}")
+    return stdout.decode(), stderr.decode()
+
+
+def parse_importtime(stderr):
+    """Lignes "import time: self | cumulé | module" -> liste de (profondeur, module, self_us, cumulé_us)"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip(" "))) // 2
+        entries.append((depth, name.strip(), int(self_us), int(cumulative_us)))
+    return entries
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Temps d'import de l'application et garde-fou de démarrage à froid")
+    parser.add_argument("--module", default="app_fastapi", help="Module importé par uvicorn")
+    parser.add_argument("--runs", type=int, default=5, help="Nombre de mesures (un interpréteur par mesure)")
+    parser.add_argument("--top", type=int, default=10, help="Nombre de modules affichés par classement")
+    parser.add_argument("--budget-ms", type=float, default=2500.0, help="Temps d'import médian maximal")
+    parser.add_argument("--baseline", help="Fichier JSON de référence (produit par --save-baseline)")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Dépassement toléré de la référence")
+    parser.add_argument("--save-baseline", help="Enregistre la mesure comme référence dans ce fichier")
+    parser.add_argument("--with-sentry", action="store_true", help="Conserver SENTRY_DSN (sinon retiré pour la mesure)")
+    args = parser.parse_args()
+
+    env = subprocess_env(args)
+    # Premier import: compilation des .pyc, non comptée
+    await run_python(["-c", f"import {args.module}"], env)
+
+    totals, runs = [], []
+    for _ in range(args.runs):
+        _, stderr = await run_python(["-X", "importtime", "-c", f"import {args.module}"], env)
+        entries = parse_importtime(stderr)
+        total = next(cumulative for depth, name, _, cumulative in entries if depth == 0 and name == args.module)
+        totals.append(total / 1000)
+        runs.append(entries)
+    median_ms = statistics.median(totals)
+
+    # Classements sur la mesure médiane
+    entries = runs[totals.index(sorted(totals)[len(totals) // 2])]
+    direct = sorted((e for e in entries if e[0] == 1), key=lambda e: e[3], reverse=True)[:args.top]
+    own = sorted(entries, key=lambda e: e[2], reverse=True)[:args.top]
+
+    print(f"Import de {args.module}: médiane {median_ms:.0f} ms sur {args.runs} mesures "
+          f"(min {min(totals):.0f} ms, max {max(totals):.0f} ms)\n")
+    print("Imports directs les plus coûteux (cumulé):")
+    for _, name, _, cumulative in direct:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+    print("\nTemps propre le plus élevé:")
+    for _, name, self_us, _ in own:
+        print(f"  {self_us / 1000:8.1f} ms  {name}")
+
+    probe, _ = await run_python(["-c", PROBE.format(module=args.module, forbidden=FORBIDDEN_MODULES)], env)
+    side_effects = json.loads(probe.strip().splitlines()[-1])
+
+    failures = []
+    if median_ms > args.budget_ms:
+        failures.append(f"médiane {median_ms:.0f} ms > budget {args.budget_ms:.0f} ms")
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        limit = baseline["median_ms"] * (1 + args.tolerance)
+        print(f"\nRéférence: {baseline['median_ms']:.0f} ms (limite {limit:.0f} ms)")
+        if median_ms > limit:
+            failures.append(f"médiane {median_ms:.0f} ms > référence +{args.tolerance:.0%} ({limit:.0f} ms)")
+    if side_effects["modules"]:
+        failures.append(f"modules chargés à l'import: {', '.join(side_effects['modules'])}")
+    if side_effects["resources"]:
+        failures.append(f"ressources créées à l'import: {', '.join(side_effects['resources'])}")
+
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(json.dumps({
+            "module": args.module,
+            "median_ms": round(median_ms, 1),
+            "direct_imports_ms": {name: round(cumulative / 1000, 1) for _, name, _, cumulative in direct},
+        }, indent=2), encoding="utf-8")
+        print(f"\nRéférence enregistrée dans {args.save_baseline}")
+
+    if failures:
+        print("\nÉCHEC: " + "; ".join(failures))
+        return 1
+    print("\nOK: aucun client créé ni SDK chargé à l'import, temps dans le budget")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
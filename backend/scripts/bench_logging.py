@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Banc d'essai du débit des routes de tâches selon la configuration du logging.
+
+L'application (app_fastapi) est appelée directement en ASGI, sans serveur ni réseau, avec
+Supabase simulé (page de 10 tâches, mise à jour immédiate). Mélange de requêtes: 60% GET /api/tasks,
+25% PUT /api/tasks/{id}, 15% PATCH /api/tasks/{id}/complete. Chaque variante tourne dans un
+interpréteur séparé dont la sortie d'erreur est redirigée vers un fichier, comme en production:
+- logging désactivé (LOG_LEVEL=WARNING);
+- synchrone: handler texte écrit dans le thread de la requête (ancienne configuration basicConfig);
+- file d'attente JSON sans échantillonnage (tous les enregistrements INFO écrits);
+- file d'attente JSON avec la politique d'échantillonnage par défaut (services/logging_config.py).
+Pour chaque variante: requêtes/s et temps par requête (meilleure mesure, la moins bruitée),
+temps CPU du thread des requêtes (hors thread d'écriture des journaux) et volume de journaux écrits.
+
+Usage:
+    python scripts/bench_logging.py
+    python scripts/bench_logging.py --requests 20000 --repeat 5 --rounds 5
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from pathlib import Path
+
+# Ajouter le répertoire parent au chemin pour pouvoir importer des modules
+parent_dir = str(Path(__file__).resolve().parent.parent)
+sys.path.insert(0, parent_dir)
+
+from dotenv import load_dotenv
+
+# Chargement des variables d'environnement
+load_dotenv()
+
+VARIANTS = [
+    ("off", "désactivé", {"LOG_LEVEL": "WARNING"}),
+    ("sync", "synchrone (texte)", {"LOG_FORMAT": "text"}),
+    ("queue", "file d'attente JSON", {"LOG_SAMPLING_POLICY": '{"*": 1}'}),
+    ("sampled", "file + échantillonnage", {}),
+]
+
+# L'import ne doit faire aucun appel réseau: des valeurs factices suffisent
+DUMMY_ENV = {
+    "SUPABASE_URL": "https://example.supabase.co",
+    "SUPABASE_KEY": "bench",
+    "SUPABASE_SERVICE_KEY": "bench",
+    "OPENAI_API_KEY": "bench",
+}
+
+TASKS = [
+    {
+        "id": i, "title": f"Tâche {i}", "text": "Préparer la présentation trimestrielle " * 3,
+        "theme": "Travail", "hashtags": ["#travail", "#présentation"], "eisenhower": "important",
+        "estimated_time": "2h", "deadline": "2026-10-30", "category": "professionnel",
+        "priority": "high", "completed": False, "user_id": "bench", "created_at": f"2026-10-01T00:00:{i % 60:02d}",
+    }
+    for i in range(50)
+]
+
+
+def mock_supabase():
+    from services.supabase_service import supabase_service
+
+    async def get_tasks_page(limit=100, cursor=None, fields=None, filters=None):
+        return TASKS[:limit], None
+
+    async def update_task_by_id(task_id, update_data):
+        return {**TASKS[task_id % len(TASKS)], **update_data, "id": task_id}
+
+    supabase_service.get_tasks_page = get_tasks_page
+    supabase_service.update_task_by_id = update_task_by_id
+
+
+def use_synchronous_handler():
+    """Ancienne configuration: un StreamHandler texte sur le logger racine, écrit par la requête"""
+    import logging
+    from services.logging_config import TEXT_FORMAT, stop_logging
+
+    stop_logging()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    root.addHandler(handler)
+
+
+def requests_mix(count):
+    for i in range(count):
+        slot = i % 20
+        if slot < 12:
+            yield "GET", "/api/tasks", b"limit=10", b""
+        elif slot < 17:
+            yield "PUT", f"/api/tasks/{i}", b"", b'{"title": "Mise \\u00e0 jour", "priority": "low"}'
+        else:
+            yield "PATCH", f"/api/tasks/{i}/complete", b"", b'{"completed": true}'
+
+
+async def call(app, method, path, query_string, body):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method,
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": query_string, "client": ("127.0.0.1", 1), "server": ("bench", 80),
+        "headers": [(b"host", b"bench"), (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode())],
+    }
+    status = None
+    received = False
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        # Comme un serveur: attente de la déconnexion du client (tâche annulée en fin de réponse)
+        await asyncio.Event().wait()
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    if status != 200:
+        raise RuntimeError(f"{method} {path}: statut {status}")
+
+
+async def run_variant(variant, args):
+    """Mesure d'une variante dans le processus courant; résultat en JSON sur la sortie standard"""
+    from app_fastapi import app
+    from services.logging_config import stop_logging
+
+    mock_supabase()
+    if variant == "sync":
+        use_synchronous_handler()
+    for request in requests_mix(200):
+        await call(app, *request)
+
+    timings, cpu_timings = [], []
+    for _ in range(args.repeat):
+        start, start_cpu = time.perf_counter(), time.thread_time()
+        for request in requests_mix(args.requests):
+            await call(app, *request)
+        timings.append(time.perf_counter() - start)
+        cpu_timings.append(time.thread_time() - start_cpu)
+    # Écriture des enregistrements encore dans la file (non comptée)
+    stop_logging()
+
+    per_request = min(timings) / args.requests
+    print(json.dumps({"rps": 1 / per_request, "us": per_request * 1e6, "cpu_us": min(cpu_timings) / args.requests * 1e6}))
+
+
+async def run_subprocess(variant, extra_env, args, log_path):
+    env = dict(os.environ)
+    for name, value in DUMMY_ENV.items():
+        env.setdefault(name, value)
+    for name in ("SENTRY_DSN", "LOG_LEVEL", "LOG_FORMAT", "LOG_FILE", "LOG_SAMPLING_POLICY"):
+        env.pop(name, None)
+    env.update(extra_env)
+    with open(log_path, "wb") as log_file:
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, __file__, "--variant", variant,
+            "--requests", str(args.requests), "--repeat", str(args.repeat),
+            cwd=parent_dir, env=env, stdout=asyncio.subprocess.PIPE, stderr=log_file,
+        )
+        stdout, _ = await process.communicate()
+    if process.returncode != 0:
+        tail = Path(log_path).read_bytes()[-2000:].decode(errors="replace")
+        raise RuntimeError(f"Échec de la variante {variant}:\n{tail}")
+    result = json.loads(stdout.decode().strip().splitlines()[-1])
+    result["log_kb"] = os.path.getsize(log_path) / 1024
+    return result
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Débit des routes de tâches selon la configuration du logging")
+    parser.add_argument("--requests", type=int, default=5000, help="Requêtes par mesure")
+    parser.add_argument("--repeat", type=int, default=3, help="Nombre de mesures (meilleure retenue)")
+    parser.add_argument("--rounds", type=int, default=3, help="Nombre de tours (variantes alternées)")
+    parser.add_argument("--variant", choices=[name for name, _, _ in VARIANTS], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        await run_variant(args.variant, args)
+        return 0
+
+    print(f"{args.requests} requêtes ASGI par mesure, meilleure de {args.repeat} mesures x {args.rounds} tours\n")
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        # Variantes alternées à chaque tour: la dérive de la machine touche toutes les variantes
+        for _ in range(args.rounds):
+            for name, _, extra_env in VARIANTS:
+                result = await run_subprocess(name, extra_env, args, os.path.join(tmp, f"{name}.log"))
+                best = results.setdefault(name, result)
+                for key in ("us", "cpu_us"):
+                    best[key] = min(best[key], result[key])
+                best["rps"] = 1e6 / best["us"]
+
+    baseline = results["off"]["cpu_us"]
+    print(f"{'logging':<26}{'requêtes/s':>12}{'µs/requête':>12}{'CPU µs':>10}{'surcoût CPU':>13}{'journaux (Ko)':>15}")
+    for name, label, _ in VARIANTS:
+        result = results[name]
+        overhead = f"{result['cpu_us'] - baseline:.0f}µs" if name != "off" else "-"
+        print(f"{label:<26}{result['rps']:>12.0f}{result['us']:>12.1f}{result['cpu_us']:>10.1f}"
+              f"{overhead:>13}{result['log_kb']:>15.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
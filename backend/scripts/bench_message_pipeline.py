@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Benchmark du pipeline de POST /api/messages avec une latence réseau simulée.
+
+Chaque appel Supabase attend --rtt-ms et l'appel au LLM attend --llm-ms, ce qui isole
+le coût des allers-retours: l'ancien pipeline enchaîne 5 requêtes Supabase autour du LLM
+(conversation, agent, insertion du message utilisateur, historique, insertion de la réponse),
+le nouveau n'en attend que 2 (conversation+agent et historique en parallèle, puis l'insertion de la
+réponse): le message utilisateur est inséré pendant l'appel au LLM.
+
+Usage:
+    python scripts/bench_message_pipeline.py --rtt-ms 40 --llm-ms 800 --runs 20
+"""
+import sys
+import time
+import asyncio
+import argparse
+from pathlib import Path
+from unittest import mock
+
+# Ajouter le répertoire parent au chemin pour pouvoir importer des modules
+parent_dir = str(Path(__file__).resolve().parent.parent)
+sys.path.insert(0, parent_dir)
+
+from dotenv import load_dotenv
+from services.supabase_service import supabase_service
+from services.llm_gateway import llm_gateway
+from routes import ai_agents
+
+# Chargement des variables d'environnement
+load_dotenv()
+
+CONVERSATION = {"id": "bench", "agent_id": "bench-agent"}
+AGENT = {"id": "bench-agent", "prompt": "Tu es un assistant."}
+
+
+def fake_backend(rtt, llm_latency):
+    """Remplace Supabase et le LLM par des appels qui ne font qu'attendre"""
+    async def db_call(result):
+        await asyncio.sleep(rtt)
+        return result
+
+    async def chat(messages, model=None, **kwargs):
+        await asyncio.sleep(llm_latency)
+        return "Réponse"
+
+    return [
+        mock.patch.object(supabase_service, "get_conversation_by_id", lambda *a: db_call(CONVERSATION)),
+        mock.patch.object(supabase_service, "get_agent_by_id", lambda *a: db_call(AGENT)),
+        mock.patch.object(supabase_service, "get_conversation_with_agent", lambda *a: db_call((dict(CONVERSATION), AGENT))),
+        mock.patch.object(supabase_service, "get_messages_by_conversation", lambda *a, **k: db_call([])),
+        mock.patch.object(supabase_service, "get_recent_messages", lambda *a, **k: db_call([])),
+        mock.patch.object(supabase_service, "add_message", lambda message: db_call(message)),
+        mock.patch.object(supabase_service, "add_messages", lambda messages: db_call(messages)),
+        mock.patch.object(supabase_service, "get_messages_to_summarize", lambda *a, **k: db_call([])),
+        mock.patch.object(llm_gateway, "chat", chat),
+        mock.patch.object(llm_gateway, "api_key", "bench"),
+    ]
+
+
+async def old_pipeline(data):
+    """Ancien pipeline: tous les allers-retours sont séquentiels"""
+    conversation = await supabase_service.get_conversation_by_id(data["conversation_id"])
+    agent = await supabase_service.get_agent_by_id(conversation["agent_id"])
+    await supabase_service.add_message(ai_agents.new_message(data["conversation_id"], "user", data["content"]))
+    history = await supabase_service.get_messages_by_conversation(data["conversation_id"])
+    response = await ai_agents.generate_response(data["content"], history, agent["prompt"])
+    await supabase_service.add_message(ai_agents.new_message(data["conversation_id"], "assistant", response))
+
+
+async def new_pipeline(data):
+    await ai_agents.add_message(data)
+
+
+async def measure(func, runs):
+    data = {"conversation_id": "bench", "content": "Bonjour"}
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        await func(data)
+        timings.append(time.perf_counter() - start)
+    return sorted(timings)[len(timings) // 2]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark du pipeline de messages (latence simulée)")
+    parser.add_argument("--rtt-ms", type=float, default=40, help="Latence d'un aller-retour Supabase (ms)")
+    parser.add_argument("--llm-ms", type=float, default=800, help="Latence de l'appel au LLM (ms)")
+    parser.add_argument("--runs", type=int, default=10, help="Nombre de messages par pipeline")
+    args = parser.parse_args()
+
+    patches = fake_backend(args.rtt_ms / 1000, args.llm_ms / 1000)
+    for patch in patches:
+        patch.start()
+    try:
+        old = await measure(old_pipeline, args.runs)
+        new = await measure(new_pipeline, args.runs)
+    finally:
+        for patch in patches:
+            patch.stop()
+
+    print(f"Avant (séquentiel)   : {old * 1000:.0f} ms par message (médiane)")
+    print(f"Après (pipeline)     : {new * 1000:.0f} ms par message (médiane)")
+    print(f"Latence économisée   : {(old - new) * 1000:.0f} ms par message")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Banc d'essai du coût par requête du middleware de métriques HTTP.
+
+Une petite application FastAPI (route avec identifiant, route fixe, route attrape-tout de la SPA)
+est appelée directement en ASGI, sans serveur ni réseau, avec trois variantes:
+- sans middleware (référence);
+- l'ancien middleware (BaseHTTPMiddleware, étiquette = chemin brut);
+- PrometheusMiddleware (services/metrics.py: ASGI pur, étiquette = modèle de route).
+Pour chaque variante: temps moyen par requête, surcoût par rapport à la référence, et nombre
+de séries http_requests_total créées (chaque requête utilise un identifiant différent).
+
+Usage:
+    python scripts/bench_metrics_middleware.py
+    python scripts/bench_metrics_middleware.py --requests 50000 --repeat 5
+"""
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+from pathlib import Path
+
+# Ajouter le répertoire parent au chemin pour pouvoir importer des modules
+parent_dir = str(Path(__file__).resolve().parent.parent)
+sys.path.insert(0, parent_dir)
+
+from dotenv import load_dotenv
+
+# Chargement des variables d'environnement
+load_dotenv()
+
+from fastapi import FastAPI, Request
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Histogram
+
+from services.metrics import PrometheusMiddleware
+
+
+def build_app(variant):
+    app = FastAPI()
+
+    if variant == "legacy":
+        registry = CollectorRegistry()
+        request_count = Counter('legacy_http_requests_total', 'Requêtes', ['method', 'endpoint', 'status'], registry=registry)
+        request_latency = Histogram('legacy_http_request_duration_seconds', 'Latence', registry=registry)
+        app.state.legacy_registry = registry
+
+        @app.middleware("http")
+        async def metrics_middleware(request: Request, call_next):
+            start_time = time.time()
+            response = await call_next(request)
+            request_count.labels(
+                method=request.method, endpoint=request.url.path, status=response.status_code
+            ).inc()
+            request_latency.observe(time.time() - start_time)
+            return response
+    elif variant == "asgi":
+        app.add_middleware(PrometheusMiddleware)
+
+    @app.get("/api/tasks/{task_id}")
+    async def get_task(task_id: str):
+        return {"id": task_id}
+
+    @app.get("/health")
+    async def health():
+        return {"status": "healthy"}
+
+    @app.get("/{path:path}")
+    async def spa(path: str = ""):
+        return {"path": path}
+
+    return app
+
+
+async def call(app, path):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": b"", "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+
+    received = False
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # Comme un serveur: attente de la déconnexion du client (tâche annulée en fin de réponse)
+        await asyncio.Event().wait()
+
+    async def send(message):
+        pass
+
+    await app(scope, receive, send)
+
+
+def paths(count):
+    """Mélange réaliste: identifiants de tâches, chemins de la SPA et route fixe"""
+    for i in range(count):
+        kind = i % 4
+        if kind == 0:
+            yield "/health"
+        elif kind == 3:
+            yield f"/projets/{i}"
+        else:
+            yield f"/api/tasks/{i}"
+
+
+async def run(variant, args):
+    app = build_app(variant)
+    # Démarrage de la pile de middlewares
+    for path in paths(200):
+        await call(app, path)
+
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        for path in paths(args.requests):
+            await call(app, path)
+        timings.append((time.perf_counter() - start) / args.requests * 1e6)
+
+    if variant == "legacy":
+        series = sum(
+            len([s for s in metric.samples if s.name.endswith("_total")])
+            for metric in app.state.legacy_registry.collect() if metric.name == "legacy_http_requests"
+        )
+    elif variant == "asgi":
+        series = sum(
+            len([s for s in metric.samples if s.name.endswith("_total")])
+            for metric in REGISTRY.collect() if metric.name == "http_requests"
+        )
+    else:
+        series = 0
+    return statistics.median(timings), series
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Coût par requête du middleware de métriques HTTP")
+    parser.add_argument("--requests", type=int, default=20000, help="Requêtes par mesure")
+    parser.add_argument("--repeat", type=int, default=3, help="Nombre de mesures (médiane)")
+    args = parser.parse_args()
+
+    print(f"{args.requests} requêtes ASGI par mesure, médiane de {args.repeat} mesures\n")
+    baseline, _ = await run("none", args)
+    print(f"{'variante':<34}{'µs/requête':>12}{'surcoût':>12}{'séries':>10}")
+    print(f"{'sans middleware':<34}{baseline:>12.1f}{'-':>12}{'-':>10}")
+    for variant, label in (("legacy", "BaseHTTPMiddleware, chemin brut"), ("asgi", "PrometheusMiddleware")):
+        per_request, series = await run(variant, args)
+        print(f"{label:<34}{per_request:>12.1f}{per_request - baseline:>10.1f}µs{series:>10}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
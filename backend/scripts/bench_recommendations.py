@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la sélection des tâches pour /api/recommendations.
+
+Compare l'ancien parcours N+1 (un get_tasks_by_theme par thème distinct) à la requête
+unique pending_tasks_for_recommendation, sur un jeu de données de 10k thèmes.
+
+Usage:
+    python scripts/bench_recommendations.py --seed       # insère les tâches de test
+    python scripts/bench_recommendations.py              # mesure les deux parcours
+    python scripts/bench_recommendations.py --cleanup    # supprime les tâches de test
+"""
+import sys
+import time
+import random
+import asyncio
+import argparse
+from datetime import date, timedelta
+from pathlib import Path
+
+# Ajouter le répertoire parent au chemin pour pouvoir importer des modules
+parent_dir = str(Path(__file__).resolve().parent.parent)
+sys.path.insert(0, parent_dir)
+
+from dotenv import load_dotenv
+from services.supabase_service import supabase_service
+
+# Chargement des variables d'environnement
+load_dotenv()
+
+BENCH_USER_ID = "bench_recommendations"
+QUADRANTS = ["important_urgent", "important_not_urgent", "not_important_urgent", "not_important_not_urgent"]
+
+
+def build_fixture(theme_count):
+    """Génère une tâche par thème, dont un quart déjà complétées"""
+    today = date.today()
+    rng = random.Random(42)
+    return [
+        {
+            "text": f"Tâche de benchmark {i}",
+            "theme": f"bench-theme-{i}",
+            "eisenhower": rng.choice(QUADRANTS),
+            "estimated_time": "30min",
+            "deadline": (today + timedelta(days=rng.randint(0, 60))).isoformat(),
+            "completed": i % 4 == 0,
+            "user_id": BENCH_USER_ID,
+        }
+        for i in range(theme_count)
+    ]
+
+
+async def seed(theme_count, batch_size):
+    """Insère le jeu de données par lots"""
+    tasks = build_fixture(theme_count)
+    for start in range(0, len(tasks), batch_size):
+        await supabase_service.supabase.table("tasks").insert(tasks[start:start + batch_size]).execute()
+        print(f"  {min(start + batch_size, len(tasks))}/{len(tasks)} tâches insérées")
+    print(f"✅ {len(tasks)} tâches insérées pour {BENCH_USER_ID}")
+
+
+async def cleanup():
+    """Supprime le jeu de données"""
+    await supabase_service.supabase.table("tasks").delete().eq("user_id", BENCH_USER_ID).execute()
+    print(f"✅ Tâches de {BENCH_USER_ID} supprimées")
+
+
+async def old_path():
+    """Ancien parcours: tous les thèmes, puis une requête par thème, filtrage en Python"""
+    all_tasks = []
+    for theme in await supabase_service.get_all_themes():
+        tasks = await supabase_service.get_tasks_by_theme(theme)
+        all_tasks.extend(t for t in tasks if not t.get("completed", False))
+    return all_tasks[:20]
+
+
+async def new_path():
+    """Nouveau parcours: une seule requête classée et limitée côté base"""
+    return await supabase_service.get_pending_tasks_for_recommendation(limit=20)
+
+
+async def measure(label, func, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = await func()
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    print(f"{label}: {len(result)} tâches, meilleur temps {best * 1000:.1f} ms sur {runs} exécution(s)")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la sélection des tâches à recommander")
+    parser.add_argument("--seed", action="store_true", help="Insérer le jeu de données de test")
+    parser.add_argument("--cleanup", action="store_true", help="Supprimer le jeu de données de test")
+    parser.add_argument("--themes", type=int, default=10000, help="Nombre de thèmes distincts à générer")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Taille des lots d'insertion")
+    parser.add_argument("--runs", type=int, default=3, help="Nombre d'exécutions du nouveau parcours")
+    parser.add_argument("--skip-old", action="store_true", help="Ne pas mesurer l'ancien parcours (très lent)")
+    args = parser.parse_args()
+
+    if args.seed:
+        await seed(args.themes, args.batch_size)
+        return 0
+    if args.cleanup:
+        await cleanup()
+        return 0
+
+    if not args.skip_old:
+        await measure("Avant (N+1 par thème)", old_path, 1)
+    await measure("Après (requête unique)", new_path, args.runs)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
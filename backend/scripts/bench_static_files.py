@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Banc d'essai du service des fichiers du frontend: ancien serve_react (os.path.isfile puis
+FileResponse à chaque requête, StaticFiles sur /assets) contre le manifeste en mémoire
+(services/static_files.py).
+
+Les deux variantes sont des applications FastAPI appelées directement en ASGI, sans serveur ni
+réseau, sur le build de frontend/dist s'il existe, sinon sur un build synthétique (index.html,
+bundle JS et feuille CSS de tailles réalistes). Scénarios: page d'accueil, lien profond de la SPA
+(/projets/42), bundle JS (Accept-Encoding d'un navigateur) et revalidation du bundle (If-None-Match).
+Pour chaque scénario: requêtes/s, temps par requête, statut et octets de corps envoyés.
+
+Usage:
+    python scripts/bench_static_files.py
+    python scripts/bench_static_files.py --requests 5000 --repeat 5 --dist ../frontend/dist
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from pathlib import Path
+
+# Ajouter le répertoire parent au chemin pour pouvoir importer des modules
+parent_dir = str(Path(__file__).resolve().parent.parent)
+sys.path.insert(0, parent_dir)
+
+from dotenv import load_dotenv
+
+# Chargement des variables d'environnement
+load_dotenv()
+
+from fastapi import FastAPI, Request
+from fastapi.responses import FileResponse
+from fastapi.staticfiles import StaticFiles
+
+from services.static_files import StaticManifest
+
+BROWSER_ACCEPT_ENCODING = b"gzip, deflate, br"
+
+
+def synthetic_build(root):
+    """Build Vite synthétique: index.html, bundle JS (~600 Ko) et CSS (~60 Ko) peu répétitifs"""
+    rng = random.Random(42)
+    words = ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 12))) for _ in range(4000)]
+    js_lines = []
+    while sum(len(line) for line in js_lines) < 600_000:
+        a, b, c = rng.sample(words, 3)
+        js_lines.append(f"function {a}_{len(js_lines)}({b},{c}){{return {b}.{rng.choice(words)}({c},{rng.randint(0, 9999)})}}\n")
+    css_lines = []
+    while sum(len(line) for line in css_lines) < 60_000:
+        css_lines.append(f".{rng.choice(words)}-{len(css_lines)}{{margin:{rng.randint(0, 32)}px;color:#{rng.randint(0, 0xFFFFFF):06x}}}\n")
+
+    os.makedirs(os.path.join(root, "assets"), exist_ok=True)
+    Path(root, "assets", "index-4f9a2c1e.js").write_text("".join(js_lines), encoding="utf-8")
+    Path(root, "assets", "index-8b3d7e0f.css").write_text("".join(css_lines), encoding="utf-8")
+    Path(root, "index.html").write_text(
+        '<!doctype html><html lang="fr"><head><meta charset="UTF-8" /><title>Tasky</title>'
+        '<script type="module" crossorigin src="/assets/index-4f9a2c1e.js"></script>'
+        '<link rel="stylesheet" href="/assets/index-8b3d7e0f.css"></head>'
+        '<body><div id="root"></div></body></html>\n',
+        encoding="utf-8",
+    )
+
+
+def bundle_path(dist):
+    assets = sorted(p.name for p in Path(dist, "assets").glob("*.js"))
+    return f"/assets/{assets[0]}"
+
+
+def build_legacy_app(dist):
+    """Ancien service des fichiers (app_fastapi.py avant le manifeste)"""
+    app = FastAPI()
+    app.mount("/assets", StaticFiles(directory=f"{dist}/assets"), name="assets")
+
+    @app.get("/{path:path}")
+    async def serve_react(path: str = ""):
+        if path.startswith("api"):
+            return {"detail": "Not Found"}
+        vite_path = os.path.join(dist, path)
+        if os.path.isfile(vite_path):
+            return FileResponse(vite_path)
+        index_path = os.path.join(dist, "index.html")
+        if os.path.isfile(index_path):
+            return FileResponse(index_path)
+        return {"message": "L'application frontend n'est pas encore construite."}
+
+    return app
+
+
+def build_manifest_app(dist):
+    manifest = StaticManifest(dist)
+    manifest.load()
+    app = FastAPI()
+
+    @app.get("/{path:path}")
+    async def serve_react(request: Request, path: str = ""):
+        if path.startswith("api"):
+            return {"detail": "Not Found"}
+        response = manifest.response(path, request.headers)
+        if response is not None:
+            return response
+        return {"message": "L'application frontend n'est pas encore construite."}
+
+    return app
+
+
+async def call(app, path, headers):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": b"", "headers": [(b"host", b"bench"), *headers],
+        "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+    result = {"status": None, "bytes": 0, "etag": None}
+    received = False
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # Comme un serveur: attente de la déconnexion du client (tâche annulée en fin de réponse)
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            result["status"] = message["status"]
+            result["etag"] = dict(message["headers"]).get(b"etag")
+        elif message["type"] == "http.response.body":
+            result["bytes"] += len(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return result
+
+
+async def measure(app, path, headers, args):
+    for _ in range(20):
+        last = await call(app, path, headers)
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        for _ in range(args.requests):
+            await call(app, path, headers)
+        timings.append((time.perf_counter() - start) / args.requests)
+    return min(timings), last
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Service des fichiers du frontend: ancien serve_react contre manifeste en mémoire")
+    parser.add_argument("--requests", type=int, default=2000, help="Requêtes par mesure")
+    parser.add_argument("--repeat", type=int, default=3, help="Nombre de mesures (meilleure retenue)")
+    parser.add_argument("--dist", default=os.path.abspath(os.path.join(parent_dir, "../frontend/dist")),
+                        help="Build du frontend (synthétique s'il n'existe pas)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dist = args.dist
+        if not os.path.isfile(os.path.join(dist, "index.html")):
+            dist = tmp
+            synthetic_build(dist)
+            print("frontend/dist absent: build synthétique")
+        sizes = {p.name: p.stat().st_size for p in Path(dist).rglob("*") if p.is_file()}
+        print(f"Build: {', '.join(f'{name} ({size // 1024} Ko)' for name, size in sorted(sizes.items()))}")
+        print(f"{args.requests} requêtes ASGI par mesure, meilleure de {args.repeat} mesures\n")
+
+        apps = {"ancien serve_react": build_legacy_app(dist), "manifeste en mémoire": build_manifest_app(dist)}
+        bundle = bundle_path(dist)
+        browser = [(b"accept-encoding", BROWSER_ACCEPT_ENCODING)]
+
+        print(f"{'scénario':<24}{'variante':<24}{'requêtes/s':>12}{'µs/requête':>12}{'statut':>8}{'octets':>10}")
+        for label, path, revalidate in (
+            ("page d'accueil", "/", False),
+            ("lien profond", "/projets/42", False),
+            ("bundle JS", bundle, False),
+            ("revalidation bundle", bundle, True),
+        ):
+            for variant, app in apps.items():
+                headers = list(browser)
+                if revalidate:
+                    first = await call(app, path, headers)
+                    if first["etag"]:
+                        headers.append((b"if-none-match", first["etag"]))
+                per_request, last = await measure(app, path, headers, args)
+                print(f"{label:<24}{variant:<24}{1 / per_request:>12.0f}{per_request * 1e6:>12.1f}"
+                      f"{last['status']:>8}{last['bytes']:>10}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark de charge de la couche d'accès Supabase.
+
+Compare la latence (p50/p95/p99) de N requêtes concurrentes:
+- "avant": client supabase synchrone appelé depuis une coroutine (bloque la boucle)
+- "après": client PostgREST asynchrone avec pool de connexions partagé
+
+Usage:
+    python scripts/bench_supabase_async.py --concurrency 200 --table tasks
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+from pathlib import Path
+
+# Ajouter le répertoire parent au chemin pour pouvoir importer des modules
+parent_dir = str(Path(__file__).resolve().parent.parent)
+sys.path.insert(0, parent_dir)
+
+from dotenv import load_dotenv
+from supabase import create_client
+from services.async_supabase import create_async_client
+
+# Chargement des variables d'environnement
+load_dotenv()
+
+
+def percentile(values, pct):
+    """Retourne le percentile pct (0-100) d'une liste de valeurs"""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def report(label, latencies, total_time):
+    """Affiche les statistiques de latence d'une série de requêtes"""
+    print(f"\n{label}")
+    print(f"  requêtes : {len(latencies)} en {total_time:.2f}s ({len(latencies) / total_time:.1f} req/s)")
+    print(f"  p50      : {percentile(latencies, 50) * 1000:.1f} ms")
+    print(f"  p95      : {percentile(latencies, 95) * 1000:.1f} ms")
+    print(f"  p99      : {percentile(latencies, 99) * 1000:.1f} ms")
+    print(f"  moyenne  : {statistics.mean(latencies) * 1000:.1f} ms")
+
+
+async def run_concurrently(query, concurrency):
+    """
+    Lance `concurrency` requêtes simultanées et retourne leurs latences, mesurées depuis le
+    lancement commun: avec le client synchrone, l'attente derrière les appels bloquants
+    précédents fait partie de la latence vue par le client
+    """
+    async def timed():
+        await query()
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(timed() for _ in range(concurrency)))
+    return list(latencies), time.perf_counter() - start
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark sync vs async de l'accès Supabase")
+    parser.add_argument("--concurrency", type=int, default=200, help="Nombre de requêtes simultanées")
+    parser.add_argument("--table", default="tasks", help="Table interrogée")
+    parser.add_argument("--limit", type=int, default=20, help="Nombre de lignes par requête")
+    args = parser.parse_args()
+
+    url = os.environ.get("SUPABASE_URL")
+    key = os.environ.get("SUPABASE_KEY")
+    if not url or not key:
+        print("❌ SUPABASE_URL et SUPABASE_KEY doivent être définies")
+        return 1
+
+    sync_client = create_client(url, key)
+    async_client = create_async_client(url, key)
+
+    async def sync_query():
+        # Reproduit l'ancien comportement: appel bloquant depuis un handler async
+        sync_client.table(args.table).select("id").limit(args.limit).execute()
+
+    async def async_query():
+        await async_client.table(args.table).select("id").limit(args.limit).execute()
+
+    # Préchauffage des connexions
+    await async_query()
+    await sync_query()
+
+    latencies, total = await run_concurrently(sync_query, args.concurrency)
+    report(f"Avant (client synchrone, {args.concurrency} requêtes concurrentes)", latencies, total)
+
+    latencies, total = await run_concurrently(async_query, args.concurrency)
+    report(f"Après (client asynchrone, {args.concurrency} requêtes concurrentes)", latencies, total)
+
+    await async_client.aclose()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Banc d'essai du coût de Sentry par requête selon l'échantillonnage des traces.
+
+Une petite application FastAPI (fichiers statiques et SPA, /health, routes CRUD, route LLM simulée)
+est appelée directement en ASGI, avec un mélange de requêtes proche de la production:
+~40% statiques/SPA, 10% /health, 45% CRUD (dont quelques réponses 500), 5% appels au LLM.
+Chaque variante tourne dans un interpréteur séparé (Sentry s'initialise une fois par processus):
+- sans Sentry (référence);
+- ancienne configuration: traces_sample_rate=1.0, chaque requête produit une transaction;
+- politique par route (services/monitoring.py: traces_sampler + before_send_transaction).
+Le DSN est factice et le transport remplace l'envoi réseau: il sérialise et compresse chaque
+enveloppe comme le transport HTTP, de façon synchrone pour compter ce coût dans la mesure.
+Pour chaque variante: temps et CPU par requête, surcoût par rapport à la référence,
+transactions envoyées et octets compressés pour 1000 requêtes, et CPU consommé au débit --rps.
+
+Usage:
+    python scripts/bench_trace_sampling.py
+    python scripts/bench_trace_sampling.py --requests 20000 --repeat 5 --rps 2000
+"""
+import os
+import sys
+import gzip
+import json
+import time
+import asyncio
+import argparse
+import statistics
+from pathlib import Path
+
+# Ajouter le répertoire parent au chemin pour pouvoir importer des modules
+parent_dir = str(Path(__file__).resolve().parent.parent)
+sys.path.insert(0, parent_dir)
+
+from dotenv import load_dotenv
+
+# Chargement des variables d'environnement
+load_dotenv()
+
+BENCH_DSN = "https://public@example.com/1"
+
+VARIANTS = [
+    ("none", "sans Sentry"),
+    ("legacy", "traces_sample_rate=1.0"),
+    ("policy", "politique par route"),
+]
+
+# Envoi simulé: compteurs du processus
+sent = {"transactions": 0, "errors": 0, "bytes": 0}
+
+
+def build_transport():
+    from sentry_sdk.transport import Transport
+
+    class CountingTransport(Transport):
+        """Sérialise et compresse les enveloppes comme le transport HTTP, sans les envoyer"""
+
+        def capture_envelope(self, envelope):
+            sent["bytes"] += len(gzip.compress(envelope.serialize()))
+            for item in envelope.items:
+                if item.type == "transaction":
+                    sent["transactions"] += 1
+                elif item.type == "event":
+                    sent["errors"] += 1
+
+        def capture_event(self, event):
+            from sentry_sdk.envelope import Envelope
+            envelope = Envelope()
+            envelope.add_event(event)
+            self.capture_envelope(envelope)
+
+    return CountingTransport
+
+
+def init_variant(variant):
+    if variant == "legacy":
+        import sentry_sdk
+        from sentry_sdk.integrations.fastapi import FastApiIntegration
+        from sentry_sdk.integrations.httpx import HttpxIntegration
+        from sentry_sdk.integrations.starlette import StarletteIntegration
+
+        sentry_sdk.init(
+            dsn=BENCH_DSN,
+            traces_sample_rate=1.0,
+            auto_enabling_integrations=False,
+            integrations=[StarletteIntegration(), FastApiIntegration(), HttpxIntegration()],
+            transport=build_transport(),
+        )
+    elif variant == "policy":
+        os.environ["SENTRY_DSN"] = BENCH_DSN
+        from services.monitoring import init_sentry
+        init_sentry(transport=build_transport())
+
+
+def build_app():
+    from fastapi import FastAPI, HTTPException
+    from fastapi.responses import PlainTextResponse
+
+    app = FastAPI()
+
+    @app.get("/health")
+    async def health():
+        return {"status": "healthy"}
+
+    @app.get("/api/tasks/{task_id}")
+    async def get_task(task_id: str):
+        if task_id == "boom":
+            raise HTTPException(status_code=500, detail="Erreur simulée")
+        return {"id": task_id, "title": "Tâche", "completed": False}
+
+    @app.put("/api/tasks/{task_id}")
+    async def update_task(task_id: str):
+        return {"id": task_id, "completed": True}
+
+    @app.post("/api/messages")
+    async def send_message():
+        # Appel au LLM simulé (réponse immédiate: seul le coût de Sentry est mesuré)
+        return {"response": "Bonjour"}
+
+    @app.get("/{path:path}")
+    async def serve_react(path: str = ""):
+        return PlainTextResponse("<html></html>")
+
+    return app
+
+
+def requests_mix(count):
+    """(méthode, chemin) pour 20 requêtes: 8 statiques/SPA, 2 santé, 9 CRUD, 1 LLM"""
+    for i in range(count):
+        slot = i % 20
+        if slot < 4:
+            yield "GET", f"/assets/index-{slot}.js"
+        elif slot < 8:
+            yield "GET", f"/projets/{i}"
+        elif slot < 10:
+            yield "GET", "/health"
+        elif slot < 17:
+            yield "GET", "/api/tasks/boom" if i % 1000 == 10 else f"/api/tasks/{i}"
+        elif slot < 19:
+            yield "PUT", f"/api/tasks/{i}"
+        else:
+            yield "POST", "/api/messages"
+
+
+async def call(app, method, path):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method,
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": b"", "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+
+    received = False
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # Comme un serveur: attente de la déconnexion du client (tâche annulée en fin de réponse)
+        await asyncio.Event().wait()
+
+    async def send(message):
+        pass
+
+    await app(scope, receive, send)
+
+
+async def run_variant(variant, args):
+    """Mesure d'une variante dans le processus courant; résultat en JSON sur la sortie standard"""
+    init_variant(variant)
+    app = build_app()
+    # Démarrage de la pile de middlewares
+    for method, path in requests_mix(200):
+        await call(app, method, path)
+    for name in sent:
+        sent[name] = 0
+
+    wall, cpu = [], []
+    for _ in range(args.repeat):
+        start, start_cpu = time.perf_counter(), time.process_time()
+        for method, path in requests_mix(args.requests):
+            await call(app, method, path)
+        wall.append((time.perf_counter() - start) / args.requests * 1e6)
+        cpu.append((time.process_time() - start_cpu) / args.requests * 1e6)
+
+    total = args.requests * args.repeat
+    print(json.dumps({
+        "wall_us": statistics.median(wall),
+        "cpu_us": statistics.median(cpu),
+        "transactions_per_1000": sent["transactions"] * 1000 / total,
+        "kb_per_1000": sent["bytes"] * 1000 / total / 1024,
+    }))
+
+
+async def run_subprocess(variant, args):
+    env = dict(os.environ)
+    env.pop("SENTRY_DSN", None)
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, __file__, "--variant", variant,
+        "--requests", str(args.requests), "--repeat", str(args.repeat),
+        cwd=parent_dir, env=env,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+    )
+    stdout, stderr = await process.communicate()
+    if process.returncode != 0:
+        raise RuntimeError(f"Échec de la variante {variant}:\n{stderr.decode(errors='replace')[-2000:]}")
+    return json.loads(stdout.decode().strip().splitlines()[-1])
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Coût de Sentry par requête selon l'échantillonnage des traces")
+    parser.add_argument("--requests", type=int, default=10000, help="Requêtes par mesure")
+    parser.add_argument("--repeat", type=int, default=3, help="Nombre de mesures (médiane)")
+    parser.add_argument("--rps", type=int, default=1000, help="Débit pour l'extrapolation du CPU consommé")
+    parser.add_argument("--variant", choices=[name for name, _ in VARIANTS], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        await run_variant(args.variant, args)
+        return 0
+
+    print(f"{args.requests} requêtes ASGI par mesure, médiane de {args.repeat} mesures, "
+          f"extrapolation à {args.rps} requêtes/s\n")
+    results = {name: await run_subprocess(name, args) for name, _ in VARIANTS}
+    baseline = results["none"]
+
+    print(f"{'variante':<26}{'µs/requête':>12}{'CPU µs':>10}{'surcoût CPU':>14}"
+          f"{'tx/1000':>10}{'Ko/1000':>10}{'cœurs':>8}")
+    for name, label in VARIANTS:
+        result = results[name]
+        overhead = result["cpu_us"] - baseline["cpu_us"]
+        cores = max(overhead, 0) * args.rps / 1e6
+        print(f"{label:<26}{result['wall_us']:>12.1f}{result['cpu_us']:>10.1f}"
+              f"{(f'{overhead:.1f}µs' if name != 'none' else '-'):>14}"
+              f"{result['transactions_per_1000']:>10.1f}{result['kb_per_1000']:>10.1f}"
+              f"{(f'{cores:.2f}' if name != 'none' else '-'):>8}")
+    print("\ncœurs: CPU consommé par Sentry (surcoût) au débit --rps")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
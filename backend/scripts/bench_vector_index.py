@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Benchmark de l'index vectoriel local (services/vector_index.py): rappel et latence.
+
+Mode synthétique (par défaut): corpus de vecteurs regroupés en thèmes, avec une métadonnée
+"category". Mesure la recherche exacte (flat) et l'IVF int8, avec et sans filtre; le rappel@k
+de l'IVF est calculé par rapport à la recherche exacte.
+
+Mode --rpc: charge l'index depuis la table documents et compare ses résultats et sa latence
+au RPC match_documents, en utilisant des embeddings de documents existants comme requêtes.
+
+Usage:
+    python scripts/bench_vector_index.py --documents 50000 --queries 200
+    python scripts/bench_vector_index.py --rpc --queries 50
+"""
+import sys
+import time
+import asyncio
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+# Ajouter le répertoire parent au chemin pour pouvoir importer des modules
+parent_dir = str(Path(__file__).resolve().parent.parent)
+sys.path.insert(0, parent_dir)
+
+from dotenv import load_dotenv
+from services.supabase_service import supabase_service
+from services.vector_index import LocalVectorIndex, normalize
+
+# Chargement des variables d'environnement
+load_dotenv()
+
+CATEGORIES = ["travail", "santé", "finances", "famille", "projets", "lecture", "sport", "voyage"]
+
+
+def build_corpus(count, dimension, topics, seed=42):
+    """Génère des documents regroupés autour de `topics` centres"""
+    rng = np.random.default_rng(seed)
+    centers = normalize(rng.standard_normal((topics, dimension)).astype(np.float32))
+    topic_of = rng.integers(0, topics, count)
+    vectors = normalize(centers[topic_of] + 0.6 * normalize(rng.standard_normal((count, dimension))).astype(np.float32))
+    documents = [
+        {
+            "id": f"doc-{i}",
+            "content": f"Document {i}",
+            "metadata": {"category": CATEGORIES[i % len(CATEGORIES)], "rare": i % 500 == 0},
+            "embedding": vectors[i],
+        }
+        for i in range(count)
+    ]
+    return documents, centers, rng
+
+
+def make_queries(centers, count, rng):
+    topic_of = rng.integers(0, len(centers), count)
+    noise = normalize(rng.standard_normal((count, centers.shape[1]))).astype(np.float32)
+    return normalize(centers[topic_of] + 0.6 * noise)
+
+
+def measure(index, queries, k, filters=None):
+    """Latences (ms) et identifiants retournés pour chaque requête"""
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        found = index.search(query, limit=k, filters=filters)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append([doc["id"] for doc in found])
+    return np.array(latencies), results
+
+
+def recall(results, reference, k):
+    hits = sum(len(set(r) & set(ref)) for r, ref in zip(results, reference))
+    expected = sum(min(k, len(ref)) for ref in reference)
+    return hits / expected if expected else 1.0
+
+
+def report(label, latencies, value_recall=None):
+    line = f"{label:<32} p50 {np.percentile(latencies, 50):7.2f} ms  p95 {np.percentile(latencies, 95):7.2f} ms"
+    if value_recall is not None:
+        line += f"  rappel@k {value_recall:.3f}"
+    print(line)
+
+
+def run_synthetic(args):
+    documents, centers, rng = build_corpus(args.documents, args.dimension, args.topics)
+    queries = make_queries(centers, args.queries, rng)
+
+    start = time.perf_counter()
+    flat = LocalVectorIndex(ivf_min_documents=args.documents + 1)
+    flat.build(documents)
+    print(f"Construction flat: {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    start = time.perf_counter()
+    ivf = LocalVectorIndex(ivf_min_documents=1, nprobe=args.nprobe)
+    ivf.build(documents)
+    print(f"Construction IVF int8: {(time.perf_counter() - start) * 1000:.0f} ms "
+          f"({len(ivf.centroids)} listes, nprobe {args.nprobe})")
+    print(f"Mémoire des vecteurs: flat {flat.vectors.nbytes / 1e6:.0f} Mo, "
+          f"IVF int8 {(ivf.codes.nbytes + ivf.scales.nbytes) / 1e6:.0f} Mo")
+
+    for label, filters in (("", None), (" + filtre catégorie", {"category": "santé"}), (" + filtre rare", {"rare": True})):
+        flat_latencies, reference = measure(flat, queries, args.k, filters)
+        ivf_latencies, found = measure(ivf, queries, args.k, filters)
+        report(f"flat{label}", flat_latencies)
+        report(f"ivf int8{label}", ivf_latencies, recall(found, reference, args.k))
+
+
+async def run_rpc(args):
+    index = LocalVectorIndex(nprobe=args.nprobe)
+    start = time.perf_counter()
+    await index.load()
+    print(f"Chargement de {len(index)} documents ({index.mode}): {(time.perf_counter() - start) * 1000:.0f} ms")
+    if not len(index):
+        print("Aucun document dans la table documents")
+        return 1
+
+    rng = np.random.default_rng(0)
+    live = np.flatnonzero(index.alive[:index.size])
+    rows = rng.choice(live, min(args.queries, len(live)), replace=False)
+    dense = index._dense_vectors()
+    queries = normalize(dense[rows] + 0.05 * rng.standard_normal(dense[rows].shape).astype(np.float32))
+
+    local_latencies, local_results = measure(index, queries, args.k)
+    rpc_latencies, rpc_results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        response = await supabase_service.supabase.rpc('match_documents', {
+            'query_embedding': query.tolist(), 'match_threshold': 0.0, 'match_count': args.k
+        }).execute()
+        rpc_latencies.append((time.perf_counter() - start) * 1000)
+        rpc_results.append([str(doc["id"]) for doc in response.data])
+
+    report("RPC match_documents", np.array(rpc_latencies))
+    report(f"index local ({index.mode})", local_latencies, recall(local_results, rpc_results, args.k))
+    return 0
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark de l'index vectoriel local")
+    parser.add_argument("--documents", type=int, default=50000, help="Taille du corpus synthétique")
+    parser.add_argument("--dimension", type=int, default=1536, help="Dimension des embeddings synthétiques")
+    parser.add_argument("--topics", type=int, default=200, help="Nombre de thèmes du corpus synthétique")
+    parser.add_argument("--queries", type=int, default=200, help="Nombre de requêtes")
+    parser.add_argument("--k", type=int, default=5, help="Nombre de résultats par requête")
+    parser.add_argument("--nprobe", type=int, default=16, help="Listes IVF parcourues par requête")
+    parser.add_argument("--rpc", action="store_true", help="Comparer au RPC match_documents sur la table documents")
+    args = parser.parse_args()
+
+    if args.rpc:
+        return await run_rpc(args)
+    run_synthetic(args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
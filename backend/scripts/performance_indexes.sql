@@ -0,0 +1,333 @@
+-- Index et fonctions SQL de performance
+-- Exécuter ce script dans l'interface SQL de Supabase (idempotent)
+
+-- ============================================================
+-- Tâches: pagination keyset sur (created_at, id) et filtres
+-- ============================================================
+
+-- Tri principal de GET /api/tasks (ORDER BY created_at DESC, id DESC)
+CREATE INDEX IF NOT EXISTS idx_tasks_created_at_id
+ON public.tasks (created_at DESC, id DESC);
+
+-- Même tri restreint à un utilisateur
+CREATE INDEX IF NOT EXISTS idx_tasks_user_created_at_id
+ON public.tasks (user_id, created_at DESC, id DESC);
+
+-- Filtres par thème et par catégorie
+CREATE INDEX IF NOT EXISTS idx_tasks_theme_created_at
+ON public.tasks (theme, created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_tasks_category_created_at
+ON public.tasks (category, created_at DESC, id DESC);
+
+-- ============================================================
+-- Recommandations: tâches en attente classées côté base
+-- ============================================================
+
+-- Rang d'un quadrant d'Eisenhower (1 = le plus prioritaire)
+CREATE OR REPLACE FUNCTION public.eisenhower_rank(quadrant TEXT)
+RETURNS INTEGER
+LANGUAGE sql IMMUTABLE PARALLEL SAFE
+AS $$
+    SELECT CASE quadrant
+        WHEN 'important_urgent' THEN 1
+        WHEN 'important_not_urgent' THEN 2
+        WHEN 'not_important_urgent' THEN 3
+        WHEN 'not_important_not_urgent' THEN 4
+        ELSE 5
+    END
+$$;
+
+-- Index partiel sur les seules tâches en attente, dans l'ordre de recommandation
+CREATE INDEX IF NOT EXISTS idx_tasks_pending_recommendation
+ON public.tasks (deadline ASC NULLS LAST, public.eisenhower_rank(eisenhower), id)
+WHERE completed IS NOT TRUE;
+
+-- Les p_limit tâches en attente les plus prioritaires (deadline puis quadrant d'Eisenhower)
+CREATE OR REPLACE FUNCTION public.pending_tasks_for_recommendation(
+    p_limit INTEGER DEFAULT 20,
+    p_user_id TEXT DEFAULT NULL
+)
+RETURNS SETOF public.tasks
+LANGUAGE sql STABLE
+AS $$
+    SELECT *
+    FROM public.tasks t
+    WHERE t.completed IS NOT TRUE
+      AND (p_user_id IS NULL OR t.user_id = p_user_id)
+    ORDER BY t.deadline ASC NULLS LAST, public.eisenhower_rank(t.eisenhower), t.id
+    LIMIT p_limit
+$$;
+
+-- ============================================================
+-- Habitudes: complétions par habitude et par période
+-- ============================================================
+
+-- Statistiques: complétions de plusieurs habitudes sur une fenêtre de dates
+CREATE INDEX IF NOT EXISTS idx_habit_completions_habit_date
+ON public.habit_completions (habit_id, completion_date);
+
+-- État de streak maintenu de façon incrémentale à chaque complétion
+-- (recalcul complet: scripts/backfill_habit_streaks.py)
+ALTER TABLE public.habits ADD COLUMN IF NOT EXISTS streak INTEGER DEFAULT 0;
+ALTER TABLE public.habits ADD COLUMN IF NOT EXISTS longest_streak INTEGER DEFAULT 0;
+ALTER TABLE public.habits ADD COLUMN IF NOT EXISTS last_completion_date DATE;
+ALTER TABLE public.habits ADD COLUMN IF NOT EXISTS completion_count INTEGER DEFAULT 0;
+
+-- ============================================================
+-- Messages: fenêtre de contexte et pagination par conversation
+-- ============================================================
+
+-- Derniers messages d'une conversation (ORDER BY created_at DESC, id DESC LIMIT n)
+CREATE INDEX IF NOT EXISTS idx_messages_conversation_created_at_id
+ON public.messages (conversation_id, created_at DESC, id DESC);
+
+-- Résumé incrémental des échanges sortis de la fenêtre de contexte
+ALTER TABLE public.conversations ADD COLUMN IF NOT EXISTS summary TEXT;
+ALTER TABLE public.conversations ADD COLUMN IF NOT EXISTS summarized_until TIMESTAMP WITH TIME ZONE;
+
+-- ============================================================
+-- Documents: chargement et synchronisation de l'index vectoriel local
+-- ============================================================
+
+-- Lecture par pages keyset (ORDER BY updated_at, id) des documents modifiés
+CREATE INDEX IF NOT EXISTS idx_documents_updated_at_id
+ON public.documents (updated_at, id);
+
+-- updated_at suit chaque écriture, pour que la synchronisation incrémentale la voie.
+-- clock_timestamp() (heure de l'écriture) plutôt que NOW() (début de la transaction): une longue
+-- transaction ne recule pas ses lignes loin derrière le curseur des index locaux
+CREATE OR REPLACE FUNCTION public.set_documents_updated_at()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    NEW.updated_at := clock_timestamp();
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS documents_set_updated_at ON public.documents;
+CREATE TRIGGER documents_set_updated_at
+BEFORE INSERT OR UPDATE ON public.documents
+FOR EACH ROW EXECUTE FUNCTION public.set_documents_updated_at();
+
+-- ============================================================
+-- Documents: recherche par similarité avec filtres sur les métadonnées
+-- ============================================================
+
+-- Filtres sur les métadonnées (opérateurs @> et @? avec jsonpath)
+CREATE INDEX IF NOT EXISTS idx_documents_metadata_gin
+ON public.documents USING GIN (metadata jsonb_path_ops);
+
+-- Valeurs texte acceptées pour une clé d'un filtre (une valeur ou une liste de valeurs),
+-- comparées à metadata->>'clé' comme dans l'application (services/document_index.py)
+CREATE OR REPLACE FUNCTION public.documents_filter_values(value JSONB)
+RETURNS TEXT[]
+LANGUAGE sql IMMUTABLE
+AS $$
+    SELECT COALESCE(array_agg(item #>> '{}'), '{}')
+    FROM jsonb_array_elements(
+        CASE WHEN jsonb_typeof(value) = 'array' THEN value ELSE jsonb_build_array(value) END
+    ) AS item;
+$$;
+
+-- Vrai si, pour chaque clé du filtre, metadata->>'clé' est l'une des valeurs texte acceptées
+CREATE OR REPLACE FUNCTION public.documents_filter_matches(metadata JSONB, filter JSONB)
+RETURNS BOOLEAN
+LANGUAGE sql IMMUTABLE
+AS $$
+    SELECT COALESCE(bool_and(COALESCE((metadata ->> f.key) = ANY (public.documents_filter_values(f.value)), FALSE)), TRUE)
+    FROM jsonb_each(filter) AS f;
+$$;
+
+-- Traduit un filtre {"clé": valeur, "clé": [valeurs acceptées]} en jsonpath indexable qui
+-- présélectionne les documents (égalités combinées par && entre clés et par || entre valeurs).
+-- Une valeur texte est cherchée sous sa forme chaîne, et sous sa forme nombre ou booléen si elle
+-- en est une ("42" retient 42 et "42"); documents_filter_matches vérifie ensuite l'égalité texte.
+CREATE OR REPLACE FUNCTION public.documents_filter_jsonpath(filter JSONB)
+RETURNS JSONPATH
+LANGUAGE plpgsql IMMUTABLE
+AS $$
+DECLARE
+    clauses TEXT[] := '{}';
+    alternatives TEXT;
+    entry RECORD;
+    accessor TEXT;
+BEGIN
+    IF filter IS NULL OR filter = '{}'::jsonb THEN
+        RETURN NULL;
+    END IF;
+    FOR entry IN SELECT key, value FROM jsonb_each(filter) LOOP
+        IF EXISTS (
+            SELECT 1
+            FROM jsonb_array_elements(
+                CASE WHEN jsonb_typeof(entry.value) = 'array' THEN entry.value ELSE jsonb_build_array(entry.value) END
+            ) AS item
+            WHERE jsonb_typeof(item) IN ('object', 'array', 'null')
+        ) THEN
+            RAISE EXCEPTION 'Filtre "%" invalide: valeur texte, nombre ou booléen attendu', entry.key
+                USING ERRCODE = 'invalid_parameter_value';
+        END IF;
+        accessor := '@.' || to_jsonb(entry.key)::text;
+        SELECT string_agg(form, ' || ') INTO alternatives
+        FROM unnest(public.documents_filter_values(entry.value)) AS accepted(text_value),
+        LATERAL (
+            SELECT accessor || ' == ' || to_jsonb(accepted.text_value)::text
+            UNION ALL
+            SELECT accessor || ' == ' || accepted.text_value
+            WHERE accepted.text_value ~ '^-?(0|[1-9][0-9]*)(\.[0-9]+)?([eE][+-]?[0-9]+)?$'
+               OR accepted.text_value IN ('true', 'false')
+        ) AS forms(form);
+        clauses := clauses || ('(' || alternatives || ')');
+    END LOOP;
+    RETURN ('$ ? (' || array_to_string(clauses, ' && ') || ')')::jsonpath;
+END;
+$$;
+
+-- Recherche par similarité où les filtres sont appliqués avant le classement:
+-- les documents filtrés sont sélectionnés par l'index GIN, puis classés exactement,
+-- ce qui garantit match_count résultats dès qu'assez de documents satisfont le filtre.
+-- Sans filtre, même parcours que match_documents (index ivfflat).
+CREATE OR REPLACE FUNCTION public.match_documents_filtered(
+    query_embedding VECTOR(1536),
+    match_threshold FLOAT DEFAULT 0.5,
+    match_count INTEGER DEFAULT 5,
+    filter JSONB DEFAULT '{}'::jsonb
+)
+RETURNS TABLE (id UUID, content TEXT, metadata JSONB, similarity FLOAT)
+LANGUAGE plpgsql STABLE
+AS $$
+DECLARE
+    filter_path JSONPATH;
+BEGIN
+    -- Une liste de valeurs acceptées vide ne retient aucun document
+    IF EXISTS (SELECT 1 FROM jsonb_each(COALESCE(filter, '{}'::jsonb)) f WHERE f.value = '[]'::jsonb) THEN
+        RETURN;
+    END IF;
+
+    filter_path := public.documents_filter_jsonpath(filter);
+    IF filter_path IS NULL THEN
+        RETURN QUERY
+        SELECT d.id, d.content, d.metadata, 1 - (d.embedding <=> query_embedding) AS similarity
+        FROM public.documents d
+        WHERE 1 - (d.embedding <=> query_embedding) > match_threshold
+        ORDER BY d.embedding <=> query_embedding
+        LIMIT match_count;
+        RETURN;
+    END IF;
+
+    RETURN QUERY
+    WITH candidates AS MATERIALIZED (
+        SELECT d.id, d.content, d.metadata, d.embedding <=> query_embedding AS distance
+        FROM public.documents d
+        WHERE d.metadata @? filter_path
+          AND public.documents_filter_matches(d.metadata, filter)
+    )
+    SELECT c.id, c.content, c.metadata, 1 - c.distance AS similarity
+    FROM candidates c
+    WHERE 1 - c.distance > match_threshold
+    ORDER BY c.distance
+    LIMIT match_count;
+END;
+$$;
+
+-- ============================================================
+-- Documents: ingestion en flux, idempotente et reprenable
+-- ============================================================
+
+-- Empreinte du contenu et des métadonnées d'un chunk: clé des upserts (ON CONFLICT (content_hash))
+ALTER TABLE public.documents ADD COLUMN IF NOT EXISTS content_hash TEXT;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_documents_content_hash
+ON public.documents (content_hash);
+
+-- Progression de l'ingestion de chaque document (reprise au premier chunk non écrit)
+CREATE TABLE IF NOT EXISTS public.document_ingestions (
+    document_key TEXT PRIMARY KEY,
+    source_hash TEXT NOT NULL,
+    filename TEXT,
+    user_id TEXT,
+    metadata JSONB DEFAULT '{}'::jsonb,
+    status TEXT NOT NULL DEFAULT 'pending',
+    chunks_committed INTEGER NOT NULL DEFAULT 0,
+    documents_written INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- ============================================================
+-- Documents: embeddings transmis sous forme compacte (EMBEDDING_STORAGE_FORMAT)
+-- ============================================================
+
+-- Embedding encodé par services/vector_codec.py: "f16:<base64>" ou "i8:<échelle>:<base64>".
+-- embedding_packed ne sert qu'au transport: le trigger ci-dessous le décode dans la colonne
+-- embedding (index ivfflat, match_documents), puis le vide pour ne stocker que le VECTOR.
+ALTER TABLE public.documents ADD COLUMN IF NOT EXISTS embedding_packed TEXT;
+
+-- Décode un embedding compact (float16 petit-boutiste, ou codes int8 multipliés par l'échelle).
+-- Un float16 vaut (mantisse + 1024 si l'exposant est non nul) * scales[signe et exposant]:
+-- les 64 facteurs (signe * 2^(max(exposant, 1) - 25)) sont calculés une fois par appel, et
+-- la boucle remplit le tableau sans power() ni tri par dimension.
+CREATE OR REPLACE FUNCTION public.unpack_embedding(packed TEXT)
+RETURNS VECTOR
+LANGUAGE plpgsql IMMUTABLE STRICT
+AS $$
+DECLARE
+    payload BYTEA;
+    scale FLOAT8;
+    scales FLOAT8[];
+    code INTEGER;
+    result FLOAT4[];
+BEGIN
+    IF packed LIKE 'f16:%' THEN
+        payload := decode(substr(packed, 5), 'base64');
+        scales := ARRAY(
+            SELECT CASE WHEN e >= 32 THEN -1.0::float8 ELSE 1.0::float8 END * power(2.0::float8, greatest(e & 31, 1) - 25)
+            FROM generate_series(0, 63) AS e
+            ORDER BY e
+        );
+        result := array_fill(0::float4, ARRAY[length(payload) / 2]);
+        FOR i IN 0 .. length(payload) / 2 - 1 LOOP
+            code := get_byte(payload, 2 * i) | (get_byte(payload, 2 * i + 1) << 8);
+            result[i + 1] := ((code & 1023) + CASE WHEN (code >> 10) & 31 = 0 THEN 0 ELSE 1024 END)
+                             * scales[((code >> 10) & 63) + 1];
+        END LOOP;
+        RETURN result::vector;
+    ELSIF packed LIKE 'i8:%' THEN
+        scale := split_part(packed, ':', 2)::float8;
+        payload := decode(split_part(packed, ':', 3), 'base64');
+        result := array_fill(0::float4, ARRAY[length(payload)]);
+        FOR i IN 0 .. length(payload) - 1 LOOP
+            code := get_byte(payload, i);
+            result[i + 1] := CASE WHEN code > 127 THEN code - 256 ELSE code END * scale;
+        END LOOP;
+        RETURN result::vector;
+    END IF;
+    RAISE EXCEPTION 'Format d''embedding compact inconnu: %', left(packed, 8);
+END;
+$$;
+
+-- embedding suit embedding_packed, qui est vidé une fois décodé
+CREATE OR REPLACE FUNCTION public.set_documents_embedding()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF NEW.embedding_packed IS NOT NULL THEN
+        NEW.embedding := public.unpack_embedding(NEW.embedding_packed);
+        NEW.embedding_packed := NULL;
+    END IF;
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS documents_set_embedding ON public.documents;
+CREATE TRIGGER documents_set_embedding
+BEFORE INSERT OR UPDATE ON public.documents
+FOR EACH ROW EXECUTE FUNCTION public.set_documents_embedding();
+
+-- Embeddings compacts conservés par une version précédente de ce trigger (déjà décodés dans
+-- embedding). Les lignes concernées changent d'updated_at et sont relues une fois par la
+-- synchronisation de l'index vectoriel.
+UPDATE public.documents SET embedding_packed = NULL WHERE embedding_packed IS NOT NULL;
@@ -0,0 +1,117 @@
+"""
+Client PostgREST asynchrone pour Supabase.
+Tous les appels passent par une session httpx partagée (pool de connexions keep-alive),
+ce qui évite de bloquer la boucle d'événements d'uvicorn pendant les allers-retours réseau.
+"""
+import os
+import logging
+from typing import Optional
+
+import httpx
+from dotenv import load_dotenv
+from postgrest import AsyncPostgrestClient
+from postgrest.constants import DEFAULT_POSTGREST_CLIENT_HEADERS
+
+from services.container import container
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Chargement des variables d'environnement
+load_dotenv()
+
+# Paramètres du pool de connexions (partagé par toutes les requêtes d'un worker)
+POOL_MAX_CONNECTIONS = int(os.environ.get("SUPABASE_POOL_MAX_CONNECTIONS", "100"))
+POOL_MAX_KEEPALIVE = int(os.environ.get("SUPABASE_POOL_MAX_KEEPALIVE", "20"))
+REQUEST_TIMEOUT = float(os.environ.get("SUPABASE_TIMEOUT", "10"))
+
+
+class PooledPostgrestClient(AsyncPostgrestClient):
+    """Client PostgREST asynchrone dont la session httpx utilise un pool de connexions borné"""
+
+    def create_session(self, base_url, headers, timeout, verify=True):
+        return httpx.AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            verify=verify,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=POOL_MAX_KEEPALIVE,
+            ),
+        )
+
+
+def create_async_client(url: str, key: str) -> PooledPostgrestClient:
+    """
+    Crée un client PostgREST asynchrone pour un projet Supabase
+
+    Args:
+        url: URL du projet Supabase
+        key: Clé API (anon ou service)
+
+    Returns:
+        Un client PostgREST asynchrone
+    """
+    headers = {
+        **DEFAULT_POSTGREST_CLIENT_HEADERS,
+        "apikey": key,
+        "Authorization": f"Bearer {key}",
+    }
+    return PooledPostgrestClient(
+        f"{url.rstrip('/')}/rest/v1",
+        headers=headers,
+        timeout=REQUEST_TIMEOUT,
+    )
+
+
+def get_async_client(admin: bool = False) -> Optional[PooledPostgrestClient]:
+    """
+    Retourne le client asynchrone partagé (créé au premier appel)
+
+    Args:
+        admin: Si True, utilise la clé de service (SUPABASE_SERVICE_KEY)
+
+    Returns:
+        Le client partagé, ou None si les variables d'environnement ne sont pas définies
+    """
+    url = os.environ.get("SUPABASE_URL", "").strip()
+    key_name = "SUPABASE_SERVICE_KEY" if admin else "SUPABASE_KEY"
+    key = os.environ.get(key_name, "").strip()
+    if not url or not key:
+        logger.warning(f"Les variables d'environnement SUPABASE_URL et {key_name} ne sont pas définies")
+        return None
+    return container.register(
+        f"supabase.{'admin' if admin else 'default'}",
+        lambda: create_async_client(url, key),
+        close=lambda client: client.aclose(),
+    ).get()
+
+
+def order_by(query, *columns: str):
+    """
+    Trie une requête sur plusieurs colonnes (ex: order_by(query, "created_at.desc", "id.desc")).
+    postgrest-py 0.13 ajoute un paramètre `order` par appel à .order(), alors que PostgREST
+    attend une seule liste séparée par des virgules.
+    """
+    query.params = query.params.add("order", ",".join(columns))
+    return query
+
+
+def or_filter(query, expression: str):
+    """
+    Ajoute un filtre logique `or` PostgREST (ex: "a.lt.1,and(a.eq.1,b.lt.2)"),
+    que postgrest-py 0.13 n'expose pas.
+    """
+    query.params = query.params.add("or", f"({expression})")
+    return query
+
+
+def returning(query, columns: str):
+    """
+    Restreint les colonnes renvoyées par une écriture (insert, upsert, update) à `columns`,
+    que postgrest-py 0.13 ne permet pas de choisir (il renvoie toute la ligne).
+    """
+    query.params = query.params.add("select", columns)
+    return query
@@ -0,0 +1,164 @@
+"""
+Cache des contenus coûteux à produire, comme les réponses générées par le LLM.
+
+Les entrées expirent après un TTL. Le backend est choisi au démarrage:
+- en mémoire (par défaut): LRU borné, propre à chaque worker;
+- Redis si REDIS_URL est défini: partagé entre workers et redémarrages.
+Les clés sont des empreintes SHA-256 des entrées (contenu adressé), et chaque cache
+expose ses hits/misses dans les métriques Prometheus.
+"""
+import os
+import time
+import json
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from prometheus_client import Counter
+
+from services.container import container
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", "1024"))
+
+# Métriques Prometheus
+CACHE_HITS = Counter('cache_hits_total', 'Lectures servies par le cache', ['cache'])
+CACHE_MISSES = Counter('cache_misses_total', 'Lectures absentes du cache', ['cache'])
+
+
+class TTLCache:
+    """
+    Backend en mémoire: cache clé -> valeur borné en taille (éviction LRU),
+    dont les entrées expirent après `ttl` secondes.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: float = 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Any]:
+        """Retourne la valeur associée à la clé, ou None si elle est absente ou expirée"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        """Enregistre une valeur (évince l'entrée la moins récemment utilisée si le cache est plein)"""
+        self._entries[key] = (value, time.monotonic() + (ttl if ttl is not None else self.ttl))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def delete(self, key: str):
+        """Supprime une entrée si elle existe"""
+        self._entries.pop(key, None)
+
+    async def aclose(self):
+        self._entries.clear()
+
+
+class RedisCache:
+    """
+    Backend Redis: les valeurs sont sérialisées en JSON et expirent côté serveur.
+    L'éviction LRU est assurée par la politique maxmemory du serveur (allkeys-lru).
+    """
+
+    def __init__(self, url: str, ttl: float = 3600):
+        import redis.asyncio as redis
+
+        self.ttl = ttl
+        self.client = redis.from_url(url)
+
+    async def get(self, key: str) -> Optional[Any]:
+        raw = await self.client.get(key)
+        return json.loads(raw) if raw is not None else None
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        expire = int(ttl if ttl is not None else self.ttl)
+        await self.client.set(key, json.dumps(value, ensure_ascii=False, default=str), ex=max(expire, 1))
+
+    async def delete(self, key: str):
+        await self.client.delete(key)
+
+    async def aclose(self):
+        await self.client.close()
+
+
+def content_hash(inputs: Any) -> str:
+    """Empreinte SHA-256 stable d'entrées JSON (ordre des clés ignoré)"""
+    canonical = json.dumps(inputs, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Cache nommé dont les clés sont calculées à partir des entrées qui déterminent la réponse.
+    Une erreur du backend est journalisée et traitée comme une absence: le cache ne fait
+    jamais échouer une requête.
+    """
+
+    def __init__(self, name: str, ttl: float = 3600, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.name = name
+        self.ttl = ttl
+        redis_url = os.environ.get("REDIS_URL", "").strip()
+        # Backend créé au premier accès (pas de client Redis à l'import des modules)
+        self._backend = container.register(
+            f"cache.{name}",
+            lambda: RedisCache(redis_url, ttl=ttl) if redis_url else TTLCache(max_entries=max_entries, ttl=ttl),
+            close=lambda backend: backend.aclose(),
+        )
+
+    @property
+    def backend(self):
+        return self._backend.get()
+
+    def key(self, inputs: Any) -> str:
+        return f"cache:{self.name}:{content_hash(inputs)}"
+
+    async def get(self, inputs: Any) -> Optional[Any]:
+        """Retourne la réponse en cache pour ces entrées, ou None"""
+        try:
+            value = await self.backend.get(self.key(inputs))
+        except Exception as e:
+            logger.error(f"Erreur lors de la lecture du cache '{self.name}': {str(e)}")
+            value = None
+        (CACHE_HITS if value is not None else CACHE_MISSES).labels(cache=self.name).inc()
+        return value
+
+    async def set(self, inputs: Any, value: Any, ttl: Optional[float] = None):
+        """Enregistre la réponse produite pour ces entrées"""
+        try:
+            await self.backend.set(self.key(inputs), value, ttl)
+        except Exception as e:
+            logger.error(f"Erreur lors de l'écriture dans le cache '{self.name}': {str(e)}")
+
+    async def delete(self, inputs: Any):
+        try:
+            await self.backend.delete(self.key(inputs))
+        except Exception as e:
+            logger.error(f"Erreur lors de la suppression dans le cache '{self.name}': {str(e)}")
+
+
+_caches: Dict[str, ResponseCache] = {}
+
+
+def get_response_cache(name: str, ttl: float = 3600) -> ResponseCache:
+    """Retourne le cache nommé (créé au premier appel, partagé ensuite)"""
+    if name not in _caches:
+        _caches[name] = ResponseCache(name, ttl=ttl)
+    return _caches[name]
+
+
+def llm_cache_inputs(model: str, messages: List[Dict[str, Any]], **params) -> Dict[str, Any]:
+    """Entrées qui déterminent une réponse du LLM: modèle, messages (données incluses) et paramètres"""
+    return {"model": model, "messages": messages, "params": params}
@@ -0,0 +1,112 @@
+"""
+Conteneur des ressources partagées du processus (pools de connexions, encodeurs de tokens, ...).
+
+Chaque ressource est déclarée par un nom, une fabrique et, si besoin, une fonction de fermeture.
+Elle n'est construite qu'au premier accès puis partagée par tout le processus: importer
+l'application ne crée aucun client, et chaque worker uvicorn ne paie que les ressources
+qu'il utilise réellement. Le lifespan de l'application (app_fastapi.py) ferme à l'arrêt
+les ressources qui ont été créées, dans l'ordre inverse de leur création.
+"""
+import inspect
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+
+class Resource:
+    """Ressource construite au premier accès (accès concurrents depuis des threads possibles)"""
+
+    def __init__(self, name: str, factory: Callable[[], Any], close: Optional[Callable[[Any], Any]] = None):
+        self.name = name
+        self.factory = factory
+        self.close = close
+        self._value = None
+        self._created = False
+        self._lock = threading.Lock()
+
+    @property
+    def created(self) -> bool:
+        return self._created
+
+    def get(self) -> Any:
+        """Retourne la ressource, en la construisant au premier appel"""
+        if not self._created:
+            with self._lock:
+                if not self._created:
+                    self._value = self.factory()
+                    self._created = True
+        return self._value
+
+    async def aclose(self):
+        """Ferme la ressource si elle a été créée (elle sera reconstruite au prochain accès)"""
+        if not self._created:
+            return
+        value, self._value, self._created = self._value, None, False
+        if self.close is not None:
+            result = self.close(value)
+            if inspect.isawaitable(result):
+                await result
+
+
+class Container:
+    """Registre des ressources partagées du processus"""
+
+    def __init__(self):
+        self._resources: Dict[str, Resource] = {}
+        # Noms des ressources créées, dans l'ordre de création
+        self._creation_order: List[str] = []
+        self._lock = threading.Lock()
+
+    def register(self, name: str, factory: Callable[[], Any], close: Optional[Callable[[Any], Any]] = None) -> Resource:
+        """
+        Déclare une ressource (sans la construire). Déclarer à nouveau un nom existant
+        retourne la ressource déjà enregistrée.
+
+        Args:
+            name: Nom unique de la ressource
+            factory: Fonction sans argument qui construit la ressource
+            close: Fonction (synchrone ou asynchrone) appelée avec la ressource à l'arrêt
+
+        Returns:
+            La ressource enregistrée
+        """
+        with self._lock:
+            if name not in self._resources:
+                self._resources[name] = Resource(name, self._tracked(name, factory), close)
+            return self._resources[name]
+
+    def _tracked(self, name: str, factory: Callable[[], Any]) -> Callable[[], Any]:
+        def build():
+            value = factory()
+            if name in self._creation_order:
+                self._creation_order.remove(name)
+            self._creation_order.append(name)
+            logger.debug(f"Ressource {name} créée")
+            return value
+        return build
+
+    def get(self, name: str) -> Any:
+        """Retourne la ressource déclarée sous ce nom, construite au premier appel"""
+        return self._resources[name].get()
+
+    def created(self) -> List[str]:
+        """Noms des ressources actuellement créées, dans l'ordre de création"""
+        return [name for name in self._creation_order if self._resources[name].created]
+
+    async def aclose(self, prefix: str = ""):
+        """Ferme les ressources créées (celles dont le nom commence par prefix), de la plus récente à la plus ancienne"""
+        for name in reversed(self.created()):
+            if not name.startswith(prefix):
+                continue
+            try:
+                await self._resources[name].aclose()
+            except Exception as e:
+                logger.warning(f"Erreur lors de la fermeture de la ressource {name}: {str(e)}")
+            self._creation_order.remove(name)
+
+
+# Conteneur partagé par tout le processus
+container = Container()
@@ -0,0 +1,192 @@
+"""
+Construction du contexte envoyé au LLM pour les conversations avec les agents.
+
+Le contexte tient dans un budget de tokens (compté avec l'encodeur tiktoken de EmbeddingService):
+prompt de l'agent, résumé des échanges anciens, puis autant de messages récents que possible.
+Le résumé est stocké sur la conversation (colonnes summary et summarized_until) et mis à jour
+de façon incrémentale, en tâche de fond, à mesure que des messages sortent de la fenêtre récente.
+Les messages sortis de la fenêtre mais pas encore résumés restent dans l'historique envoyé au modèle.
+"""
+import os
+import asyncio
+import logging
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+
+from services.supabase_service import supabase_service
+from services.llm_gateway import llm_gateway
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Nombre de messages récents chargés pour le contexte
+HISTORY_WINDOW = int(os.environ.get("CHAT_HISTORY_WINDOW", "10"))
+# Budget de tokens pour le résumé et l'historique (hors prompt de l'agent et message courant)
+CONTEXT_MAX_TOKENS = int(os.environ.get("CHAT_CONTEXT_MAX_TOKENS", "3000"))
+# Taille maximale d'un message de l'historique (les messages plus longs sont tronqués)
+MESSAGE_MAX_TOKENS = int(os.environ.get("CHAT_MESSAGE_MAX_TOKENS", "800"))
+# Taille maximale du résumé généré
+SUMMARY_MAX_TOKENS = int(os.environ.get("CHAT_SUMMARY_MAX_TOKENS", "400"))
+# Nombre minimal de messages sortis de la fenêtre avant de mettre le résumé à jour
+SUMMARY_MIN_BATCH = int(os.environ.get("CHAT_SUMMARY_MIN_BATCH", "6"))
+SUMMARY_MAX_BATCH = 50
+# Messages récents chargés pour le contexte: la fenêtre, plus ceux qui en sont sortis sans être encore résumés
+CONTEXT_FETCH_LIMIT = HISTORY_WINDOW + SUMMARY_MAX_BATCH
+
+# Surcoût approximatif en tokens de chaque message (rôle, séparateurs)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PROMPT = """Tu maintiens le résumé d'une conversation entre un utilisateur et un assistant.
+À partir du résumé actuel et des nouveaux échanges, rédige un résumé mis à jour, concis et factuel,
+qui conserve les informations utiles pour la suite: objectifs, décisions, préférences et questions en suspens.
+Réponds uniquement avec le résumé."""
+
+
+def count_tokens(text: str) -> int:
+    """Compte les tokens d'un texte (approximation de 4 caractères par token sans tokenizer)"""
+    try:
+        from services.embedding_service import embedding_service
+        return len(embedding_service.tokenizer.encode(text or ""))
+    except Exception:
+        return len(text or "") // 4 + 1
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Tronque un texte à max_tokens tokens"""
+    try:
+        from services.embedding_service import embedding_service
+        tokens = embedding_service.tokenizer.encode(text or "")
+        if len(tokens) <= max_tokens:
+            return text
+        return embedding_service.tokenizer.decode(tokens[:max_tokens]) + " […]"
+    except Exception:
+        max_chars = max_tokens * 4
+        return text if len(text or "") <= max_chars else text[:max_chars] + " […]"
+
+
+def _timestamp(value) -> datetime:
+    return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+
+
+def unsummarized_messages(messages: List[Dict[str, Any]], summarized_until=None) -> List[Dict[str, Any]]:
+    """
+    Messages récents qui ne sont pas encore intégrés au résumé: la fenêtre récente, plus ceux qui en
+    sont sortis en attendant un lot de SUMMARY_MIN_BATCH messages (ils ne sont alors dans aucun des deux)
+
+    Args:
+        messages: Les CONTEXT_FETCH_LIMIT derniers messages, du plus ancien au plus récent
+        summarized_until: Date du dernier message intégré au résumé (None: aucun)
+    """
+    if not summarized_until:
+        return messages
+    cutoff = _timestamp(summarized_until)
+    return [message for message in messages if _timestamp(message["created_at"]) > cutoff]
+
+
+def build_context(
+    agent_prompt: str,
+    conversation_history: List[Dict[str, Any]],
+    user_message: str,
+    summary: Optional[str] = None,
+    max_tokens: int = CONTEXT_MAX_TOKENS,
+) -> List[Dict[str, Any]]:
+    """
+    Assemble les messages envoyés au modèle dans le budget de tokens
+
+    Args:
+        agent_prompt: Le prompt spécifique à l'agent IA
+        conversation_history: Les messages récents, du plus ancien au plus récent
+        user_message: Le message courant de l'utilisateur
+        summary: Le résumé des échanges plus anciens (optionnel)
+        max_tokens: Budget pour le résumé et l'historique
+
+    Returns:
+        La liste des messages au format de l'API OpenAI
+    """
+    messages = [{"role": "system", "content": agent_prompt}]
+    remaining = max_tokens
+
+    if summary:
+        summary_content = f"Résumé des échanges précédents de cette conversation:\n{summary}"
+        remaining -= count_tokens(summary_content) + MESSAGE_OVERHEAD_TOKENS
+        messages.append({"role": "system", "content": summary_content})
+
+    # Les messages les plus récents sont prioritaires
+    history = []
+    for message in reversed(conversation_history):
+        content = truncate_to_tokens(message["content"] or "", MESSAGE_MAX_TOKENS)
+        cost = count_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+        if cost > remaining:
+            break
+        remaining -= cost
+        history.append({"role": message["role"], "content": content})
+    messages.extend(reversed(history))
+
+    messages.append({"role": "user", "content": user_message})
+    return messages
+
+
+async def refresh_summary(conversation: Dict[str, Any]) -> Optional[str]:
+    """
+    Intègre au résumé de la conversation les messages sortis de la fenêtre récente
+
+    Args:
+        conversation: La conversation (avec ses colonnes summary et summarized_until)
+
+    Returns:
+        Le nouveau résumé, ou None s'il n'y avait pas assez de nouveaux messages ou si le résumé
+        a été mis à jour par une autre requête pendant le calcul
+    """
+    conversation_id = conversation["id"]
+    batch = await supabase_service.get_messages_to_summarize(
+        conversation_id,
+        after=conversation.get("summarized_until"),
+        keep_recent=HISTORY_WINDOW,
+        limit=SUMMARY_MAX_BATCH,
+    )
+    if len(batch) < SUMMARY_MIN_BATCH:
+        return None
+
+    transcript = "\n".join(
+        f"{message['role']}: {truncate_to_tokens(message['content'] or '', MESSAGE_MAX_TOKENS)}"
+        for message in batch
+    )
+    summary = await llm_gateway.chat(
+        [
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {"role": "user", "content": f"Résumé actuel:\n{conversation.get('summary') or '(aucun)'}\n\nNouveaux échanges:\n{transcript}"},
+        ],
+        max_tokens=SUMMARY_MAX_TOKENS,
+        temperature=0.3,
+    )
+    # Écriture conditionnelle: si un autre worker a résumé entre-temps, son résumé est conservé
+    updated = await supabase_service.update_conversation_summary(
+        conversation_id, summary, batch[-1]["created_at"], previous_summarized_until=conversation.get("summarized_until")
+    )
+    if updated is None:
+        logger.info(f"Résumé de la conversation {conversation_id} déjà mis à jour par une autre requête")
+        return None
+    logger.info(f"Résumé de la conversation {conversation_id} mis à jour ({len(batch)} messages intégrés)")
+    return summary
+
+
+# Tâches de résumé en cours dans ce worker (une seule par conversation; entre workers,
+# l'écriture conditionnelle de update_conversation_summary départage les résumés concurrents)
+_summary_tasks: Dict[str, asyncio.Task] = {}
+
+
+def schedule_summary_refresh(conversation: Dict[str, Any]):
+    """Lance la mise à jour du résumé en tâche de fond, sans bloquer la réponse"""
+    conversation_id = conversation["id"]
+    if conversation_id in _summary_tasks:
+        return
+
+    async def run():
+        try:
+            await refresh_summary(conversation)
+        except Exception as e:
+            logger.error(f"Erreur lors de la mise à jour du résumé de la conversation {conversation_id}: {str(e)}")
+        finally:
+            _summary_tasks.pop(conversation_id, None)
+
+    _summary_tasks[conversation_id] = asyncio.create_task(run())
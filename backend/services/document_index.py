@@ -0,0 +1,298 @@
+"""
+Base commune des index en mémoire de la table documents (index vectoriel, index lexical).
+
+Chaque index garde les identifiants, contenus et métadonnées de ses lignes, un index inversé
+des métadonnées pour les filtres, et se synchronise avec la table documents, hors du chemin des
+requêtes: l'index activé est chargé au démarrage du worker (lifespan, start), puis une tâche de
+fond le synchronise; une recherche n'attend jamais de chargement ni de synchronisation.
+- chargement complet (pages keyset sur updated_at, id);
+- synchronisation incrémentale des documents modifiés toutes les DOCUMENT_INDEX_SYNC_SECONDS, en
+  relisant les DOCUMENT_INDEX_SYNC_OVERLAP_SECONDS précédant le curseur: une transaction validée
+  après la synchronisation précédente peut porter un updated_at antérieur au curseur;
+- réconciliation complète toutes les DOCUMENT_INDEX_RECONCILE_SECONDS: les documents supprimés
+  sont retirés, ceux que l'index ne connaît pas (transaction plus longue que la relecture) ajoutés.
+
+Les filtres sur les métadonnées ont la même sémantique que le RPC match_documents: égalité de la
+valeur texte (metadata->>'clé'), ou appartenance pour une liste de valeurs.
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set
+
+import numpy as np
+
+from services.supabase_service import supabase_service
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Intervalle minimal entre deux synchronisations incrémentales avec la table documents
+SYNC_INTERVAL = float(os.environ.get("DOCUMENT_INDEX_SYNC_SECONDS", "60"))
+# Intervalle entre deux réconciliations complètes (détection des documents supprimés)
+RECONCILE_INTERVAL = float(os.environ.get("DOCUMENT_INDEX_RECONCILE_SECONDS", "600"))
+# Période relue derrière le curseur à chaque synchronisation incrémentale
+SYNC_OVERLAP = float(os.environ.get("DOCUMENT_INDEX_SYNC_OVERLAP_SECONDS", "30"))
+
+LOAD_PAGE_SIZE = 1000
+# Plus petit identifiant (uuid) pour reprendre la lecture au début d'un instant updated_at
+NIL_DOCUMENT_ID = "00000000-0000-0000-0000-000000000000"
+
+
+def metadata_text(value) -> Optional[str]:
+    """Valeur texte d'un champ de métadonnées, comme l'opérateur PostgreSQL ->>"""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+def metadata_filter_values(filters: Optional[Dict[str, Any]]) -> Dict[str, List[str]]:
+    """
+    Valeurs texte acceptées par clé d'un filtre {"clé": valeur, "clé": [valeurs acceptées]},
+    comparées à metadata->>'clé' (même sémantique pour le RPC, son repli et les index locaux)
+
+    Raises:
+        ValueError: Si une valeur n'est pas un scalaire (objet, null, liste imbriquée)
+    """
+    values_by_key: Dict[str, List[str]] = {}
+    for key, value in (filters or {}).items():
+        values = value if isinstance(value, list) else [value]
+        for item in values:
+            if item is None or isinstance(item, (dict, list)):
+                raise ValueError(f"Filtre '{key}' invalide: valeur texte, nombre ou booléen attendu")
+        values_by_key[str(key)] = [metadata_text(item) for item in values]
+    return values_by_key
+
+
+def rewind_cursor(cursor: Optional[Dict[str, Any]], seconds: float) -> Optional[Dict[str, Any]]:
+    """Curseur (updated_at, id) reculé de `seconds` secondes, pour relire les écritures validées en retard"""
+    if not cursor or seconds <= 0:
+        return cursor
+    try:
+        updated_at = datetime.fromisoformat(str(cursor["updated_at"]))
+    except ValueError:
+        return cursor
+    return {"updated_at": (updated_at - timedelta(seconds=seconds)).isoformat(), "id": NIL_DOCUMENT_ID}
+
+
+def ensure_capacity(array: np.ndarray, size: int) -> np.ndarray:
+    """Agrandit (par doublement) un tableau dont la première dimension doit contenir `size` lignes"""
+    if size <= len(array):
+        return array
+    grown = np.zeros((max(size, 2 * len(array), 64),) + array.shape[1:], dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class DocumentIndex:
+    """
+    Lignes de documents (id, contenu, métadonnées) et synchronisation avec la table.
+    Les sous-classes implémentent build, upsert et remove, et déclarent les colonnes à lire (FIELDS).
+    """
+
+    name = "documents"
+    FIELDS: Optional[List[str]] = None
+
+    def __init__(self):
+        self._reset_documents()
+        self.loaded = False
+        self._lock = asyncio.Lock()
+        self._cursor: Optional[Dict[str, Any]] = None
+        self._last_sync = 0.0
+        self._last_reconcile = 0.0
+        # Tâche de synchronisation en fond (lancée par start, dans le lifespan de l'application)
+        self._maintenance: Optional[asyncio.Task] = None
+
+    def _reset_documents(self):
+        self.size = 0
+        self.ids: List[str] = []
+        self.contents: List[Optional[str]] = []
+        self.metadata: List[Optional[Dict[str, Any]]] = []
+        self.rows: Dict[str, int] = {}
+        # Index inversé des métadonnées: clé -> valeur texte -> lignes
+        self._metadata_index: Dict[str, Dict[str, Set[int]]] = {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def build(self, documents: List[Dict[str, Any]]):
+        raise NotImplementedError
+
+    def upsert(self, documents: List[Dict[str, Any]]):
+        raise NotImplementedError
+
+    def remove(self, document_ids):
+        raise NotImplementedError
+
+    # Lignes et métadonnées
+
+    def _set_row_fields(self, row: int, doc: Dict[str, Any]):
+        doc_id = str(doc["id"])
+        metadata = doc.get("metadata") or {}
+        if row == len(self.ids):
+            self.ids.append(doc_id)
+            self.contents.append(doc.get("content"))
+            self.metadata.append(metadata)
+        else:
+            self.ids[row] = doc_id
+            self.contents[row] = doc.get("content")
+            self.metadata[row] = metadata
+        self.rows[doc_id] = row
+        for key, value in metadata.items():
+            text = metadata_text(value)
+            if text is not None:
+                self._metadata_index.setdefault(key, {}).setdefault(text, set()).add(row)
+
+    def _unindex_metadata(self, row: int):
+        for key, value in (self.metadata[row] or {}).items():
+            text = metadata_text(value)
+            if text is not None:
+                self._metadata_index.get(key, {}).get(text, set()).discard(row)
+
+    def _release_row(self, doc_id: str) -> Optional[int]:
+        """Retire un document des lignes (sa ligne reste allouée jusqu'à la prochaine compaction)"""
+        row = self.rows.pop(str(doc_id), None)
+        if row is not None:
+            self._unindex_metadata(row)
+            self.contents[row] = None
+            self.metadata[row] = None
+        return row
+
+    def _filter_rows(self, filters: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """Lignes vivantes qui satisfont tous les filtres (None: pas de filtre)"""
+        if not filters:
+            return None
+        selected: Optional[Set[int]] = None
+        for key, values in metadata_filter_values(filters).items():
+            by_value = self._metadata_index.get(key, {})
+            rows: Set[int] = set()
+            for text in values:
+                rows |= by_value.get(text, set())
+            selected = rows if selected is None else selected & rows
+            if not selected:
+                break
+        return np.fromiter(sorted(selected or ()), dtype=np.int64)
+
+    def _document(self, row: int, **scores) -> Dict[str, Any]:
+        return {"id": self.ids[row], "content": self.contents[row], "metadata": self.metadata[row], **scores}
+
+    # Synchronisation avec la table documents
+
+    async def load(self):
+        """Charge tous les documents de la table (pages keyset sur updated_at, id)"""
+        started = time.perf_counter()
+        documents, cursor = [], None
+        while True:
+            page, cursor = await supabase_service.get_documents_page(LOAD_PAGE_SIZE, cursor, fields=self.FIELDS)
+            documents.extend(page)
+            if len(page) < LOAD_PAGE_SIZE:
+                break
+        self.build(documents)
+        self._cursor = cursor
+        self.loaded = True
+        self._last_sync = self._last_reconcile = time.monotonic()
+        logger.info(
+            f"Index {self.name} chargé: {len(self)} documents "
+            f"en {(time.perf_counter() - started) * 1000:.0f} ms"
+        )
+
+    async def sync(self):
+        """Intègre les documents créés ou modifiés depuis la dernière lecture (fenêtre SYNC_OVERLAP comprise)"""
+        count = 0
+        cursor = rewind_cursor(self._cursor, SYNC_OVERLAP)
+        while True:
+            page, cursor = await supabase_service.get_documents_page(LOAD_PAGE_SIZE, cursor, fields=self.FIELDS)
+            # Le curseur ne recule pas: il n'avance qu'avec les documents lus
+            if page:
+                self._cursor = cursor
+            self.upsert(page)
+            count += len(page)
+            if len(page) < LOAD_PAGE_SIZE:
+                break
+        self._last_sync = time.monotonic()
+        if count:
+            logger.info(f"Index {self.name} synchronisé: {count} documents mis à jour")
+
+    async def reconcile(self):
+        """Retire de l'index les documents supprimés de la table et ajoute ceux qu'il ne connaît pas"""
+        existing, cursor = set(), None
+        while True:
+            page, cursor = await supabase_service.get_documents_page(LOAD_PAGE_SIZE * 10, cursor, fields=['id'])
+            existing.update(str(doc["id"]) for doc in page)
+            if len(page) < LOAD_PAGE_SIZE * 10:
+                break
+        removed = [doc_id for doc_id in self.rows if doc_id not in existing]
+        self.remove(removed)
+        missing = [doc_id for doc_id in existing if doc_id not in self.rows]
+        for start in range(0, len(missing), LOAD_PAGE_SIZE):
+            self.upsert(await supabase_service.get_documents_by_ids(
+                missing[start:start + LOAD_PAGE_SIZE], fields=self.FIELDS
+            ))
+        self._last_reconcile = time.monotonic()
+        if removed or missing:
+            logger.info(
+                f"Index {self.name}: {len(removed)} documents supprimés retirés, {len(missing)} documents manquants ajoutés"
+            )
+
+    async def refresh(self):
+        """Charge l'index s'il ne l'est pas, sinon le synchronise (et le réconcilie s'il est temps)"""
+        async with self._lock:
+            now = time.monotonic()
+            if not self.loaded:
+                await self.load()
+            elif now - self._last_reconcile >= RECONCILE_INTERVAL:
+                await self.sync()
+                await self.reconcile()
+            else:
+                await self.sync()
+
+    async def start(self):
+        """Charge l'index au démarrage du worker puis lance sa synchronisation en tâche de fond"""
+        try:
+            await self.refresh()
+        except Exception as e:
+            logger.error(f"Erreur lors du chargement de l'index {self.name}, nouvel essai en tâche de fond: {str(e)}")
+        self._maintenance = asyncio.create_task(self._maintain())
+
+    async def stop(self):
+        """Arrête la tâche de synchronisation"""
+        if self._maintenance is None:
+            return
+        self._maintenance.cancel()
+        try:
+            await self._maintenance
+        except asyncio.CancelledError:
+            pass
+        self._maintenance = None
+
+    async def _maintain(self):
+        # Les lectures se font entre deux await; chaque page lue est intégrée d'un bloc, sans
+        # await, si bien qu'une recherche voit l'état d'avant ou d'après, jamais un état partiel
+        while True:
+            await asyncio.sleep(SYNC_INTERVAL)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Erreur lors de la synchronisation de l'index {self.name}: {str(e)}")
+
+    async def ensure_ready(self):
+        """
+        Vérifie que l'index peut servir une recherche, sans attendre sa synchronisation
+
+        Raises:
+            RuntimeError: Si l'index n'est pas encore chargé (l'appelant se replie sur la base)
+        """
+        if self._maintenance is None:
+            # Hors de l'application (scripts): chargement et synchronisation à la demande
+            if not self.loaded or time.monotonic() - self._last_sync >= SYNC_INTERVAL:
+                await self.refresh()
+            return
+        if not self.loaded:
+            raise RuntimeError(f"Index {self.name} pas encore chargé")
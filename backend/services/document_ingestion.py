@@ -0,0 +1,269 @@
+"""
+Ingestion de documents en flux: lecture ligne à ligne, découpage (EmbeddingService.iter_chunks),
+embeddings par lots, puis écriture par pages bornées (upsert idempotent sur content_hash).
+
+Les trois étapes tournent en parallèle, reliées par des files bornées: si l'écriture ralentit,
+le calcul des embeddings puis la lecture s'arrêtent (contre-pression), et la mémoire utilisée
+ne dépend pas de la taille du document.
+
+La progression est enregistrée dans la table document_ingestions après chaque lot écrit.
+Une ingestion interrompue reprend au premier chunk non écrit quand le même fichier est renvoyé
+(même document_key et même empreinte): le découpage étant déterministe, les chunks déjà écrits
+sont sautés sans nouvel appel d'embeddings.
+"""
+import os
+import asyncio
+import hashlib
+import logging
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Any, Dict, Optional, Set
+
+from tenacity import AsyncRetrying, stop_after_attempt, wait_random_exponential
+
+from services.supabase_service import supabase_service, document_content_hash, DOCUMENT_WRITE_PAGE_SIZE
+from services.embedding_service import embedding_service
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Nombre de chunks par lot d'embeddings (et par enregistrement de la progression)
+INGESTION_BATCH_SIZE = int(os.environ.get("INGESTION_BATCH_SIZE", "64"))
+# Nombre de lots en attente entre deux étapes (borne la mémoire et crée la contre-pression)
+INGESTION_QUEUE_SIZE = int(os.environ.get("INGESTION_QUEUE_SIZE", "2"))
+# Nombre de tentatives pour écrire une page de documents
+INGESTION_WRITE_ATTEMPTS = int(os.environ.get("INGESTION_WRITE_ATTEMPTS", "3"))
+# Une ingestion "running" sans progression depuis ce délai est considérée comme abandonnée
+INGESTION_STALE_SECONDS = int(os.environ.get("INGESTION_STALE_SECONDS", "300"))
+
+READ_BLOCK_SIZE = 1024 * 1024
+
+# Fin de flux dans les files entre étapes
+_END = object()
+
+
+class IngestionInProgress(Exception):
+    """Une ingestion du même document est déjà en cours"""
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _is_stale(ingestion: Dict[str, Any]) -> bool:
+    try:
+        updated_at = datetime.fromisoformat(str(ingestion.get("updated_at")).replace("Z", "+00:00"))
+    except ValueError:
+        return True
+    return (datetime.now(timezone.utc) - updated_at).total_seconds() > INGESTION_STALE_SECONDS
+
+
+def copy_and_hash(source, destination_path: str) -> str:
+    """Copie un fichier par blocs (mémoire bornée) et retourne l'empreinte SHA-256 de son contenu"""
+    digest = hashlib.sha256()
+    with open(destination_path, "wb") as destination:
+        while True:
+            block = source.read(READ_BLOCK_SIZE)
+            if not block:
+                break
+            digest.update(block)
+            destination.write(block)
+    return digest.hexdigest()
+
+
+class DocumentIngestionService:
+    """Pipeline d'ingestion de documents et suivi de leur progression"""
+
+    def __init__(self):
+        # Tâches de fond en cours (références conservées jusqu'à leur fin)
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def prepare(
+        self,
+        document_key: str,
+        source_hash: str,
+        filename: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        user_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Crée ou reprend la progression de l'ingestion d'un document
+
+        Args:
+            document_key: Identifiant stable du document (fourni par le client, ou empreinte du fichier)
+            source_hash: Empreinte SHA-256 du fichier envoyé
+            filename: Nom du fichier
+            metadata: Métadonnées ajoutées à chaque chunk
+            user_id: Propriétaire du document
+
+        Returns:
+            La progression (status "pending", ou "completed" si ce fichier est déjà entièrement ingéré)
+
+        Raises:
+            IngestionInProgress: Si une ingestion du document est en cours
+        """
+        fresh = {
+            "document_key": document_key,
+            "source_hash": source_hash,
+            "filename": filename,
+            "user_id": user_id,
+            "metadata": metadata or {},
+            "status": "pending",
+            "chunks_committed": 0,
+            "documents_written": 0,
+            "error": None,
+            "updated_at": _now(),
+        }
+        # La clé est réservée en une seule écriture: de deux envois simultanés, un seul crée la ligne
+        claimed = await supabase_service.claim_document_ingestion(fresh)
+        if claimed:
+            return claimed
+
+        existing = await supabase_service.get_document_ingestion(document_key)
+        if existing is None:
+            # Progression supprimée entre les deux requêtes: une nouvelle tentative de réservation
+            claimed = await supabase_service.claim_document_ingestion(fresh)
+            if claimed:
+                return claimed
+            raise IngestionInProgress(document_key)
+
+        if existing["status"] in ("pending", "running") and not _is_stale(existing):
+            raise IngestionInProgress(document_key)
+        if existing["source_hash"] == source_hash and existing["status"] == "completed":
+            return existing
+
+        # Reprise conditionnelle (updated_at inchangé depuis la lecture): un seul appel concurrent l'obtient
+        resume = existing["source_hash"] == source_hash
+        taken = await supabase_service.take_over_document_ingestion(
+            document_key,
+            existing["updated_at"],
+            {"status": "pending", "error": None, "updated_at": _now()} if resume
+            else {key: value for key, value in fresh.items() if key != "document_key"},
+        )
+        if taken is None:
+            raise IngestionInProgress(document_key)
+
+        if resume:
+            logger.info(f"Reprise de l'ingestion de {document_key} au chunk {existing['chunks_committed']}")
+        else:
+            # Nouveau contenu pour cette clé: les chunks de la version précédente sont remplacés
+            await supabase_service.delete_documents_by_key(document_key)
+        return taken
+
+    def start(self, ingestion: Dict[str, Any], path: str) -> asyncio.Task:
+        """Lance l'ingestion en tâche de fond; le fichier temporaire est supprimé à la fin"""
+        async def run():
+            try:
+                await self.run(ingestion, path)
+            finally:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+        task = asyncio.create_task(run())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def run(self, ingestion: Dict[str, Any], path: str) -> Dict[str, Any]:
+        """
+        Ingère un fichier texte: lecture, découpage, embeddings et écriture en parallèle
+
+        Args:
+            ingestion: Progression retournée par prepare
+            path: Chemin du fichier (UTF-8)
+
+        Returns:
+            La progression finale (status "completed" ou "failed")
+        """
+        document_key = ingestion["document_key"]
+        progress = {
+            "document_key": document_key,
+            "chunks_committed": ingestion.get("chunks_committed") or 0,
+            "documents_written": ingestion.get("documents_written") or 0,
+        }
+        start_index = progress["chunks_committed"]
+        metadata = {
+            **(ingestion.get("metadata") or {}),
+            "document_key": document_key,
+            "source": ingestion.get("filename"),
+        }
+        if ingestion.get("user_id"):
+            metadata["user_id"] = ingestion["user_id"]
+
+        chunk_queue: asyncio.Queue = asyncio.Queue(maxsize=INGESTION_QUEUE_SIZE)
+        write_queue: asyncio.Queue = asyncio.Queue(maxsize=INGESTION_QUEUE_SIZE)
+
+        async def read_chunks():
+            """Découpe le fichier en lots de chunks (dans un thread: lecture disque et tokenisation)"""
+            with open(path, encoding="utf-8", errors="replace") as source:
+                chunks = embedding_service.iter_chunks(source, metadata)
+                # Chunks déjà écrits lors d'une tentative précédente
+                await asyncio.to_thread(lambda: sum(1 for _ in islice(chunks, start_index)))
+                while True:
+                    batch = await asyncio.to_thread(lambda: list(islice(chunks, INGESTION_BATCH_SIZE)))
+                    if not batch:
+                        break
+                    await chunk_queue.put(batch)
+            await chunk_queue.put(_END)
+
+        async def embed_chunks():
+            """Calcule les embeddings des chunks qui ne sont pas déjà dans la table"""
+            while (batch := await chunk_queue.get()) is not _END:
+                for chunk in batch:
+                    chunk["content_hash"] = document_content_hash(chunk["content"], chunk["metadata"])
+                existing = await supabase_service.get_existing_content_hashes([c["content_hash"] for c in batch])
+                pending = [chunk for chunk in batch if chunk["content_hash"] not in existing]
+
+                embeddings = await embedding_service.get_embeddings([chunk["content"] for chunk in pending])
+                if any(embedding is None for embedding in embeddings):
+                    raise RuntimeError("Échec du calcul des embeddings d'un lot de chunks")
+                for chunk, embedding in zip(pending, embeddings):
+                    chunk["embedding"] = embedding
+
+                last_index = batch[-1]["metadata"]["chunk_index"]
+                await write_queue.put((last_index, pending))
+            await write_queue.put(_END)
+
+        async def write_documents():
+            """Écrit les documents par pages bornées puis enregistre la progression"""
+            while (item := await write_queue.get()) is not _END:
+                last_index, documents = item
+                for start in range(0, len(documents), DOCUMENT_WRITE_PAGE_SIZE):
+                    page = documents[start:start + DOCUMENT_WRITE_PAGE_SIZE]
+                    async for attempt in AsyncRetrying(
+                        stop=stop_after_attempt(INGESTION_WRITE_ATTEMPTS),
+                        wait=wait_random_exponential(multiplier=0.5, max=10),
+                        reraise=True,
+                    ):
+                        with attempt:
+                            await supabase_service.upsert_documents_page(page)
+                progress["chunks_committed"] = last_index + 1
+                progress["documents_written"] += len(documents)
+                await supabase_service.save_document_ingestion({**progress, "status": "running", "updated_at": _now()})
+
+        await supabase_service.save_document_ingestion({**progress, "status": "running", "updated_at": _now()})
+        stages = [asyncio.create_task(stage()) for stage in (read_chunks, embed_chunks, write_documents)]
+        try:
+            await asyncio.gather(*stages)
+        except Exception as e:
+            for stage in stages:
+                stage.cancel()
+            await asyncio.gather(*stages, return_exceptions=True)
+            logger.error(f"Erreur lors de l'ingestion du document {document_key}: {str(e)}")
+            return await supabase_service.save_document_ingestion({
+                **progress, "status": "failed", "error": str(e), "updated_at": _now()
+            })
+
+        logger.info(
+            f"Document {document_key} ingéré: {progress['chunks_committed']} chunks, "
+            f"{progress['documents_written']} documents écrits"
+        )
+        return await supabase_service.save_document_ingestion({
+            **progress, "status": "completed", "error": None, "updated_at": _now()
+        })
+
+
+# Instance partagée du service d'ingestion
+document_ingestion_service = DocumentIngestionService()
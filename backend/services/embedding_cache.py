@@ -0,0 +1,294 @@
+"""
+Cache des embeddings, adressé par le contenu (empreinte SHA-256 du modèle et du texte).
+
+Deux niveaux:
+- en mémoire: LRU borné (EMBEDDING_CACHE_MEMORY_ENTRIES);
+- sur disque: matrice float32 mappée en mémoire (numpy.memmap) et index des empreintes,
+  persistants entre les redémarrages, bornés par EMBEDDING_CACHE_DISK_ENTRIES avec éviction LRU.
+  Les workers partagent le dossier: chacun a son propre index des emplacements, les écritures
+  sont sérialisées par un verrou fcntl, et chaque lecture vérifie après la copie du vecteur que
+  l'emplacement contient toujours l'empreinte demandée (un autre worker a pu le réutiliser).
+  EMBEDDING_CACHE_DIR vide désactive le niveau disque.
+
+Le cache est appelé depuis des threads (EmbeddingService.get_embeddings): dans un processus,
+les accès sont sérialisés par un verrou (le verrou fcntl ne départage pas les threads).
+"""
+import os
+import time
+import threading
+import hashlib
+import logging
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+from prometheus_client import Counter
+
+try:
+    import fcntl
+except ImportError:  # Windows: pas de verrou, un seul processus par dossier de cache
+    fcntl = None
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+MEMORY_MAX_ENTRIES = int(os.environ.get("EMBEDDING_CACHE_MEMORY_ENTRIES", "10000"))
+DISK_MAX_ENTRIES = int(os.environ.get("EMBEDDING_CACHE_DISK_ENTRIES", "200000"))
+DEFAULT_CACHE_DIR = str(Path(__file__).resolve().parent.parent / ".cache" / "embeddings")
+CACHE_DIR = os.environ.get("EMBEDDING_CACHE_DIR", DEFAULT_CACHE_DIR).strip()
+
+# Capacité initiale du fichier disque (doublée à la demande jusqu'à DISK_MAX_ENTRIES)
+DISK_INITIAL_CAPACITY = 1024
+DIGEST_SIZE = 32
+EMPTY_KEY = bytes(DIGEST_SIZE)
+
+# Métriques Prometheus
+EMBEDDING_CACHE_LOOKUPS = Counter(
+    'embedding_cache_lookups_total', 'Recherches dans le cache des embeddings', ['tier', 'result']
+)
+
+
+def embedding_key(model: str, text: str) -> bytes:
+    """Empreinte d'un texte pour un modèle donné"""
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).digest()
+
+
+class MemoryTier:
+    """Niveau mémoire: LRU empreinte -> vecteur float32"""
+
+    def __init__(self, max_entries: int = MEMORY_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        vector = self._entries.get(key)
+        if vector is not None:
+            self._entries.move_to_end(key)
+        return vector
+
+    def put(self, key: bytes, vector: np.ndarray):
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DiskTier:
+    """
+    Niveau disque pour une dimension d'embedding donnée.
+    Trois fichiers mappés en mémoire: vecteurs (capacité x dimension, float32),
+    empreintes (capacité x 32 octets, zéro = emplacement libre) et date de dernier accès (pour l'éviction LRU).
+    Un emplacement est écrit sous verrou dans cet ordre: empreinte effacée, vecteur, empreinte;
+    une lecture qui relit la même empreinte après avoir copié le vecteur a donc le bon vecteur.
+    """
+
+    def __init__(self, directory: str, dimension: int, max_entries: int = DISK_MAX_ENTRIES):
+        self.directory = Path(directory)
+        self.dimension = dimension
+        self.max_entries = max_entries
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._prefix = self.directory / f"embeddings-{dimension}"
+        self._lock_file = open(f"{self._prefix}.lock", "ab")
+
+        capacity = DISK_INITIAL_CAPACITY
+        keys_path = Path(f"{self._prefix}.keys")
+        if keys_path.exists():
+            capacity = keys_path.stat().st_size // DIGEST_SIZE
+        self._open(capacity)
+
+        # Index empreinte -> emplacement, reconstruit depuis le fichier des empreintes
+        used = np.flatnonzero(self._keys.any(axis=1))
+        self._index: Dict[bytes, int] = {self._keys[slot].tobytes(): int(slot) for slot in used}
+        used_slots = set(self._index.values())
+        self._free = [slot for slot in range(capacity - 1, -1, -1) if slot not in used_slots]
+
+    def _open(self, capacity: int):
+        """Ouvre (ou agrandit) les fichiers mappés pour la capacité donnée"""
+        def open_memmap(suffix, dtype, shape):
+            path = Path(f"{self._prefix}.{suffix}")
+            size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+            with open(path, "ab") as f:
+                if f.tell() < size:
+                    f.truncate(size)
+            return np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+
+        self.capacity = capacity
+        self._vectors = open_memmap("f32", np.float32, (capacity, self.dimension))
+        self._keys = open_memmap("keys", np.uint8, (capacity, DIGEST_SIZE))
+        self._last_used = open_memmap("lru", np.float64, (capacity,))
+
+    @contextmanager
+    def _locked(self):
+        """Verrou exclusif entre processus sur les écritures des fichiers"""
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _grow(self):
+        """Double la capacité des fichiers (dans la limite de max_entries)"""
+        old_capacity = self.capacity
+        new_capacity = min(old_capacity * 2, self.max_entries)
+        self.flush()
+        self._open(new_capacity)
+        self._free.extend(range(new_capacity - 1, old_capacity - 1, -1))
+
+    def _evict(self, count: int):
+        """Libère les `count` emplacements les moins récemment utilisés"""
+        used = np.fromiter(self._index.values(), dtype=np.int64)
+        count = min(count, len(used))
+        oldest = set(used[np.argpartition(self._last_used[used], count - 1)[:count]].tolist())
+        for key, slot in [(key, slot) for key, slot in self._index.items() if slot in oldest]:
+            del self._index[key]
+            # L'emplacement a pu être réutilisé par un autre worker: son entrée est conservée
+            if self._keys[slot].tobytes() == key:
+                self._keys[slot] = 0
+            self._free.append(slot)
+
+    def _allocate(self) -> int:
+        """Emplacement libre (sous verrou): ceux remplis entre-temps par un autre worker sont ajoutés à l'index"""
+        while True:
+            if not self._free:
+                if self.capacity < self.max_entries:
+                    self._grow()
+                else:
+                    # Libérer 1% de la capacité d'un coup pour amortir l'éviction
+                    self._evict(max(1, self.capacity // 100))
+            slot = self._free.pop()
+            existing = self._keys[slot].tobytes()
+            if existing == EMPTY_KEY:
+                return slot
+            self._index[existing] = slot
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        slot = self._index.get(key)
+        if slot is None:
+            return None
+        vector = np.array(self._vectors[slot])
+        # Emplacement réutilisé (ou en cours d'écriture) par un autre worker: l'entrée n'est plus valide
+        if self._keys[slot].tobytes() != key:
+            del self._index[key]
+            return None
+        self._last_used[slot] = time.time()
+        return vector
+
+    def put(self, key: bytes, vector: np.ndarray):
+        if key in self._index:
+            return
+        with self._locked():
+            slot = self._allocate()
+            self._keys[slot] = 0
+            self._vectors[slot] = vector
+            self._keys[slot] = np.frombuffer(key, dtype=np.uint8)
+            self._last_used[slot] = time.time()
+        self._index[key] = slot
+
+    def flush(self):
+        for array in (self._vectors, self._keys, self._last_used):
+            array.flush()
+
+    def __len__(self):
+        return len(self._index)
+
+
+class EmbeddingCache:
+    """Cache à deux niveaux (mémoire puis disque) des embeddings"""
+
+    def __init__(self, directory: Optional[str] = CACHE_DIR, memory_entries: int = MEMORY_MAX_ENTRIES,
+                 disk_entries: int = DISK_MAX_ENTRIES):
+        self.directory = directory
+        self.disk_entries = disk_entries
+        self.memory = MemoryTier(memory_entries)
+        self._disk_tiers: Dict[int, DiskTier] = {}
+        self._disk_loaded = False
+        self._lock = threading.RLock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    def _load_disk_tiers(self):
+        """Ouvre les fichiers disque existants (une matrice par dimension d'embedding)"""
+        self._disk_loaded = True
+        if not self.directory or not Path(self.directory).is_dir():
+            return
+        for keys_path in Path(self.directory).glob("embeddings-*.keys"):
+            try:
+                self._disk(int(keys_path.stem.split("-")[1]))
+            except ValueError:
+                continue
+
+    def _disk(self, dimension: int) -> Optional[DiskTier]:
+        if not self.directory:
+            return None
+        if dimension not in self._disk_tiers:
+            try:
+                self._disk_tiers[dimension] = DiskTier(self.directory, dimension, self.disk_entries)
+            except Exception as e:
+                logger.error(f"Cache disque des embeddings indisponible ({self.directory}): {str(e)}")
+                self.directory = None
+                return None
+        return self._disk_tiers[dimension]
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        """Retourne l'embedding en cache pour ce texte et ce modèle, ou None"""
+        with self._lock:
+            return self._get(model, text)
+
+    def _get(self, model: str, text: str) -> Optional[List[float]]:
+        if not self._disk_loaded:
+            self._load_disk_tiers()
+        key = embedding_key(model, text)
+        vector = self.memory.get(key)
+        if vector is not None:
+            self.stats["memory_hits"] += 1
+            EMBEDDING_CACHE_LOOKUPS.labels(tier="memory", result="hit").inc()
+            return vector.tolist()
+
+        for disk in self._disk_tiers.values():
+            vector = disk.get(key)
+            if vector is not None:
+                self.memory.put(key, vector)
+                self.stats["disk_hits"] += 1
+                EMBEDDING_CACHE_LOOKUPS.labels(tier="disk", result="hit").inc()
+                return vector.tolist()
+
+        self.stats["misses"] += 1
+        EMBEDDING_CACHE_LOOKUPS.labels(tier="all", result="miss").inc()
+        return None
+
+    def put(self, model: str, text: str, embedding: List[float]):
+        """Enregistre un embedding dans les deux niveaux"""
+        with self._lock:
+            self._put(model, text, embedding)
+
+    def _put(self, model: str, text: str, embedding: List[float]):
+        key = embedding_key(model, text)
+        vector = np.asarray(embedding, dtype=np.float32)
+        self.memory.put(key, vector)
+        disk = self._disk(len(vector))
+        if disk is not None:
+            try:
+                disk.put(key, vector)
+            except Exception as e:
+                logger.error(f"Erreur lors de l'écriture dans le cache disque des embeddings: {str(e)}")
+
+    def hit_rate(self) -> float:
+        lookups = sum(self.stats.values())
+        return (self.stats["memory_hits"] + self.stats["disk_hits"]) / lookups if lookups else 0.0
+
+    def flush(self):
+        """Écrit sur disque les pages modifiées (à appeler à l'arrêt de l'application)"""
+        with self._lock:
+            for disk in self._disk_tiers.values():
+                disk.flush()
+
+
+# Instance partagée du cache
+embedding_cache = EmbeddingCache()
@@ -1,23 +1,44 @@
 """
 Service pour gérer les embeddings de documents à l'aide d'OpenAI.
 """
+import io
 import os
 import re
+import asyncio
 import logging
 import traceback
-import textwrap
-import tiktoken
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Tuple, Union
 from dotenv import load_dotenv
-import openai
+from services.container import container
+from services.llm_gateway import llm_gateway
+from services.embedding_cache import embedding_cache
 
 # Configuration du logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Chargement des variables d'environnement
 load_dotenv()
 
+# Limites d'une requête d'embeddings (nombre de textes et total de tokens)
+EMBEDDING_BATCH_MAX_ITEMS = int(os.environ.get("EMBEDDING_BATCH_MAX_ITEMS", "256"))
+EMBEDDING_BATCH_MAX_TOKENS = int(os.environ.get("EMBEDDING_BATCH_MAX_TOKENS", "100000"))
+# Nombre de requêtes d'embeddings simultanées pendant l'ingestion d'un document
+EMBEDDING_BATCH_CONCURRENCY = int(os.environ.get("EMBEDDING_BATCH_CONCURRENCY", "4"))
+
+# Fin de phrase: ponctuation finale suivie d'un espace
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?…])\s+')
+
+
+def load_tokenizer(model: str):
+    """Charge l'encodeur tiktoken d'un modèle (téléchargé au premier usage s'il n'est pas en cache)"""
+    import tiktoken
+
+    try:
+        return tiktoken.encoding_for_model(model)
+    except Exception:
+        return tiktoken.get_encoding("cl100k_base")  # Fallback
+
+
 class EmbeddingService:
     """Service pour générer et gérer les embeddings de documents"""
     
@@ -34,21 +55,32 @@ class EmbeddingService:
             logger.error("Aucune clé API OpenAI trouvée. Définissez OPENAI_API_KEY dans votre fichier .env")
         
         self.model = model
-        self.client = openai.OpenAI(api_key=self.api_key)
+        self._client = None
         
         # Paramètres de chunking
         self.chunk_size = 1000
         self.chunk_overlap = 200
         self.max_tokens = 8191  # Limite pour text-embedding-ada-002
         
-        # Initialiser l'encodeur pour compter les tokens
-        try:
-            self.tokenizer = tiktoken.encoding_for_model(self.model)
-        except Exception:
-            self.tokenizer = tiktoken.get_encoding("cl100k_base")  # Fallback
+        # Encodeur pour compter les tokens, partagé par modèle et chargé au premier usage
+        self._tokenizer = container.register(f"tiktoken.{self.model}", lambda: load_tokenizer(model))
         
         logger.info(f"Service d'embedding initialisé avec le modèle {self.model}")
     
+    @property
+    def client(self):
+        """Client OpenAI synchrone (get_embedding), créé au premier appel"""
+        if self._client is None:
+            import openai
+
+            self._client = openai.OpenAI(api_key=self.api_key)
+        return self._client
+    
+    @property
+    def tokenizer(self):
+        """Encodeur tiktoken du modèle"""
+        return self._tokenizer.get()
+    
     def get_embedding(self, text: str) -> List[float]:
         """
         Génère un embedding vectoriel pour le texte donné
@@ -62,14 +94,12 @@ class EmbeddingService:
         if not self.api_key:
             raise ValueError("Clé API OpenAI manquante")
         
-        # Nettoyer et tronquer le texte si nécessaire
-        text = self._clean_text(text)
+        # Nettoyer le texte et le tronquer à la limite du modèle si nécessaire
+        text, _ = self._prepare_text(text)
         
-        # Vérifier la longueur en tokens et tronquer si nécessaire
-        tokens = self.tokenizer.encode(text)
-        if len(tokens) > self.max_tokens:
-            logger.warning(f"Le texte dépasse la limite de {self.max_tokens} tokens. Troncature appliquée.")
-            text = self.tokenizer.decode(tokens[:self.max_tokens])
+        cached = embedding_cache.get(self.model, text)
+        if cached is not None:
+            return cached
         
         try:
             response = self.client.embeddings.create(
@@ -78,15 +108,115 @@ class EmbeddingService:
             )
             embedding = response.data[0].embedding
             logger.debug(f"Embedding généré avec succès ({len(embedding)} dimensions)")
+            embedding_cache.put(self.model, text, embedding)
             return embedding
         except Exception as e:
             logger.error(f"Erreur lors de la génération de l'embedding: {str(e)}")
             logger.error(traceback.format_exc())
             raise
     
+    def _prepare_text(self, text: str):
+        """Nettoie et tronque un texte à la limite du modèle; retourne (texte, nombre de tokens)"""
+        text = self._clean_text(text)
+        tokens = self.tokenizer.encode(text)
+        if len(tokens) > self.max_tokens:
+            logger.warning(f"Le texte dépasse la limite de {self.max_tokens} tokens. Troncature appliquée.")
+            tokens = tokens[:self.max_tokens]
+            text = self.tokenizer.decode(tokens)
+        return text, len(tokens)
+    
+    def _pack_batches(self, token_counts: List[int]) -> List[List[int]]:
+        """
+        Regroupe des textes (par indice, dans l'ordre) en lots respectant
+        EMBEDDING_BATCH_MAX_ITEMS et EMBEDDING_BATCH_MAX_TOKENS
+        """
+        batches, current, current_tokens = [], [], 0
+        for index, count in enumerate(token_counts):
+            if current and (len(current) >= EMBEDDING_BATCH_MAX_ITEMS or current_tokens + count > EMBEDDING_BATCH_MAX_TOKENS):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(index)
+            current_tokens += count
+        if current:
+            batches.append(current)
+        return batches
+    
+    def _lookup_cached(self, texts: List[str]):
+        """
+        Prépare les textes et cherche leurs embeddings en cache (appelé dans un thread)
+        
+        Returns:
+            (textes préparés avec leur nombre de tokens, embeddings trouvés ou None,
+             textes à calculer -> positions d'origine, chacun une seule fois)
+        """
+        prepared = [self._prepare_text(text) for text in texts]
+        embeddings: List[Optional[List[float]]] = [None] * len(texts)
+        missing: Dict[str, List[int]] = {}
+        for i, (text, _) in enumerate(prepared):
+            if text in missing:
+                missing[text].append(i)
+                continue
+            cached = embedding_cache.get(self.model, text)
+            if cached is not None:
+                embeddings[i] = cached
+            else:
+                missing[text] = [i]
+        return prepared, embeddings, missing
+    
+    def _cache_embeddings(self, texts: List[str], vectors: List[List[float]]):
+        """Enregistre des embeddings dans le cache (appelé dans un thread: écritures disque)"""
+        for text, vector in zip(texts, vectors):
+            embedding_cache.put(self.model, text, vector)
+    
+    async def get_embeddings(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        Génère les embeddings de plusieurs textes par lots (une requête par lot),
+        avec un nombre borné de lots simultanés. Chaque lot est réessayé indépendamment
+        en cas d'erreur transitoire: seuls les lots en échec sont renvoyés.
+        Les textes déjà en cache, ou en double, ne sont envoyés qu'une fois (ou pas du tout).
+        
+        Args:
+            texts: Textes à encoder
+            
+        Returns:
+            Les embeddings dans l'ordre des textes (None pour les textes d'un lot en échec définitif)
+        """
+        if not self.api_key:
+            raise ValueError("Clé API OpenAI manquante")
+        
+        # Tokenisation et lectures du cache disque dans un thread: un gros lot ne bloque pas la boucle
+        prepared, embeddings, missing = await asyncio.to_thread(self._lookup_cached, texts)
+        
+        unique_texts = list(missing)
+        token_counts = {text: count for text, count in prepared}
+        batches = self._pack_batches([token_counts[text] for text in unique_texts])
+        semaphore = asyncio.Semaphore(EMBEDDING_BATCH_CONCURRENCY)
+        
+        async def embed_batch(batch_number: int, indices: List[int]):
+            batch_texts = [unique_texts[i] for i in indices]
+            async with semaphore:
+                try:
+                    vectors = await llm_gateway.embeddings(batch_texts, model=self.model)
+                except Exception as e:
+                    logger.error(f"Erreur lors de la génération du lot d'embeddings {batch_number} ({len(indices)} textes): {str(e)}")
+                    return
+            await asyncio.to_thread(self._cache_embeddings, batch_texts, vectors)
+            for text, vector in zip(batch_texts, vectors):
+                for position in missing[text]:
+                    embeddings[position] = vector
+        
+        await asyncio.gather(*(embed_batch(n, indices) for n, indices in enumerate(batches)))
+        logger.info(
+            f"{sum(e is not None for e in embeddings)}/{len(texts)} embeddings obtenus "
+            f"({len(texts) - sum(len(p) for p in missing.values())} depuis le cache, {len(batches)} requêtes)"
+        )
+        return embeddings
+    
     def _clean_text(self, text: str) -> str:
         """
-        Nettoie le texte avant de générer l'embedding
+        Nettoie le texte avant de générer l'embedding.
+        Les espaces sont normalisés à l'intérieur des paragraphes, mais les séparations
+        de paragraphes (lignes vides) sont conservées.
         
         Args:
             text: Texte à nettoyer
@@ -97,20 +227,127 @@ class EmbeddingService:
         if not text:
             return ""
         
-        # Remplacer les sauts de ligne multiples par un seul
-        text = re.sub(r'\n+', '\n', text)
+        # Supprimer les caractères non imprimables (hors sauts de ligne et tabulations)
+        text = ''.join(c for c in text if c.isprintable() or c in ['\n', '\t', '\r'])
+        
+        # Découper en paragraphes sur les lignes vides, puis normaliser les espaces dans chacun
+        paragraphs = (re.sub(r'\s+', ' ', para).strip() for para in re.split(r'\n\s*\n', text))
+        return '\n\n'.join(para for para in paragraphs if para)
+    
+    def _iter_paragraphs(self, source: Union[str, Iterable[str]]) -> Iterator[str]:
+        """
+        Produit les paragraphes nettoyés d'un texte ou d'un flux de lignes
+        (un paragraphe se termine par une ligne vide), sans charger tout le flux en mémoire
+        """
+        lines = io.StringIO(source) if isinstance(source, str) else source
+        buffer = []
+        for line in lines:
+            if line.strip():
+                buffer.append(line)
+            elif buffer:
+                paragraph = self._clean_text(' '.join(buffer))
+                buffer = []
+                if paragraph:
+                    yield paragraph
+        if buffer:
+            paragraph = self._clean_text(' '.join(buffer))
+            if paragraph:
+                yield paragraph
+    
+    def _iter_units(self, source: Union[str, Iterable[str]]) -> Iterator[Tuple[str, List[int], bool, bool]]:
+        """
+        Produit les unités de découpage: (texte, tokens, début de paragraphe, fragment de phrase).
+        Chaque phrase est tokenisée une seule fois; une phrase plus longue qu'un chunk
+        est découpée sur ses tokens, avec recouvrement.
+        """
+        step = max(1, self.chunk_size - self.chunk_overlap)
+        for paragraph in self._iter_paragraphs(source):
+            starts_paragraph = True
+            for sentence in SENTENCE_BOUNDARY.split(paragraph):
+                if not sentence:
+                    continue
+                tokens = self.tokenizer.encode(sentence)
+                if len(tokens) <= self.chunk_size:
+                    yield sentence, tokens, starts_paragraph, False
+                else:
+                    for offset in range(0, len(tokens), step):
+                        piece = tokens[offset:offset + self.chunk_size]
+                        yield self.tokenizer.decode(piece), piece, starts_paragraph and offset == 0, True
+                        if offset + self.chunk_size >= len(tokens):
+                            break
+                starts_paragraph = False
+    
+    def iter_chunks(
+        self, source: Union[str, Iterable[str]], metadata: Dict[str, Any] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Découpe un document en chunks d'au plus chunk_size tokens, au fil de l'eau (générateur):
+        seuls le chunk en cours et son recouvrement sont gardés en mémoire.
+        Les coupures se font entre paragraphes ou entre phrases; chaque chunk reprend
+        les dernières phrases du précédent, dans la limite de chunk_overlap tokens.
+        Les séparateurs ajoutés entre les unités (espace, ligne vide) sont comptés dans la limite.
+        
+        Args:
+            source: Contenu du document, ou itérable de lignes (fichier ouvert, flux)
+            metadata: Métadonnées du document
+            
+        Yields:
+            Dictionnaires contenant le contenu et les métadonnées de chaque chunk
+        """
+        metadata = dict(metadata or {})
+        chunk_index = 0
+        current: List[Tuple[str, int, bool]] = []   # (texte, nombre de tokens, début de paragraphe)
+        current_tokens = 0                          # tokens du chunk rendu, séparateurs compris
+        current_partial = False
         
-        # Remplacer les espaces multiples par un seul
-        text = re.sub(r'\s+', ' ', text)
+        # Tokens du séparateur placé devant une unité: ligne vide en début de paragraphe, sinon espace
+        separator_tokens = {
+            True: len(self.tokenizer.encode("\n\n")),
+            False: len(self.tokenizer.encode(" "))
+        }
         
-        # Supprimer les caractères non imprimables
-        text = ''.join(c for c in text if c.isprintable() or c in ['\n', '\t'])
+        def render(units):
+            text = ""
+            for unit_text, _, starts_paragraph in units:
+                separator = "\n\n" if starts_paragraph else " "
+                text = f"{text}{separator}{unit_text}" if text else unit_text
+            return text
         
-        return text.strip()
+        for text, tokens, starts_paragraph, is_partial in self._iter_units(source):
+            if current and current_tokens + separator_tokens[starts_paragraph] + len(tokens) > self.chunk_size:
+                yield {
+                    "content": render(current),
+                    "metadata": {**metadata, "chunk_index": chunk_index, "is_partial": current_partial}
+                }
+                chunk_index += 1
+                
+                # Recouvrement: reprendre les dernières unités qui tiennent dans chunk_overlap
+                overlap, overlap_tokens = [], 0
+                for unit in reversed(current):
+                    # Placée devant le recouvrement, l'unité ajoute ses tokens et le séparateur de la suivante
+                    candidate_tokens = unit[1] + (separator_tokens[overlap[0][2]] + overlap_tokens if overlap else 0)
+                    if (candidate_tokens > self.chunk_overlap
+                            or candidate_tokens + separator_tokens[starts_paragraph] + len(tokens) > self.chunk_size):
+                        break
+                    overlap.insert(0, unit)
+                    overlap_tokens = candidate_tokens
+                current, current_tokens, current_partial = overlap, overlap_tokens, False
+            
+            if current:
+                current_tokens += separator_tokens[starts_paragraph]
+            current.append((text, len(tokens), starts_paragraph))
+            current_tokens += len(tokens)
+            current_partial = current_partial or is_partial
+        
+        if current:
+            yield {
+                "content": render(current),
+                "metadata": {**metadata, "chunk_index": chunk_index, "is_partial": current_partial}
+            }
     
     def chunk_document(self, document: str, metadata: Dict[str, Any] = None) -> List[Dict[str, Any]]:
         """
-        Découpe un document en chunks pour l'embedding
+        Découpe un document en chunks pour l'embedding (voir iter_chunks)
         
         Args:
             document: Contenu du document
@@ -122,79 +359,13 @@ class EmbeddingService:
         if not document:
             return []
         
-        # S'assurer que metadata est un dictionnaire
-        if metadata is None:
-            metadata = {}
-        else:
-            # Copier pour éviter de modifier l'original
-            metadata = metadata.copy()
-        
-        # Nettoyer le document
-        document = self._clean_text(document)
-        
-        # Découper en paragraphes
-        paragraphs = document.split('\n\n')
-        
-        chunks = []
-        current_chunk = []
-        current_size = 0
-        
-        for i, para in enumerate(paragraphs):
-            # Estimer la taille en tokens
-            para_size = len(self.tokenizer.encode(para))
-            
-            # Si le paragraphe est trop grand, le subdiviser
-            if para_size > self.chunk_size:
-                para_chunks = textwrap.wrap(para, width=self.chunk_size)
-                for para_chunk in para_chunks:
-                    chunks.append({
-                        "content": para_chunk,
-                        "metadata": {
-                            **metadata,
-                            "chunk_index": len(chunks),
-                            "is_partial": True
-                        }
-                    })
-                continue
-            
-            # Si ajouter ce paragraphe dépasse la taille du chunk
-            if current_size + para_size > self.chunk_size:
-                # Sauvegarder le chunk actuel
-                if current_chunk:
-                    chunks.append({
-                        "content": "\n\n".join(current_chunk),
-                        "metadata": {
-                            **metadata,
-                            "chunk_index": len(chunks),
-                            "is_partial": False
-                        }
-                    })
-                
-                # Commencer un nouveau chunk
-                current_chunk = [para]
-                current_size = para_size
-            else:
-                # Ajouter au chunk actuel
-                current_chunk.append(para)
-                current_size += para_size
-        
-        # Ajouter le dernier chunk s'il n'est pas vide
-        if current_chunk:
-            chunks.append({
-                "content": "\n\n".join(current_chunk),
-                "metadata": {
-                    **metadata,
-                    "chunk_index": len(chunks),
-                    "is_partial": False
-                }
-            })
-        
+        chunks = list(self.iter_chunks(document, metadata))
         logger.info(f"Document découpé en {len(chunks)} chunks")
         return chunks
     
-    def process_document(self, document: str, metadata: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+    async def process_document(self, document: str, metadata: Dict[str, Any] = None) -> List[Dict[str, Any]]:
         """
-        Traite un document complet: découpage et génération d'embeddings
+        Traite un document complet: découpage et génération d'embeddings par lots
         
         Args:
             document: Contenu du document
@@ -202,28 +373,22 @@ class EmbeddingService:
             
         Returns:
             Liste de dictionnaires contenant le contenu, les métadonnées et l'embedding de chaque chunk
+            (les chunks dont l'embedding a échoué sont ignorés)
         """
         chunks = self.chunk_document(document, metadata)
+        embeddings = await self.get_embeddings([chunk["content"] for chunk in chunks])
         
         processed_chunks = []
-        for chunk in chunks:
-            try:
-                # Générer l'embedding pour ce chunk
-                embedding = self.get_embedding(chunk["content"])
-                
-                # Ajouter l'embedding au chunk
-                processed_chunk = {
-                    "content": chunk["content"],
-                    "metadata": chunk["metadata"],
-                    "embedding": embedding
-                }
-                
-                processed_chunks.append(processed_chunk)
-                
-            except Exception as e:
-                logger.error(f"Erreur lors du traitement du chunk {chunk['metadata'].get('chunk_index')}: {str(e)}")
-                logger.error(traceback.format_exc())
+        for chunk, embedding in zip(chunks, embeddings):
+            if embedding is None:
+                logger.error(f"Embedding manquant pour le chunk {chunk['metadata'].get('chunk_index')}")
                 # Continuer avec les autres chunks
+                continue
+            processed_chunks.append({
+                "content": chunk["content"],
+                "metadata": chunk["metadata"],
+                "embedding": embedding
+            })
         
         logger.info(f"Document traité avec succès: {len(processed_chunks)} chunks avec embeddings")
         return processed_chunks
@@ -0,0 +1,184 @@
+"""
+Calcul des streaks et des taux de complétion des habitudes.
+Les calculs sont vectorisés avec NumPy sur des tableaux de jours (ordinaux),
+pour toutes les habitudes d'un utilisateur à la fois.
+"""
+from datetime import date, datetime
+from typing import Dict, Any, List, Iterable, Optional
+
+import numpy as np
+
+# Deux complétions sont consécutives si elles sont séparées d'au plus 2 jours
+STREAK_MAX_GAP_DAYS = 2
+
+
+def to_day_ordinal(value) -> int:
+    """Convertit une date (ISO, date ou datetime) en numéro de jour"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if isinstance(value, datetime):
+        value = value.date()
+    return value.toordinal()
+
+
+def compute_habits_streaks(
+    completions: Iterable[Dict[str, Any]],
+    habit_ids: List[int],
+    window_days: int,
+    reference_date=None,
+) -> Dict[int, Dict[str, Any]]:
+    """
+    Calcule streak courant, plus long streak et taux de complétion de plusieurs habitudes
+
+    Args:
+        completions: Complétions ({"habit_id", "completion_date"}) de toutes les habitudes
+        habit_ids: Habitudes pour lesquelles produire un résultat
+        window_days: Nombre de jours de la période (dénominateur du taux de complétion)
+        reference_date: Jour auquel le streak courant est évalué (aujourd'hui par défaut): une série
+                        dont la dernière complétion est plus ancienne que STREAK_MAX_GAP_DAYS est terminée
+
+    Returns:
+        Dictionnaire habit_id -> statistiques (habitudes sans complétion: valeurs à zéro)
+    """
+    results = {
+        habit_id: {
+            "habit_id": habit_id,
+            "current_streak": 0,
+            "longest_streak": 0,
+            "last_completion_date": None,
+            "completion_count": 0,
+            "completion_rate": 0.0,
+        }
+        for habit_id in habit_ids
+    }
+
+    rows = [(c["habit_id"], to_day_ordinal(c["completion_date"])) for c in completions if c.get("completion_date")]
+    if not rows:
+        return results
+
+    # Un seul point par (habitude, jour), trié par habitude puis par jour
+    pairs = np.unique(np.array(rows, dtype=np.int64), axis=0)
+    habits, days = pairs[:, 0], pairs[:, 1]
+
+    # Une nouvelle série commence au changement d'habitude ou après un trou de plus de STREAK_MAX_GAP_DAYS
+    new_run = np.ones(len(days), dtype=bool)
+    new_run[1:] = (habits[1:] != habits[:-1]) | (np.diff(days) > STREAK_MAX_GAP_DAYS)
+    run_starts = np.flatnonzero(new_run)
+    run_lengths = np.diff(np.append(run_starts, len(days)))
+    run_habits = habits[run_starts]
+
+    # Bornes de chaque habitude dans les tableaux de séries et de jours
+    habit_run_starts = np.flatnonzero(np.r_[True, run_habits[1:] != run_habits[:-1]])
+    habit_day_starts = np.flatnonzero(np.r_[True, habits[1:] != habits[:-1]])
+    habit_day_ends = np.append(habit_day_starts[1:], len(days)) - 1
+
+    longest = np.maximum.reduceat(run_lengths, habit_run_starts)
+    current = run_lengths[np.append(habit_run_starts[1:], len(run_lengths)) - 1]
+    # Dernière série terminée si la dernière complétion est trop ancienne
+    reference_day = to_day_ordinal(reference_date or date.today())
+    current = np.where(reference_day - days[habit_day_ends] <= STREAK_MAX_GAP_DAYS, current, 0)
+    counts = habit_day_ends - habit_day_starts + 1
+    rates = np.minimum(counts / max(window_days, 1), 1.0)
+
+    for i, habit_id in enumerate(run_habits[habit_run_starts].tolist()):
+        if habit_id not in results:
+            continue
+        results[habit_id].update({
+            "current_streak": int(current[i]),
+            "longest_streak": int(longest[i]),
+            "last_completion_date": date.fromordinal(int(days[habit_day_ends[i]])).isoformat(),
+            "completion_count": int(counts[i]),
+            "completion_rate": float(rates[i]),
+        })
+    return results
+
+
+# État de streak stocké sur chaque habitude (colonnes de la table habits)
+EMPTY_STREAK_STATE = {
+    "streak": 0,
+    "longest_streak": 0,
+    "last_completion_date": None,
+    "completion_count": 0,
+}
+
+
+def advance_streak(state: Dict[str, Any], completion_date) -> Optional[Dict[str, Any]]:
+    """
+    Met à jour en O(1) l'état de streak d'une habitude après une nouvelle complétion
+
+    Args:
+        state: État courant (streak, longest_streak, last_completion_date, completion_count)
+        completion_date: Date de la nouvelle complétion
+
+    Returns:
+        Le nouvel état, ou None si la complétion est antérieure à la dernière connue
+        (l'état doit alors être recalculé entièrement avec compute_streak_state)
+    """
+    day = to_day_ordinal(completion_date)
+    streak = state.get("streak") or 0
+    longest_streak = state.get("longest_streak") or 0
+    completion_count = state.get("completion_count") or 0
+
+    if state.get("last_completion_date"):
+        last_day = to_day_ordinal(state["last_completion_date"])
+        if day < last_day:
+            return None
+        if day == last_day:
+            # Déjà complétée ce jour-là: un seul point par jour
+            return {
+                "streak": streak,
+                "longest_streak": longest_streak,
+                "last_completion_date": date.fromordinal(last_day).isoformat(),
+                "completion_count": completion_count,
+            }
+        streak = streak + 1 if day - last_day <= STREAK_MAX_GAP_DAYS else 1
+    else:
+        streak = 1
+
+    return {
+        "streak": streak,
+        "longest_streak": max(longest_streak, streak),
+        "last_completion_date": date.fromordinal(day).isoformat(),
+        "completion_count": completion_count + 1,
+    }
+
+
+def current_streak(state: Dict[str, Any], reference_date=None) -> int:
+    """
+    Streak courant à partir de l'état stocké sur une habitude: le streak stocké est celui de la
+    dernière complétion, il vaut 0 si cette complétion est plus ancienne que STREAK_MAX_GAP_DAYS
+
+    Args:
+        state: État de streak (streak, last_completion_date)
+        reference_date: Jour auquel le streak est évalué (aujourd'hui par défaut)
+    """
+    if not state.get("last_completion_date"):
+        return 0
+    gap = to_day_ordinal(reference_date or date.today()) - to_day_ordinal(state["last_completion_date"])
+    return (state.get("streak") or 0) if gap <= STREAK_MAX_GAP_DAYS else 0
+
+
+def compute_streak_state(completion_dates: Iterable) -> Dict[str, Any]:
+    """
+    Recalcule entièrement l'état de streak d'une habitude à partir de toutes ses complétions
+    (utilisé par le job de réparation, voir scripts/backfill_habit_streaks.py)
+
+    Args:
+        completion_dates: Dates de toutes les complétions de l'habitude
+
+    Returns:
+        L'état de streak (mêmes clés que advance_streak): streak de la série de la dernière
+        complétion, même si elle est terminée (voir current_streak)
+    """
+    completion_dates = [d for d in completion_dates if d]
+    last_date = date.fromordinal(max(map(to_day_ordinal, completion_dates))) if completion_dates else None
+    stats = compute_habits_streaks(
+        ({"habit_id": 0, "completion_date": d} for d in completion_dates), [0], window_days=1,
+        reference_date=last_date
+    )[0]
+    return {
+        "streak": stats["current_streak"],
+        "longest_streak": stats["longest_streak"],
+        "last_completion_date": stats["last_completion_date"],
+        "completion_count": stats["completion_count"],
+    }
@@ -5,41 +5,29 @@ import logging
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional, List
 import os
-from openai import OpenAI
 from services.supabase_service import supabase_service
-from supabase import create_client, Client
+from services.llm_gateway import llm_gateway
+from services.habit_streaks import compute_habits_streaks, compute_streak_state, current_streak, advance_streak, EMPTY_STREAK_STATE
+from services.request_cache import request_memoize
+from services.cache import get_response_cache
 
 # Configuration du logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("backend.log"),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
-# Initialisation du client Supabase
-url = os.environ.get("SUPABASE_URL")
-key = os.environ.get("SUPABASE_KEY")
 
-# Vérification des variables d'environnement
-supabase = None
-if url and key:
-    try:
-        supabase: Client = create_client(url, key)
-        logger.info("Connexion Supabase établie avec succès")
-    except Exception as e:
-        logger.error(f"Erreur lors de la connexion à Supabase: {str(e)}")
-else:
-    logger.warning("Variables d'environnement SUPABASE_URL ou SUPABASE_KEY non définies. Fonctionnalités Supabase désactivées.")
+# Nombre de jours couverts par chaque période de statistiques
+PERIOD_DAYS = {
+    "week": 7,
+    "month": 30,
+    "year": 365
+}
+
+# Rapports hebdomadaires générés par l'IA, par (utilisateur, semaine ISO)
+WEEKLY_REPORT_TTL = 7 * 24 * 3600
+weekly_report_cache = get_response_cache("weekly_habit_report", ttl=WEEKLY_REPORT_TTL)
 
 
 class HabitsService:
-    def __init__(self):
-        self.openai_client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-    
     async def get_user_habits(self, user_id: str) -> List[Dict[str, Any]]:
         """Récupère toutes les habitudes d'un utilisateur"""
         try:
@@ -55,10 +43,7 @@ class HabitsService:
             # Ajouter des champs par défaut
             habit_data.update({
                 "created_at": datetime.now().isoformat(),
-                "streak": 0,
-                "longest_streak": 0,
-                "last_completion_date": None,
-                "completion_count": 0
+                **EMPTY_STREAK_STATE
             })
             
             habit = await supabase_service.add_habit(habit_data)
@@ -68,89 +53,82 @@ class HabitsService:
             raise
     
     async def calculate_habit_streak(self, habit_id: int, user_id: str) -> Dict[str, Any]:
-        """Calcule le streak actuel et le plus long streak pour une habitude"""
+        """Calcule le streak actuel et le plus long streak pour une habitude (sur tout l'historique)"""
         try:
             # Récupérer toutes les complétions de l'habitude
             completions = await supabase_service.get_habit_completions(habit_id)
             if not completions:
                 return None
             
-            # Trier les complétions par date
-            completions.sort(key=lambda x: x["completion_date"])
+            dates = [completion["completion_date"] for completion in completions]
+            state = compute_streak_state(dates)
             
-            # Calculer le streak actuel
-            current_streak = 0
-            longest_streak = 0
-            temp_streak = 0
-            last_date = None
-            
-            for completion in completions:
-                completion_date = datetime.fromisoformat(completion["completion_date"])
-                
-                if last_date is None:
-                    current_streak = 1
-                    temp_streak = 1
-                else:
-                    # Vérifier si la complétion est consécutive (au plus 2 jours d'écart)
-                    days_diff = (completion_date - last_date).days
-                    if days_diff <= 2:
-                        temp_streak += 1
-                        if temp_streak > current_streak:
-                            current_streak = temp_streak
-                    else:
-                        temp_streak = 1
-                
-                if temp_streak > longest_streak:
-                    longest_streak = temp_streak
-                
-                last_date = completion_date
-            
-            # Calculer le taux de complétion
-            total_days = (datetime.now() - datetime.fromisoformat(completions[0]["completion_date"])).days + 1
-            completion_rate = len(completions) / total_days if total_days > 0 else 0
+            # Calculer le taux de complétion depuis la première complétion
+            first_date = datetime.fromisoformat(min(dates)).date()
+            total_days = (datetime.now().date() - first_date).days + 1
+            completion_rate = state["completion_count"] / total_days if total_days > 0 else 0
             
             return {
                 "habit_id": habit_id,
-                "current_streak": current_streak,
-                "longest_streak": longest_streak,
-                "last_completion_date": last_date.isoformat() if last_date else None,
+                "current_streak": current_streak(state),
+                "longest_streak": state["longest_streak"],
+                "last_completion_date": state["last_completion_date"],
                 "completion_rate": completion_rate
             }
         except Exception as e:
             logger.error(f"Erreur lors du calcul du streak: {str(e)}")
             raise
     
+    async def recompute_habit_streak(self, habit_id: int) -> Dict[str, Any]:
+        """
+        Recalcule entièrement l'état de streak d'une habitude et le sauvegarde.
+        Réservé au job de réparation (scripts/backfill_habit_streaks.py) et aux complétions
+        antérieures à la dernière connue: le chemin normal est incrémental.
+        """
+        try:
+            completions = await supabase_service.get_habit_completions(habit_id)
+            state = compute_streak_state(completion["completion_date"] for completion in completions)
+            await supabase_service.update_habit(habit_id, state)
+            return state
+        except Exception as e:
+            logger.error(f"Erreur lors du recalcul du streak de l'habitude {habit_id}: {str(e)}")
+            raise
+    
+    @request_memoize
     async def get_detailed_habit_stats(self, user_id: str, period: str = "month") -> Dict[str, Any]:
-        """Récupère des statistiques détaillées sur les habitudes"""
+        """
+        Récupère des statistiques détaillées sur les habitudes.
+        Les complétions de toutes les habitudes sont chargées en une seule requête, limitée à la période,
+        pour les taux de complétion (calcul vectorisé). Les streaks viennent de l'état stocké sur chaque
+        habitude, calculé sur tout l'historique: une période courte ne les tronque pas.
+        Mémoïsé pendant une requête: les appels identiques ne déclenchent qu'un seul calcul.
+        """
         try:
             # Récupérer toutes les habitudes de l'utilisateur
             habits = await self.get_user_habits(user_id)
             
             # Calculer la période de début
-            now = datetime.now()
-            if period == "week":
-                start_date = now - timedelta(days=7)
-            elif period == "month":
-                start_date = now - timedelta(days=30)
-            else:  # year
-                start_date = now - timedelta(days=365)
+            window_days = PERIOD_DAYS.get(period, PERIOD_DAYS["year"])
+            start_date = datetime.now() - timedelta(days=window_days)
+            
+            # Une seule requête pour les complétions de la période, toutes habitudes confondues
+            habit_ids = [habit["id"] for habit in habits]
+            completions = await supabase_service.get_completions_for_habits(habit_ids, since=start_date)
+            habit_streaks = compute_habits_streaks(completions, habit_ids, window_days)
             
-            # Calculer les statistiques pour chaque habitude
             streaks = []
-            total_completions = 0
-            total_possible = 0
             most_consistent = None
             needs_attention = []
             
             for habit in habits:
-                streak = await self.calculate_habit_streak(habit["id"], user_id)
-                if streak:
+                streak = {
+                    **habit_streaks[habit["id"]],
+                    "current_streak": current_streak(habit),
+                    "longest_streak": habit.get("longest_streak") or 0,
+                }
+                if streak["completion_count"]:
                     streaks.append(streak)
                     
-                    # Mettre à jour les totaux
-                    total_completions += streak["completion_rate"] * (now - start_date).days
-                    total_possible += (now - start_date).days
-                    
                     # Vérifier si c'est l'habitude la plus consistante
                     if not most_consistent or streak["completion_rate"] > most_consistent["completion_rate"]:
                         most_consistent = {
@@ -158,18 +136,21 @@ class HabitsService:
                             "name": habit["name"],
                             "completion_rate": streak["completion_rate"]
                         }
-                    
-                    # Vérifier si l'habitude a besoin d'attention
-                    if streak["current_streak"] < 3 and streak["completion_rate"] < 0.5:
-                        needs_attention.append({
-                            "habit_id": habit["id"],
-                            "name": habit["name"],
-                            "current_streak": streak["current_streak"],
-                            "completion_rate": streak["completion_rate"]
-                        })
+                
+                # Vérifier si l'habitude a besoin d'attention
+                if streak["current_streak"] < 3 and streak["completion_rate"] < 0.5:
+                    needs_attention.append({
+                        "habit_id": habit["id"],
+                        "name": habit["name"],
+                        "current_streak": streak["current_streak"],
+                        "completion_rate": streak["completion_rate"]
+                    })
             
             # Calculer le taux de complétion global
-            overall_completion_rate = total_completions / total_possible if total_possible > 0 else 0
+            overall_completion_rate = (
+                sum(streak["completion_rate"] for streak in habit_streaks.values()) / len(habit_streaks)
+                if habit_streaks else 0
+            )
             
             return {
                 "total_habits": len(habits),
@@ -208,7 +189,7 @@ class HabitsService:
             }
             
             # Utiliser OpenAI pour générer le rapport
-            response = self.openai_client.chat.completions.create(
+            response = await llm_gateway.chat_completion(
                 model=os.environ.get("MODEL_OPENAI", "gpt-3.5-turbo"),
                 messages=[
                     {"role": "system", "content": """Tu es un coach en productivité qui analyse les habitudes d'un utilisateur.
@@ -229,8 +210,49 @@ class HabitsService:
             logger.error(f"Erreur lors de la génération du rapport hebdomadaire: {str(e)}")
             raise
     
+    async def get_weekly_report(self, user_id: str, refresh: bool = False) -> Dict[str, Any]:
+        """
+        Construit le rapport hebdomadaire des habitudes.
+        Le texte généré par l'IA est mis en cache par (utilisateur, semaine ISO);
+        les statistiques sont toujours recalculées.
+        
+        Args:
+            user_id: ID de l'utilisateur
+            refresh: Si True, régénère le rapport même s'il est en cache
+        """
+        try:
+            weekly_stats = await self.get_detailed_habit_stats(user_id, "week")
+            habits_needing_attention = await self.get_habits_needing_attention(user_id)
+            
+            iso_year, iso_week, _ = datetime.now().isocalendar()
+            cache_key = {"user_id": user_id, "iso_week": f"{iso_year}-W{iso_week:02d}"}
+            report = None if refresh else await weekly_report_cache.get(cache_key)
+            if report is None:
+                report = await self.generate_weekly_report(
+                    user_id=user_id,
+                    weekly_stats=weekly_stats,
+                    habits_needing_attention=habits_needing_attention
+                )
+                await weekly_report_cache.set(cache_key, report)
+            
+            return {
+                "weekly_stats": weekly_stats,
+                "habits_needing_attention": habits_needing_attention,
+                "report": report
+            }
+        except Exception as e:
+            logger.error(f"Erreur lors de la construction du rapport hebdomadaire: {str(e)}")
+            raise
+    
     async def complete_habit(self, habit_id: int, user_id: str, notes: Optional[str] = None) -> Dict[str, Any]:
-        """Marque une habitude comme complétée pour aujourd'hui"""
+        """
+        Marque une habitude comme complétée pour aujourd'hui.
+        Le streak est mis à jour de façon incrémentale à partir de l'état stocké sur l'habitude,
+        une fois la complétion enregistrée, par une mise à jour conditionnelle sur cet état.
+        
+        Returns:
+            {"completion": complétion sauvegardée, "streak": état de streak} ou None si l'habitude n'existe pas
+        """
         try:
             # Vérifier si l'habitude existe
             habit = await supabase_service.get_habit_by_id(habit_id)
@@ -238,26 +260,34 @@ class HabitsService:
                 return None
             
             # Créer l'entrée de complétion
+            now = datetime.now()
             completion = {
                 "habit_id": habit_id,
                 "user_id": user_id,
-                "completion_date": datetime.now().isoformat(),
+                "completion_date": now.isoformat(),
                 "notes": notes
             }
             
-            # Sauvegarder la complétion
+            # La complétion d'abord: si son écriture échoue, l'état de streak n'est pas modifié
             saved_completion = await supabase_service.add_habit_completion(completion)
             
-            # Mettre à jour le streak
-            streak = await self.calculate_habit_streak(habit_id, user_id)
-            if streak:
-                await supabase_service.update_habit(habit_id, {
-                    "streak": streak["current_streak"],
-                    "longest_streak": streak["longest_streak"],
-                    "last_completion_date": streak["last_completion_date"]
-                })
+            # Nouvel état de streak calculé en O(1) depuis l'état lu, écrit seulement si l'état
+            # stocké n'a pas changé entre-temps (complétion simultanée)
+            streak_state = advance_streak(habit, now)
+            if streak_state is None or not await supabase_service.update_habit_streak(habit_id, streak_state, habit):
+                # Complétion antérieure à la dernière connue, ou état modifié entre-temps: recalcul complet
+                streak_state = await self.recompute_habit_streak(habit_id)
             
-            return saved_completion
+            return {
+                "completion": saved_completion,
+                "streak": {
+                    "habit_id": habit_id,
+                    "current_streak": streak_state["streak"],
+                    "longest_streak": streak_state["longest_streak"],
+                    "last_completion_date": streak_state["last_completion_date"],
+                    "completion_count": streak_state["completion_count"]
+                }
+            }
         except Exception as e:
             logger.error(f"Erreur lors de la complétion de l'habitude: {str(e)}")
             raise
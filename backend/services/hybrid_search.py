@@ -0,0 +1,118 @@
+"""
+Recherche hybride de documents: index lexical BM25 et recherche par embeddings,
+fusionnés par reciprocal rank fusion (RRF).
+
+Activée avec DOCUMENT_SEARCH_MODE=hybrid: l'index lexical garde le contenu et les métadonnées de
+toute la table documents en mémoire dans chaque worker (chargé au démarrage du worker, puis
+synchronisé en tâche de fond).
+
+Une requête courte de type mot-clé (nom, hashtag, mention) est servie par l'index lexical seul
+quand il trouve des résultats: aucun appel à l'API d'embeddings ni au RPC de similarité.
+"""
+import os
+import logging
+from typing import Any, Dict, List, Optional
+
+from prometheus_client import Counter
+
+from services.lexical_index import lexical_index, BM25Index
+from services.supabase_service import supabase_service
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Constante de lissage de la RRF (valeur usuelle)
+RRF_K = int(os.environ.get("HYBRID_RRF_K", "60"))
+# Nombre de candidats demandés à chaque moteur: limit * facteur (au moins HYBRID_MIN_CANDIDATES)
+CANDIDATE_FACTOR = int(os.environ.get("HYBRID_CANDIDATE_FACTOR", "4"))
+MIN_CANDIDATES = int(os.environ.get("HYBRID_MIN_CANDIDATES", "20"))
+# Similarité minimale des candidats vectoriels (le classement final est fait par la fusion)
+VECTOR_MIN_SIMILARITY = float(os.environ.get("HYBRID_VECTOR_MIN_SIMILARITY", "0.3"))
+# Nombre maximal de mots d'une requête servie par le seul index lexical
+KEYWORD_MAX_WORDS = int(os.environ.get("HYBRID_KEYWORD_MAX_WORDS", "2"))
+
+# Métriques Prometheus
+DOCUMENT_SEARCHES = Counter('document_searches_total', 'Recherches de documents par parcours', ['path'])
+
+
+def is_keyword_query(query_text: str) -> bool:
+    """Une requête est un mot-clé si elle compte au plus KEYWORD_MAX_WORDS mots"""
+    return 0 < len(query_text.split()) <= KEYWORD_MAX_WORDS
+
+
+def reciprocal_rank_fusion(rankings: List[List[Dict[str, Any]]], k: int = RRF_K) -> List[Dict[str, Any]]:
+    """
+    Fusionne des classements de documents: score(d) = somme des 1 / (k + rang de d)
+
+    Args:
+        rankings: Listes de documents (avec "id"), chacune triée du plus au moins pertinent
+        k: Constante de lissage
+
+    Returns:
+        Documents fusionnés (champs des différents classements réunis, plus "rrf_score"),
+        par score décroissant
+    """
+    fused: Dict[str, Dict[str, Any]] = {}
+    for ranking in rankings:
+        for rank, document in enumerate(ranking, start=1):
+            entry = fused.setdefault(str(document["id"]), {**document, "rrf_score": 0.0})
+            entry.update({key: value for key, value in document.items() if key not in entry})
+            entry["rrf_score"] += 1.0 / (k + rank)
+    return sorted(fused.values(), key=lambda document: document["rrf_score"], reverse=True)
+
+
+class HybridRetriever:
+    """Recherche de documents combinant l'index lexical et la recherche vectorielle"""
+
+    def __init__(self, lexical: BM25Index = lexical_index):
+        self.lexical = lexical
+
+    async def _lexical_search(self, query_text, filters, limit) -> Optional[List[Dict[str, Any]]]:
+        """Résultats BM25, ou None si l'index lexical est indisponible"""
+        try:
+            await self.lexical.ensure_ready()
+            return self.lexical.search(query_text, limit=limit, filters=filters)
+        except Exception as e:
+            logger.error(f"Erreur de l'index lexical, recherche vectorielle seule: {str(e)}")
+            return None
+
+    async def _vector_search(self, query_text, filters, limit) -> List[Dict[str, Any]]:
+        from services.embedding_service import embedding_service
+
+        query_embedding = (await embedding_service.get_embeddings([query_text]))[0]
+        if query_embedding is None:
+            return []
+        return await supabase_service.search_documents(
+            query_embedding, filters, limit, match_threshold=VECTOR_MIN_SIMILARITY
+        )
+
+    async def search(self, query_text: str, filters=None, limit: int = 5) -> List[Dict[str, Any]]:
+        """
+        Recherche les documents pertinents pour une requête textuelle
+
+        Args:
+            query_text: Texte de la requête
+            filters: Filtres sur les métadonnées
+            limit: Nombre maximum de résultats
+
+        Returns:
+            Liste des documents, du plus au moins pertinent
+        """
+        depth = max(limit * CANDIDATE_FACTOR, MIN_CANDIDATES)
+        lexical_results = await self._lexical_search(query_text, filters, depth)
+
+        if lexical_results and is_keyword_query(query_text):
+            DOCUMENT_SEARCHES.labels(path="lexical").inc()
+            return lexical_results[:limit]
+
+        vector_results = await self._vector_search(query_text, filters, depth)
+        if lexical_results is None:
+            DOCUMENT_SEARCHES.labels(path="vector").inc()
+            return vector_results[:limit]
+
+        DOCUMENT_SEARCHES.labels(path="hybrid").inc()
+        return reciprocal_rank_fusion([lexical_results, vector_results])[:limit]
+
+
+# Instance partagée du moteur de recherche hybride
+hybrid_retriever = HybridRetriever()
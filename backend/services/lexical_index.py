@@ -0,0 +1,194 @@
+"""
+Index lexical BM25 en mémoire sur documents.content.
+
+Complète la recherche par embeddings pour les requêtes exactes (noms propres, hashtags, mentions)
+et ne nécessite aucun appel réseau une fois chargé. Les termes sont normalisés (minuscules, sans
+accents); les hashtags et mentions sont indexés avec et sans leur préfixe (#projet et projet).
+Le chargement et la synchronisation avec la table documents sont ceux de DocumentIndex.
+"""
+import re
+import math
+import unicodedata
+import logging
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from services.document_index import DocumentIndex, ensure_capacity
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Paramètres BM25 usuels
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+TOKEN_PATTERN = re.compile(r"[#@]?\w+")
+STOPWORDS = frozenset("""
+a au aux avec ce ces dans de des du elle en et eux il je la le les leur lui ma mais me meme mes moi mon
+ne nos notre nous on ou par pas pour qu que qui sa se ses son sur ta te tes toi ton tu un une vos votre
+vous c d j l m n s t y est sont ete etre avoir the of and to in is it for on that with as at by an be this
+""".split())
+
+
+def fold(text: str) -> str:
+    """Minuscules et suppression des accents"""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Termes d'un texte, dans l'ordre (mots vides exclus)"""
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(fold(text or "")):
+        token = match.group()
+        if token[0] in "#@":
+            tokens.append(token)
+            token = token[1:]
+        if token and token not in STOPWORDS:
+            tokens.append(token)
+    return tokens
+
+
+class BM25Index(DocumentIndex):
+    """
+    Index inversé terme -> {ligne: fréquence}, avec la longueur de chaque document.
+    Les lignes supprimées sont libérées et compactées lors des reconstructions.
+    """
+
+    name = "lexical BM25"
+    FIELDS = ['id', 'content', 'metadata']
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        super().__init__()
+        self._reset()
+
+    def _reset(self):
+        self._reset_documents()
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._terms: List[Optional[Counter]] = []
+        self._lengths = np.zeros(0, dtype=np.float32)
+        self._total_length = 0
+
+    # Construction et mises à jour
+
+    def build(self, documents: List[Dict[str, Any]]):
+        """Reconstruit l'index à partir d'une liste de documents (id, content, metadata)"""
+        self._reset()
+        self.upsert(documents)
+
+    def upsert(self, documents: List[Dict[str, Any]]):
+        """Ajoute ou remplace des documents"""
+        for doc in documents:
+            doc_id = str(doc["id"])
+            row = self.rows.get(doc_id)
+            if row is not None:
+                self._unindex_metadata(row)
+                self._unindex_terms(row)
+            else:
+                row = self.size
+                self.size += 1
+                self._terms.append(None)
+            self._set_row_fields(row, doc)
+            self._index_terms(row, doc.get("content"))
+        self._maybe_compact()
+
+    def remove(self, document_ids):
+        """Retire des documents de l'index"""
+        for doc_id in document_ids:
+            row = self._release_row(doc_id)
+            if row is not None:
+                self._unindex_terms(row)
+        self._maybe_compact()
+
+    def _index_terms(self, row: int, content: Optional[str]):
+        terms = Counter(tokenize(content))
+        for term, frequency in terms.items():
+            self._postings.setdefault(term, {})[row] = frequency
+        length = sum(terms.values())
+        self._terms[row] = terms
+        self._lengths = ensure_capacity(self._lengths, self.size)
+        self._lengths[row] = length
+        self._total_length += length
+
+    def _unindex_terms(self, row: int):
+        for term in self._terms[row] or ():
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(row, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= int(self._lengths[row])
+        self._lengths[row] = 0
+        self._terms[row] = None
+
+    def _maybe_compact(self):
+        """Reconstruit l'index quand les lignes libérées dépassent un quart des lignes"""
+        dead_count = self.size - len(self.rows)
+        if dead_count <= max(1024, self.size // 4):
+            return
+        live = sorted(self.rows.values())
+        self.build([
+            {"id": self.ids[row], "content": self.contents[row], "metadata": self.metadata[row]}
+            for row in live
+        ])
+        logger.info(f"Index lexical BM25 compacté ({len(self)} documents)")
+
+    # Recherche
+
+    def search(self, query: str, limit: int = 5, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Recherche les documents les plus pertinents pour une requête textuelle (BM25)
+
+        Args:
+            query: Texte de la requête
+            limit: Nombre maximum de résultats
+            filters: Filtres sur les métadonnées (valeur exacte ou liste de valeurs acceptées)
+
+        Returns:
+            Documents (id, content, metadata, score) par score décroissant
+        """
+        terms = set(tokenize(query))
+        if not terms or not self.rows or limit <= 0:
+            return []
+
+        candidates = self._filter_rows(filters)
+        if candidates is not None and len(candidates) == 0:
+            return []
+
+        document_count = len(self.rows)
+        average_length = self._total_length / document_count or 1.0
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term in terms:
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            rows = np.fromiter(postings.keys(), dtype=np.int64, count=len(postings))
+            frequencies = np.fromiter(postings.values(), dtype=np.float32, count=len(postings))
+            idf = math.log(1 + (document_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            norms = self.k1 * (1 - self.b + self.b * self._lengths[rows] / average_length)
+            scores[rows] += idf * frequencies * (self.k1 + 1) / (frequencies + norms)
+
+        if candidates is not None:
+            scores = scores[candidates]
+        else:
+            candidates = np.arange(self.size)
+        matched = np.flatnonzero(scores > 0)
+        if len(matched) == 0:
+            return []
+        k = min(limit, len(matched))
+        top = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [self._document(int(candidates[i]), score=float(scores[i])) for i in top.tolist()]
+
+    @property
+    def enabled(self) -> bool:
+        from services.supabase_service import DOCUMENT_SEARCH_MODE
+        return DOCUMENT_SEARCH_MODE == "hybrid"
+
+
+# Instance partagée de l'index
+lexical_index = BM25Index()
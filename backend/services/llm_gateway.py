@@ -0,0 +1,196 @@
+"""
+Passerelle LLM partagée par tout le processus.
+Un seul client AsyncOpenAI (connexions keep-alive réutilisées) est utilisé par tous les appels,
+avec une limite de concurrence, des timeouts et des retries (tenacity) configurables.
+"""
+import os
+import asyncio
+import logging
+from typing import List, Dict, Any, Optional, AsyncIterator
+
+import httpx
+from dotenv import load_dotenv
+from tenacity import AsyncRetrying, retry_if_exception_type, stop_after_attempt, wait_random_exponential
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Chargement des variables d'environnement
+load_dotenv()
+
+# Paramètres de la passerelle (configurables par variables d'environnement)
+DEFAULT_MODEL = os.environ.get("MODEL_OPENAI", "gpt-3.5-turbo")
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "16"))
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", "60"))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "3"))
+LLM_POOL_MAX_CONNECTIONS = int(os.environ.get("LLM_POOL_MAX_CONNECTIONS", "50"))
+LLM_POOL_MAX_KEEPALIVE = int(os.environ.get("LLM_POOL_MAX_KEEPALIVE", "20"))
+
+
+def retryable_errors() -> tuple:
+    """
+    Erreurs transitoires pour lesquelles un nouvel essai a du sens. Le SDK openai (long à importer)
+    n'est chargé qu'au premier appel à l'API, pas à l'import de l'application.
+    """
+    from openai import APIConnectionError, APITimeoutError, RateLimitError, InternalServerError
+
+    return (APIConnectionError, APITimeoutError, RateLimitError, InternalServerError)
+
+
+class LLMGateway:
+    """Point d'accès unique aux API OpenAI (chat et embeddings)"""
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        default_model: str = DEFAULT_MODEL,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        timeout: float = LLM_TIMEOUT,
+        max_retries: int = LLM_MAX_RETRIES,
+    ):
+        """
+        Initialise la passerelle (le client HTTP est créé au premier appel)
+
+        Args:
+            api_key: Clé API OpenAI (si None, utilise OPENAI_API_KEY)
+            default_model: Modèle utilisé quand l'appelant n'en précise pas
+            max_concurrency: Nombre maximal d'appels simultanés vers l'API
+            timeout: Timeout d'un appel en secondes
+            max_retries: Nombre maximal de tentatives par appel
+        """
+        self.api_key = api_key or os.environ.get("OPENAI_API_KEY")
+        self.default_model = default_model
+        self.timeout = timeout
+        self.max_retries = max(1, max_retries)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._client = None
+
+    @property
+    def client(self):
+        """Client AsyncOpenAI partagé, avec son pool de connexions"""
+        if self._client is None:
+            from openai import AsyncOpenAI
+
+            self._client = AsyncOpenAI(
+                api_key=self.api_key,
+                timeout=self.timeout,
+                # Les retries sont gérés par tenacity pour ne pas occuper de slot pendant l'attente
+                max_retries=0,
+                http_client=httpx.AsyncClient(
+                    timeout=self.timeout,
+                    limits=httpx.Limits(
+                        max_connections=LLM_POOL_MAX_CONNECTIONS,
+                        max_keepalive_connections=LLM_POOL_MAX_KEEPALIVE,
+                    ),
+                ),
+            )
+        return self._client
+
+    def _retrying(self) -> AsyncRetrying:
+        return AsyncRetrying(
+            retry=retry_if_exception_type(retryable_errors()),
+            stop=stop_after_attempt(self.max_retries),
+            wait=wait_random_exponential(multiplier=0.5, max=10),
+            reraise=True,
+        )
+
+    async def chat_completion(self, messages: List[Dict[str, Any]], model: Optional[str] = None, **kwargs):
+        """
+        Appelle l'API de chat completions
+
+        Args:
+            messages: Messages à envoyer au modèle
+            model: Modèle à utiliser (par défaut: MODEL_OPENAI)
+            **kwargs: Paramètres supplémentaires (temperature, max_tokens, ...)
+
+        Returns:
+            La réponse brute de l'API
+        """
+        async for attempt in self._retrying():
+            with attempt:
+                async with self._semaphore:
+                    return await self.client.chat.completions.create(
+                        model=model or self.default_model,
+                        messages=messages,
+                        **kwargs
+                    )
+
+    async def chat(self, messages: List[Dict[str, Any]], model: Optional[str] = None, **kwargs) -> str:
+        """
+        Appelle l'API de chat completions et retourne uniquement le texte généré
+
+        Args:
+            messages: Messages à envoyer au modèle
+            model: Modèle à utiliser (par défaut: MODEL_OPENAI)
+            **kwargs: Paramètres supplémentaires (temperature, max_tokens, ...)
+
+        Returns:
+            Le contenu du premier choix, sans espaces superflus
+        """
+        response = await self.chat_completion(messages, model=model, **kwargs)
+        return response.choices[0].message.content.strip()
+
+    async def embeddings(self, inputs: List[str], model: str) -> List[List[float]]:
+        """
+        Calcule les embeddings d'un lot de textes en une seule requête
+
+        Args:
+            inputs: Textes à encoder
+            model: Modèle d'embedding
+
+        Returns:
+            Les vecteurs, dans l'ordre des textes fournis
+        """
+        async for attempt in self._retrying():
+            with attempt:
+                async with self._semaphore:
+                    response = await self.client.embeddings.create(model=model, input=inputs)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    async def chat_stream(
+        self, messages: List[Dict[str, Any]], model: Optional[str] = None, **kwargs
+    ) -> AsyncIterator[str]:
+        """
+        Appelle l'API de chat completions en streaming et produit le texte au fil de l'eau.
+        Seule l'ouverture du flux est réessayée: une fois des tokens transmis, une erreur est propagée.
+        Le slot de concurrence est occupé jusqu'à la fin (ou l'abandon) du flux.
+
+        Args:
+            messages: Messages à envoyer au modèle
+            model: Modèle à utiliser (par défaut: MODEL_OPENAI)
+            **kwargs: Paramètres supplémentaires (temperature, max_tokens, ...)
+
+        Yields:
+            Les fragments de texte générés, dans l'ordre
+        """
+        async for attempt in self._retrying():
+            with attempt:
+                await self._semaphore.acquire()
+                try:
+                    stream = await self.client.chat.completions.create(
+                        model=model or self.default_model,
+                        messages=messages,
+                        stream=True,
+                        **kwargs
+                    )
+                except BaseException:
+                    self._semaphore.release()
+                    raise
+
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            self._semaphore.release()
+            await stream.close()
+
+    async def aclose(self):
+        """Ferme le client HTTP partagé (à appeler à l'arrêt de l'application)"""
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+
+# Instance unique de la passerelle
+llm_gateway = LLMGateway()
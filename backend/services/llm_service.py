@@ -3,36 +3,53 @@ Service pour la génération de réponses via des modèles de langage (LLM).
 Ce service est utilisé pour générer des réponses aux messages des utilisateurs
 en fonction du prompt spécifique de l'agent IA.
 """
-import os
 import logging
-from typing import List, Dict, Any
-import openai
+from typing import List, Dict, Any, AsyncIterator, Optional
 import traceback
 import random
 from dotenv import load_dotenv
+from services.llm_gateway import llm_gateway
+from services.context_builder import build_context
 
 # Chargement des variables d'environnement
 load_dotenv()
 
 # Configuration du logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Configuration d'OpenAI avec le nouveau client
-api_key = os.environ.get("OPENAI_API_KEY")
-model_name = os.environ.get("MODEL_OPENAI", "gpt-3.5-turbo")
-client = openai.OpenAI(api_key=api_key)
-DEFAULT_MODEL = model_name
+# Modèle par défaut (partagé avec la passerelle LLM)
+DEFAULT_MODEL = llm_gateway.default_model
 
 logger.info(f"Configuration du LLM avec le modèle: {DEFAULT_MODEL}")
-logger.info(f"Clé API (premiers caractères): {api_key[:8]}..." if api_key else "ERREUR: Clé API manquante")
 
+def build_messages(
+    user_message: str,
+    conversation_history: List[Dict[str, Any]],
+    agent_prompt: str,
+    summary: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Prépare les messages envoyés au modèle: prompt de l'agent, résumé des échanges anciens,
+    historique récent (dans le budget de tokens) et message courant.
+    
+    Args:
+        user_message: Le message de l'utilisateur
+        conversation_history: L'historique récent de la conversation
+        agent_prompt: Le prompt spécifique à l'agent IA
+        summary: Le résumé des échanges plus anciens (optionnel)
+        
+    Returns:
+        La liste des messages au format de l'API OpenAI
+    """
+    return build_context(agent_prompt, conversation_history, user_message, summary=summary)
 
-def generate_response(
+
+async def generate_response(
     user_message: str, 
     conversation_history: List[Dict[str, Any]], 
     agent_prompt: str,
-    model: str = DEFAULT_MODEL
+    model: str = DEFAULT_MODEL,
+    summary: Optional[str] = None
 ) -> str:
     """
     Génère une réponse à un message utilisateur en utilisant un modèle LLM.
@@ -42,13 +59,14 @@ def generate_response(
         conversation_history: L'historique de la conversation
         agent_prompt: Le prompt spécifique à l'agent IA
         model: Le modèle LLM à utiliser
+        summary: Le résumé des échanges plus anciens de la conversation (optionnel)
         
     Returns:
         La réponse générée par le modèle
     """
     try:
         # Vérifier si la clé API est configurée
-        if not api_key:
+        if not llm_gateway.api_key:
             logger.error("ERREUR CRITIQUE: Clé API OpenAI non configurée")
             return "ERREUR: L'API OpenAI n'est pas correctement configurée. Veuillez vérifier votre clé API dans le fichier .env."
         
@@ -57,33 +75,17 @@ def generate_response(
         logger.info(f"Message utilisateur: {user_message[:50]}...")
         
         # Utilisation d'OpenAI pour la génération de réponses
-        # Préparer les messages pour l'API
-        messages = [
-            {"role": "system", "content": agent_prompt}
-        ]
-        
-        # Ajouter l'historique de la conversation (limité aux 10 derniers messages)
-        for message in conversation_history[-10:]:
-            messages.append({
-                "role": message["role"],
-                "content": message["content"]
-            })
-        
-        # Ajouter le message utilisateur actuel
-        messages.append({"role": "user", "content": user_message})
+        messages = build_messages(user_message, conversation_history, agent_prompt, summary=summary)
         
         logger.info(f"Appel API OpenAI avec {len(messages)} messages")
         
-        # Appeler l'API OpenAI avec la nouvelle interface
-        response = client.chat.completions.create(
+        # Appeler l'API OpenAI via la passerelle partagée
+        generated_response = await llm_gateway.chat(
+            messages,
             model=model,
-            messages=messages,
             max_tokens=500,
             temperature=0.7,
         )
-        
-        # Extraire la réponse avec la nouvelle structure
-        generated_response = response.choices[0].message.content.strip()
         logger.info(f"Réponse générée: {generated_response[:50]}...")
         return generated_response
     
@@ -94,6 +96,37 @@ def generate_response(
         return f"Désolé, une erreur est survenue lors de la génération de la réponse: {str(e)}"
 
 
+async def stream_response(
+    user_message: str,
+    conversation_history: List[Dict[str, Any]],
+    agent_prompt: str,
+    model: str = DEFAULT_MODEL,
+    summary: Optional[str] = None
+) -> AsyncIterator[str]:
+    """
+    Génère une réponse en streaming: les fragments de texte sont produits dès leur réception.
+    Contrairement à generate_response, les erreurs sont propagées à l'appelant,
+    qui décide quoi faire du texte déjà transmis.
+    
+    Args:
+        user_message: Le message de l'utilisateur
+        conversation_history: L'historique de la conversation
+        agent_prompt: Le prompt spécifique à l'agent IA
+        model: Le modèle LLM à utiliser
+        summary: Le résumé des échanges plus anciens de la conversation (optionnel)
+        
+    Yields:
+        Les fragments de la réponse générée
+    """
+    if not llm_gateway.api_key:
+        raise RuntimeError("L'API OpenAI n'est pas correctement configurée (clé API manquante)")
+    
+    messages = build_messages(user_message, conversation_history, agent_prompt, summary=summary)
+    logger.info(f"Appel API OpenAI en streaming avec {len(messages)} messages (modèle {model})")
+    async for delta in llm_gateway.chat_stream(messages, model=model, max_tokens=500, temperature=0.7):
+        yield delta
+
+
 def generate_fallback_response(user_message: str, agent_prompt: str) -> str:
     """
     Génère une réponse de secours en cas d'erreur avec l'API OpenAI.
@@ -0,0 +1,217 @@
+"""
+Configuration du logging de l'application: écriture asynchrone, enregistrements JSON et
+échantillonnage par route.
+
+- Les modules ne configurent pas le logging (ni basicConfig ni handler): ils utilisent
+  logging.getLogger(__name__), et configure_logging() est appelée une fois par l'application.
+- Le logger racine n'a qu'un QueueHandler: la requête ne fait que fusionner le message avec ses
+  arguments et déposer l'enregistrement dans une file. Un thread le met en forme (JSON ou texte)
+  et l'écrit sur la sortie d'erreur (et dans LOG_FILE si défini). Ce thread se réveille toutes les
+  LOG_FLUSH_INTERVAL secondes et vide la file: un appel de logging ne réveille pas de thread
+  (pas de passage du GIL ni de changement de contexte par enregistrement).
+- Les messages utilisent le formatage différé de logging (logger.info("... %s", valeur)): un
+  niveau désactivé ou un enregistrement écarté ne coûte aucune mise en forme.
+- Échantillonnage par requête (premier motif correspondant de LOG_SAMPLING_POLICY): pour une
+  requête non retenue, les enregistrements INFO et DEBUG sont écartés; les avertissements et
+  les erreurs sont toujours écrits. Les journaux d'accès d'uvicorn suivent la même politique.
+
+Variables d'environnement: LOG_LEVEL (INFO), LOG_FORMAT (json | text), LOG_FILE, LOG_FLUSH_INTERVAL (0.1),
+LOG_SAMPLE_RATE (taux des lectures /api, 0.1), LOG_SAMPLING_POLICY (JSON {"motif": taux}).
+"""
+import os
+import copy
+import json
+import queue
+import time
+import uuid
+import atexit
+import random
+import logging
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.monitoring import load_route_policy
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json").lower()
+LOG_FILE = os.environ.get("LOG_FILE", "").strip()
+LOG_FLUSH_INTERVAL = float(os.environ.get("LOG_FLUSH_INTERVAL", "0.1"))
+# Taux des lectures /api (routes les plus fréquentes) sans règle plus précise
+LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", "0.1"))
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Politique par défaut: (motif, taux) comme pour les traces Sentry (services/monitoring.py)
+DEFAULT_LOG_SAMPLING_POLICY: List[Tuple[str, float]] = [
+    ("/health", 0.0),
+    ("/metrics", 0.0),
+    ("/assets/*", 0.0),
+    ("GET /api/*", LOG_SAMPLE_RATE),
+]
+
+log_sampling_policy = load_route_policy("LOG_SAMPLING_POLICY", DEFAULT_LOG_SAMPLING_POLICY, 1.0)
+
+# Contexte de la requête en cours: (identifiant, méthode, chemin, retenue par l'échantillonnage)
+_request_context: ContextVar[Optional[Tuple[str, str, str, bool]]] = ContextVar("log_request_context", default=None)
+
+# Attributs de tout LogRecord: les autres (extra=..., contexte de la requête) sont ajoutés au JSON
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_exception_formatter = logging.Formatter()
+_listener: Optional[QueueListener] = None
+
+
+def is_sampled(method: str, path: str) -> bool:
+    """Tirage de l'échantillonnage des journaux pour une requête"""
+    rate = log_sampling_policy.rate(method, path)
+    return rate >= 1 or (rate > 0 and random.random() < rate)
+
+
+class JsonFormatter(logging.Formatter):
+    """Un objet JSON par ligne: date, niveau, logger, message, champs supplémentaires, exception"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RequestSamplingFilter(logging.Filter):
+    """Écarte les enregistrements INFO et DEBUG des requêtes non retenues, ajoute le contexte de la requête"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = _request_context.get()
+        if context is None:
+            # Journal d'accès d'uvicorn, écrit après la réponse: (client, méthode, chemin, version, statut)
+            if record.name == "uvicorn.access" and record.levelno < logging.WARNING:
+                args = record.args
+                if isinstance(args, tuple) and len(args) >= 3:
+                    return is_sampled(str(args[1]), str(args[2]).split("?", 1)[0])
+            return True
+        request_id, method, path, sampled = context
+        if not sampled and record.levelno < logging.WARNING:
+            return False
+        record.request_id = request_id
+        record.method = method
+        record.path = path
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    QueueHandler qui ne met pas en forme l'enregistrement dans le thread appelant: seuls le message
+    (les arguments peuvent être modifiés après l'appel) et la trace de l'exception sont figés
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class BatchingQueueListener(QueueListener):
+    """QueueListener qui écrit périodiquement les enregistrements en attente, par lots"""
+
+    def __init__(self, queue, *handlers, interval: float = LOG_FLUSH_INTERVAL):
+        super().__init__(queue, *handlers, respect_handler_level=True)
+        self.interval = interval
+
+    def _monitor(self):
+        while True:
+            time.sleep(self.interval)
+            while True:
+                try:
+                    record = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if record is self._sentinel:
+                    return
+                self.handle(record)
+
+
+class LogContextMiddleware:
+    """Middleware ASGI: contexte de journalisation de la requête (identifiant, échantillonnage)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", ()):
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        method, path = scope["method"], scope["path"]
+        token = _request_context.set((request_id or uuid.uuid4().hex[:16], method, path, is_sampled(method, path)))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_context.reset(token)
+
+
+def configure_logging():
+    """
+    Installe le pipeline de logging du processus (une seule fois): QueueHandler sur le logger
+    racine et thread d'écriture. Les loggers d'uvicorn sont redirigés vers le logger racine.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    formatter = JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT)
+    handlers: List[logging.Handler] = [logging.StreamHandler()]
+    if LOG_FILE:
+        handlers.append(logging.FileHandler(LOG_FILE, encoding="utf-8"))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(RequestSamplingFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(LOG_LEVEL)
+
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+
+    _listener = BatchingQueueListener(log_queue, *handlers)
+    _listener.start()
+    # Les enregistrements encore dans la file sont écrits à l'arrêt du processus
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Arrête le thread d'écriture après avoir vidé la file"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,128 @@
+"""
+Métriques HTTP Prometheus et exposition sur /metrics.
+
+Le middleware est un middleware ASGI pur (pas de BaseHTTPMiddleware: ni tâche ni flux
+supplémentaires par requête). Les requêtes sont étiquetées par le modèle de la route
+("/api/tasks/{task_id}") et non par le chemin brut: le nombre de séries reste borné par
+le nombre de routes, quels que soient les identifiants et les chemins de la SPA.
+- http_requests_total{method, route, status}
+- http_request_duration_seconds{method, route} (histogramme)
+- http_requests_in_progress{method}
+
+Avec plusieurs workers (uvicorn --workers, gunicorn), définir PROMETHEUS_MULTIPROC_DIR
+(répertoire vide au démarrage, voir prepare_multiprocess_dir): chaque worker y écrit ses
+valeurs et /metrics agrège celles de tous les workers. Avec gunicorn, appeler
+mark_worker_exit(worker.pid) dans le hook child_exit.
+"""
+import os
+import time
+import shutil
+import logging
+from typing import Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR", "").strip()
+
+# Étiquette des requêtes qui ne correspondent à aucune route (404, préflight CORS, ...)
+UNMATCHED_ROUTE = "<unmatched>"
+
+# Latences attendues: de quelques ms (routes en cache) à plusieurs dizaines de secondes (appels LLM)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Métriques Prometheus
+REQUEST_COUNT = Counter('http_requests_total', 'Total des requêtes HTTP', ['method', 'route', 'status'])
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Latence des requêtes HTTP', ['method', 'route'], buckets=LATENCY_BUCKETS
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    'http_requests_in_progress', 'Requêtes HTTP en cours de traitement', ['method'], multiprocess_mode='livesum'
+)
+
+
+def route_label(scope, root_path: str) -> str:
+    """
+    Modèle de la route qui a traité la requête, lu dans le scope ASGI renseigné par le routeur
+
+    Args:
+        scope: Scope ASGI de la requête, après son traitement
+        root_path: root_path du scope avant le routage
+    """
+    route = scope.get("route")
+    if route is not None:
+        return getattr(route, "path", UNMATCHED_ROUTE)
+    # Application montée (ex: fichiers statiques): préfixe du montage
+    mount_path = scope.get("root_path", root_path)[len(root_path):]
+    if mount_path:
+        return f"{mount_path}/{{path}}"
+    # Route Starlette sans paramètre (documentation OpenAPI): son chemin est fixe
+    if "endpoint" in scope and not scope.get("path_params"):
+        return scope["path"]
+    return UNMATCHED_ROUTE
+
+
+class PrometheusMiddleware:
+    """Middleware ASGI qui mesure les requêtes HTTP (compteur, latence, requêtes en cours)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        root_path = scope.get("root_path", "")
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_progress = REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            in_progress.dec()
+            route = route_label(scope, root_path)
+            REQUEST_COUNT.labels(method, route, str(status_code)).inc()
+            REQUEST_LATENCY.labels(method, route).observe(duration)
+
+
+def prepare_multiprocess_dir():
+    """Vide le répertoire PROMETHEUS_MULTIPROC_DIR avant le démarrage des workers (processus parent)"""
+    if not MULTIPROC_DIR:
+        return
+    shutil.rmtree(MULTIPROC_DIR, ignore_errors=True)
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+
+def mark_worker_exit(pid: Optional[int] = None):
+    """Retire les jauges d'un worker arrêté de l'agrégat multiprocessus"""
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid or os.getpid())
+
+
+def render_metrics():
+    """
+    Exposition texte des métriques (agrégées sur tous les workers en mode multiprocessus)
+
+    Returns:
+        Tuple (contenu, type de contenu)
+    """
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
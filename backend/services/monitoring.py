@@ -0,0 +1,218 @@
+"""
+Supervision des erreurs et des performances avec Sentry.
+
+Sentry est initialisé à la construction de l'application, avant l'enregistrement des routes:
+l'intégration FastAPI instrumente chaque route au moment où elle est ajoutée. Sans SENTRY_DSN,
+le SDK n'est pas importé du tout. Les intégrations activées automatiquement (qui importent
+aiohttp, redis, ... pour les détecter) sont remplacées par la liste de celles que l'application utilise.
+
+Échantillonnage des traces, par route (premier motif correspondant de la politique):
+- taux 0: aucune transaction (santé, métriques, fichiers statiques et pages de la SPA);
+- taux 1: toujours conservée (appels au LLM);
+- taux intermédiaire (routes CRUD): la transaction est enregistrée, puis à la fin de la requête
+  conservée si elle est lente (SENTRY_SLOW_TRANSACTION_MS) ou en erreur (5xx, exception),
+  sinon avec la probabilité du taux. La décision est prise par un processeur d'événements global,
+  avant la sérialisation de la transaction (before_send_transaction n'intervient qu'après):
+  une transaction écartée ne coûte que l'enregistrement de ses spans.
+Les événements d'erreur ne sont pas concernés: ils sont toujours envoyés.
+"""
+import os
+import re
+import json
+import random
+import fnmatch
+import logging
+from contextvars import ContextVar
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from prometheus_client import Counter
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Taux des routes CRUD (/api/* sans règle plus précise)
+TRACES_DEFAULT_RATE = float(os.environ.get("SENTRY_TRACES_DEFAULT_RATE", "0.05"))
+# Au-delà de cette durée, une transaction est toujours conservée
+SLOW_TRANSACTION_MS = float(os.environ.get("SENTRY_SLOW_TRANSACTION_MS", "1000"))
+
+# Politique par défaut: (motif, taux), le premier motif qui correspond s'applique.
+# Un motif est un chemin avec jokers (fnmatch), éventuellement précédé d'une méthode ("POST /api/messages").
+DEFAULT_TRACES_POLICY: List[Tuple[str, float]] = [
+    ("/health", 0.0),
+    ("/metrics", 0.0),
+    ("/assets/*", 0.0),
+    ("/api/docs*", 0.0),
+    ("/api/redoc*", 0.0),
+    ("/api/openapi.json", 0.0),
+    # Appels au LLM
+    ("POST /api/messages*", 1.0),
+    ("POST /api/generate-tasks", 1.0),
+    ("POST /api/recommend-next-task", 1.0),
+    ("POST /api/generate_tasks", 1.0),
+    ("POST /api/generate", 1.0),
+    ("GET /api/weekly-review", 1.0),
+    ("GET /api/habits/weekly-report", 1.0),
+    ("/api/*", TRACES_DEFAULT_RATE),
+    # Tout le reste est servi par serve_react (SPA et fichiers statiques)
+    ("*", 0.0),
+]
+
+# Statut de trace d'une requête terminée par une exception
+ERROR_TRACE_STATUSES = {"internal_error", "unknown_error", "unknown", "deadline_exceeded", "unavailable"}
+
+# Métriques Prometheus
+SENTRY_TRANSACTIONS = Counter(
+    'sentry_transactions_total', 'Transactions Sentry par décision d\'échantillonnage', ['decision']
+)
+
+
+class RoutePolicy:
+    """Taux par méthode et chemin de requête (premier motif correspondant, sinon taux par défaut)"""
+
+    def __init__(self, rules: List[Tuple[str, float]], default_rate: float):
+        self.default_rate = default_rate
+        self.rules = []
+        for pattern, rate in rules:
+            method, _, path = pattern.rpartition(" ")
+            self.rules.append((method.upper() or None, re.compile(fnmatch.translate(path)), float(rate)))
+        # Les chemins sont peu variés hors identifiants: le cache évite de réévaluer les motifs
+        self.rate = lru_cache(maxsize=4096)(self._rate)
+
+    def _rate(self, method: str, path: str) -> float:
+        for rule_method, regex, rate in self.rules:
+            if (rule_method is None or rule_method == method) and regex.match(path):
+                return rate
+        return self.default_rate
+
+
+def load_route_policy(env_name: str, defaults: List[Tuple[str, float]], default_rate: float) -> RoutePolicy:
+    """
+    Politique par défaut, précédée des règles de la variable d'environnement env_name
+    (JSON: {"motif": taux, ...}, ex: {"GET /api/tasks*": 0.01, "/api/analytics/*": 0.2})
+    """
+    rules = list(defaults)
+    raw = os.environ.get(env_name, "").strip()
+    if raw:
+        try:
+            rules = list(json.loads(raw).items()) + rules
+        except (ValueError, AttributeError) as e:
+            logger.error(f"{env_name} invalide, politique par défaut utilisée: {str(e)}")
+    return RoutePolicy(rules, default_rate)
+
+
+traces_policy = load_route_policy("SENTRY_TRACES_POLICY", DEFAULT_TRACES_POLICY, TRACES_DEFAULT_RATE)
+
+# Taux de la transaction en cours quand la décision est reportée à la fin de la requête
+# (traces_sampler et la fin de la transaction s'exécutent dans la tâche de la requête)
+_deferred_rate: ContextVar[Optional[float]] = ContextVar("sentry_deferred_rate", default=None)
+
+
+def traces_sampler(sampling_context: Dict[str, Any]) -> float:
+    """Décision à l'ouverture d'une transaction: ne rien enregistrer pour les routes à taux 0"""
+    _deferred_rate.set(None)
+    scope = sampling_context.get("asgi_scope")
+    if not scope:
+        return TRACES_DEFAULT_RATE
+    rate = traces_policy.rate(scope.get("method", ""), scope.get("path", ""))
+    if rate <= 0:
+        SENTRY_TRANSACTIONS.labels(decision="not_recorded").inc()
+        return 0.0
+    # Trace distribuée: la décision de l'appelant est suivie
+    if sampling_context.get("parent_sampled") is not None:
+        return 1.0 if sampling_context["parent_sampled"] else 0.0
+    # Enregistrée; la décision finale est prise par sample_transaction
+    if rate < 1:
+        _deferred_rate.set(rate)
+    return 1.0
+
+
+def _timestamp(value) -> Optional[float]:
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, str):
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    return None
+
+
+def transaction_duration_ms(event: Dict[str, Any]) -> float:
+    start, end = _timestamp(event.get("start_timestamp")), _timestamp(event.get("timestamp"))
+    return (end - start) * 1000 if start is not None and end is not None else 0.0
+
+
+def is_error_transaction(event: Dict[str, Any]) -> bool:
+    """Transaction terminée par une réponse 5xx ou une exception"""
+    status_code = (event.get("tags") or {}).get("http.status_code")
+    if status_code and str(status_code).isdigit() and int(status_code) >= 500:
+        return True
+    trace_status = ((event.get("contexts") or {}).get("trace") or {}).get("status")
+    return trace_status in ERROR_TRACE_STATUSES
+
+
+def sample_transaction(event: Dict[str, Any], hint: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Processeur d'événements: décision à la fin d'une transaction enregistrée,
+    conservée si lente, en erreur, ou tirée au sort selon le taux de sa route
+    """
+    if event.get("type") != "transaction":
+        return event
+    rate = _deferred_rate.get()
+
+    if rate is None:
+        decision = "kept"
+    elif is_error_transaction(event):
+        decision = "kept_error"
+    elif transaction_duration_ms(event) >= SLOW_TRANSACTION_MS:
+        decision = "kept_slow"
+    elif random.random() < rate:
+        decision = "kept_sampled"
+    else:
+        decision = "dropped"
+
+    SENTRY_TRANSACTIONS.labels(decision=decision).inc()
+    return None if decision == "dropped" else event
+
+
+def init_sentry(**options) -> bool:
+    """
+    Initialise Sentry si SENTRY_DSN est défini
+
+    Args:
+        **options: Options supplémentaires de sentry_sdk.init (ex: transport pour un banc d'essai)
+
+    Returns:
+        True si Sentry est actif
+    """
+    dsn = os.getenv("SENTRY_DSN", "").strip()
+    if not dsn:
+        return False
+
+    import sentry_sdk
+    from sentry_sdk.scope import add_global_event_processor
+    from sentry_sdk.integrations.fastapi import FastApiIntegration
+    from sentry_sdk.integrations.httpx import HttpxIntegration
+    from sentry_sdk.integrations.starlette import StarletteIntegration
+
+    integrations = [StarletteIntegration(), FastApiIntegration(), HttpxIntegration()]
+    if os.environ.get("REDIS_URL", "").strip():
+        from sentry_sdk.integrations.redis import RedisIntegration
+        integrations.append(RedisIntegration())
+
+    sentry_sdk.init(**{
+        "dsn": dsn,
+        "traces_sampler": traces_sampler,
+        "environment": os.getenv("ENVIRONMENT", "production"),
+        "auto_enabling_integrations": False,
+        "integrations": integrations,
+        **options,
+    })
+    add_global_event_processor(sample_transaction)
+    if not options.get("debug"):
+        # Le journal interne du SDK est au niveau DEBUG et filtré après la création de chaque
+        # enregistrement (plusieurs par requête): sans mode debug, ils sont écartés dès l'appel
+        logging.getLogger("sentry_sdk.errors").setLevel(logging.INFO)
+    logger.info("Sentry initialisé")
+    return True
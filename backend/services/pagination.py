@@ -0,0 +1,69 @@
+"""
+Utilitaires pour la pagination par curseur (keyset).
+Le curseur est un JSON encodé en base64 url-safe contenant les clés de tri de la dernière ligne renvoyée.
+"""
+import json
+import base64
+from datetime import datetime
+from typing import Dict, Any, Iterable, Mapping
+
+# Types attendus des clés de tri (tâches: created_at ISO, id entier)
+DEFAULT_KEY_TYPES: Mapping[str, type] = {"created_at": str, "id": int}
+
+
+def encode_cursor(values: Dict[str, Any]) -> str:
+    """
+    Encode les clés de tri d'une ligne en curseur opaque
+
+    Args:
+        values: Dictionnaire des clés de tri (ex: {"created_at": ..., "id": ...})
+
+    Returns:
+        Le curseur encodé
+    """
+    raw = json.dumps(values, separators=(",", ":"), default=str).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(
+    cursor: str,
+    required_keys: Iterable[str] = ("created_at", "id"),
+    key_types: Mapping[str, type] = DEFAULT_KEY_TYPES
+) -> Dict[str, Any]:
+    """
+    Décode et valide un curseur
+
+    Args:
+        cursor: Curseur produit par encode_cursor
+        required_keys: Clés qui doivent être présentes dans le curseur
+        key_types: Type JSON attendu de chaque clé (les valeurs sont réinjectées dans les filtres)
+
+    Returns:
+        Le dictionnaire des clés de tri
+
+    Raises:
+        ValueError: Si le curseur est invalide
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception:
+        raise ValueError("Curseur invalide")
+
+    if not isinstance(values, dict) or any(key not in values for key in required_keys):
+        raise ValueError("Curseur invalide")
+
+    for key, expected_type in key_types.items():
+        value = values.get(key)
+        # bool est un sous-type de int: true n'est pas un identifiant
+        if key in values and (not isinstance(value, expected_type) or isinstance(value, bool)):
+            raise ValueError("Curseur invalide")
+
+    # Le timestamp est réinjecté dans un filtre PostgREST: il doit être une date ISO valide
+    if "created_at" in values:
+        try:
+            datetime.fromisoformat(values["created_at"])
+        except ValueError:
+            raise ValueError("Curseur invalide")
+
+    return values
@@ -0,0 +1,61 @@
+"""
+Mémoïsation des appels de service à l'échelle d'une requête HTTP.
+Pendant une requête, deux appels identiques à une méthode décorée par @request_memoize
+(mêmes arguments) ne sont exécutés qu'une fois: le second attend le résultat du premier,
+même s'ils sont lancés en parallèle. Hors requête, les appels ne sont pas mémoïsés.
+"""
+import asyncio
+import functools
+import inspect
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+# Résultats (futures) des appels déjà lancés pendant la requête courante
+_request_cache: ContextVar[Optional[Dict[Any, asyncio.Future]]] = ContextVar("request_cache", default=None)
+
+
+@contextmanager
+def request_scope():
+    """Ouvre un cache vide pour la durée d'une requête (utilisé par le middleware de l'application)"""
+    token = _request_cache.set({})
+    try:
+        yield
+    finally:
+        _request_cache.reset(token)
+
+
+def request_memoize(func):
+    """
+    Décorateur pour une méthode de service asynchrone dont le résultat ne change pas
+    pendant une requête. Les arguments sont normalisés (positionnels, nommés, valeurs par défaut)
+    et doivent être hashables.
+    """
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        cache = _request_cache.get()
+        if cache is None:
+            return await func(*args, **kwargs)
+
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        # L'instance (self) fait partie de la clé: les singletons de service ne sont jamais copiés
+        key = (func.__qualname__, tuple(
+            (name, id(value) if name == "self" else value) for name, value in bound.arguments.items()
+        ))
+
+        future = cache.get(key)
+        if future is None:
+            future = asyncio.ensure_future(func(*args, **kwargs))
+            cache[key] = future
+            try:
+                return await future
+            except BaseException:
+                # Ne pas mémoriser les échecs: un nouvel appel pourra réessayer
+                cache.pop(key, None)
+                raise
+        return await asyncio.shield(future)
+
+    return wrapper
@@ -0,0 +1,263 @@
+"""
+Service des fichiers du frontend (build Vite de frontend/dist) depuis un manifeste en mémoire.
+
+Le manifeste est construit une fois par worker, au démarrage de l'application (lifespan): chaque
+fichier est lu et compressé (gzip, et brotli si le module brotli est installé; les fichiers .gz/.br
+produits par le build sont utilisés tels quels). Une requête ne fait ensuite aucun accès disque:
+- l'encodage est choisi selon Accept-Encoding (br, puis gzip, sinon le fichier d'origine);
+- chaque représentation a un ETag fort, et If-None-Match renvoie 304 sans corps;
+- les fichiers de /assets dont le nom contient l'empreinte du build sont mis en cache un an
+  (immutable); index.html et les autres fichiers sont revalidés à chaque chargement (no-cache);
+- les chemins inconnus hors /assets reçoivent index.html (routage côté client de la SPA).
+Les fichiers plus gros que STATIC_MAX_MEMORY_FILE_SIZE restent sur disque (FileResponse).
+"""
+import os
+import re
+import gzip
+import hashlib
+import logging
+import mimetypes
+from functools import lru_cache
+from typing import Dict, FrozenSet, Mapping, Optional, Tuple
+
+from starlette.responses import FileResponse, Response
+
+from services.container import container
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+FRONTEND_DIST_PATH = os.environ.get("FRONTEND_DIST_PATH", os.path.abspath("../frontend/dist"))
+STATIC_MAX_MEMORY_FILE_SIZE = int(os.environ.get("STATIC_MAX_MEMORY_FILE_SIZE", str(5 * 1024 * 1024)))
+
+# En dessous de cette taille, ou si le gain est inférieur à 10%, la compression n'est pas utile
+MIN_COMPRESS_SIZE = 512
+MIN_COMPRESS_RATIO = 0.9
+BROTLI_QUALITY = 11
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# Fichiers produits par Vite: assets/[nom]-[empreinte].[ext]
+HASHED_ASSET_PATTERN = re.compile(r"^assets/.+[-.][A-Za-z0-9_-]{8,}\.[A-Za-z0-9]+$")
+
+COMPRESSIBLE_TYPES = {
+    "application/javascript", "application/json", "application/manifest+json",
+    "application/xml", "application/wasm", "image/svg+xml", "image/x-icon",
+}
+
+# Suffixe des fichiers précompressés par le build, par encodage
+PRECOMPRESSED_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+
+def _brotli():
+    try:
+        import brotli
+        return brotli
+    except ImportError:
+        return None
+
+
+def is_compressible(content_type: str) -> bool:
+    return (
+        content_type.startswith("text/")
+        or content_type in COMPRESSIBLE_TYPES
+        or content_type.endswith(("+json", "+xml"))
+    )
+
+
+@lru_cache(maxsize=256)
+def accepted_encodings(accept_encoding: str) -> FrozenSet[str]:
+    """Encodages acceptés par le client (en-tête Accept-Encoding, q=0 exclus)"""
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        token, _, params = part.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.add(token.strip())
+    if "*" in accepted:
+        accepted.update(PRECOMPRESSED_SUFFIXES)
+    return frozenset(accepted)
+
+
+def _etag_matches(if_none_match: str, etags: FrozenSet[str]) -> bool:
+    """Comparaison faible de If-None-Match (RFC 9110): W/ est ignoré"""
+    if if_none_match.strip() == "*":
+        return True
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag in etags:
+            return True
+    return False
+
+
+class StaticAsset:
+    """Un fichier du build et ses représentations (identité, gzip, br), avec leurs en-têtes"""
+
+    def __init__(self, relative_path: str, file_path: str, content: Optional[bytes], digest: str):
+        self.relative_path = relative_path
+        self.file_path = file_path
+        self.content_type = mimetypes.guess_type(relative_path)[0] or "application/octet-stream"
+        self.cache_control = (
+            IMMUTABLE_CACHE_CONTROL if HASHED_ASSET_PATTERN.match(relative_path) else REVALIDATE_CACHE_CONTROL
+        )
+        self.compressible = content is not None and is_compressible(self.content_type)
+        # encodage -> (corps, en-têtes); "identity" pour le fichier d'origine
+        self.variants: Dict[str, Tuple[Optional[bytes], Dict[str, str]]] = {}
+        self.etags: FrozenSet[str] = frozenset()
+        self._digest = digest
+        self._add_variant("identity", content)
+
+    def _add_variant(self, encoding: str, body: Optional[bytes]):
+        headers = {
+            "etag": f'"{self._digest}"' if encoding == "identity" else f'"{self._digest}-{encoding}"',
+            "cache-control": self.cache_control,
+        }
+        if encoding != "identity":
+            headers["content-encoding"] = encoding
+        self.variants[encoding] = (body, headers)
+        self.etags = self.etags | {headers["etag"]}
+
+    def compress(self, precompressed: Mapping[str, bytes], brotli_module=None):
+        """Ajoute les représentations compressées (fichiers du build, sinon compression ici)"""
+        content = self.variants["identity"][0]
+        if not self.compressible or len(content) < MIN_COMPRESS_SIZE:
+            return
+        candidates = dict(precompressed)
+        if "gzip" not in candidates:
+            candidates["gzip"] = gzip.compress(content, compresslevel=9, mtime=0)
+        if "br" not in candidates and brotli_module is not None:
+            candidates["br"] = brotli_module.compress(content, quality=BROTLI_QUALITY)
+        for encoding, body in candidates.items():
+            if len(body) <= len(content) * MIN_COMPRESS_RATIO:
+                self._add_variant(encoding, body)
+        # La représentation dépend alors de l'en-tête Accept-Encoding (caches intermédiaires)
+        if len(self.variants) > 1:
+            for _, headers in self.variants.values():
+                headers["vary"] = "Accept-Encoding"
+
+    def response(self, headers: Mapping[str, str]) -> Response:
+        """Réponse à une requête GET: 304 si l'ETag du client est à jour, sinon la meilleure représentation"""
+        encoding = "identity"
+        if len(self.variants) > 1:
+            accepted = accepted_encodings(headers.get("accept-encoding", ""))
+            for candidate in ("br", "gzip"):
+                if candidate in self.variants and candidate in accepted:
+                    encoding = candidate
+                    break
+        body, variant_headers = self.variants[encoding]
+
+        if_none_match = headers.get("if-none-match")
+        if if_none_match and _etag_matches(if_none_match, self.etags):
+            return Response(status_code=304, headers={
+                name: value for name, value in variant_headers.items() if name != "content-encoding"
+            })
+        if body is None:
+            return FileResponse(self.file_path, headers=variant_headers, media_type=self.content_type)
+        return Response(content=body, headers=variant_headers, media_type=self.content_type)
+
+
+class StaticManifest:
+    """Manifeste en mémoire des fichiers du build du frontend"""
+
+    def __init__(self, root: str):
+        self.root = root
+        # Une ressource par dossier: deux manifestes de dossiers différents ne partagent pas leurs fichiers
+        self._assets = container.register(f"static.manifest:{root}", self._build)
+
+    @property
+    def assets(self) -> Dict[str, StaticAsset]:
+        return self._assets.get()
+
+    def load(self) -> int:
+        """Construit le manifeste (au démarrage du worker); retourne le nombre de fichiers"""
+        return len(self.assets)
+
+    def _build(self) -> Dict[str, StaticAsset]:
+        assets: Dict[str, StaticAsset] = {}
+        if not os.path.isdir(self.root):
+            logger.warning(f"Dossier {self.root} non trouvé. Les fichiers statiques ne seront pas servis.")
+            return assets
+
+        brotli_module = _brotli()
+        if brotli_module is None:
+            logger.info("Module brotli non installé: fichiers statiques compressés en gzip uniquement")
+
+        sizes = {"identity": 0, "gzip": 0, "br": 0}
+        for directory, _, filenames in os.walk(self.root):
+            names = set(filenames)
+            for filename in filenames:
+                # Les fichiers .gz/.br du build sont des représentations d'un autre fichier
+                if any(filename.endswith(suffix) and filename[:-len(suffix)] in names
+                       for suffix in PRECOMPRESSED_SUFFIXES.values()):
+                    continue
+                file_path = os.path.join(directory, filename)
+                relative_path = os.path.relpath(file_path, self.root).replace(os.sep, "/")
+                try:
+                    asset = self._load_asset(relative_path, file_path, names, brotli_module)
+                except OSError as e:
+                    logger.error(f"Erreur lors de la lecture du fichier statique {file_path}: {str(e)}")
+                    continue
+                assets[relative_path] = asset
+                for encoding, (body, _) in asset.variants.items():
+                    sizes[encoding] += len(body) if body is not None else 0
+
+        logger.info(
+            f"Manifeste statique: {len(assets)} fichiers depuis {self.root} "
+            f"({sizes['identity'] // 1024} Ko, gzip {sizes['gzip'] // 1024} Ko, br {sizes['br'] // 1024} Ko)"
+        )
+        return assets
+
+    def _load_asset(self, relative_path: str, file_path: str, names, brotli_module) -> StaticAsset:
+        size = os.path.getsize(file_path)
+        in_memory = size <= STATIC_MAX_MEMORY_FILE_SIZE
+        content = None
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            if in_memory:
+                content = f.read()
+                digest.update(content)
+            else:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+
+        asset = StaticAsset(relative_path, file_path, content, digest.hexdigest()[:32])
+        precompressed = {}
+        filename = os.path.basename(file_path)
+        for encoding, suffix in PRECOMPRESSED_SUFFIXES.items():
+            if filename + suffix in names:
+                with open(file_path + suffix, "rb") as f:
+                    precompressed[encoding] = f.read()
+        asset.compress(precompressed, brotli_module)
+        return asset
+
+    def response(self, path: str, headers: Mapping[str, str]) -> Optional[Response]:
+        """
+        Réponse pour un chemin relatif de la SPA (sans / initial)
+
+        Returns:
+            Le fichier demandé, index.html pour une route de la SPA, 404 pour un fichier de /assets
+            absent, ou None si le frontend n'est pas construit
+        """
+        assets = self.assets
+        asset = assets.get(path or "index.html")
+        if asset is None:
+            if path.startswith("assets/"):
+                return Response(status_code=404)
+            asset = assets.get("index.html")
+            if asset is None:
+                return None
+        return asset.response(headers)
+
+
+# Instance partagée du manifeste
+static_manifest = StaticManifest(FRONTEND_DIST_PATH)
@@ -1,30 +1,48 @@
 """
 Service pour gérer les interactions avec Supabase.
 Cette implémentation utilise le pattern Singleton pour assurer une seule instance du client.
+Les requêtes passent par un client PostgREST asynchrone (pool httpx partagé) afin de ne pas
+bloquer la boucle d'événements.
 """
 import os
-from supabase import create_client, Client
+import uuid
 from dotenv import load_dotenv
 import logging
 from datetime import datetime
 from typing import Dict, Any, List, Optional
+from services.async_supabase import get_async_client, PooledPostgrestClient, order_by, or_filter, returning
+from services.cache import content_hash
+from postgrest.exceptions import APIError
 
 # Configuration du logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Chargement des variables d'environnement
 load_dotenv()
 
-# Initialisation du client Supabase
-supabase_url = os.environ.get("SUPABASE_URL")
-supabase_key = os.environ.get("SUPABASE_KEY")
+# Similarité cosinus minimale des documents retournés par la recherche vectorielle
+DOCUMENT_MATCH_THRESHOLD = float(os.environ.get("DOCUMENT_MATCH_THRESHOLD", "0.5"))
+# Nombre maximal de documents (avec leur embedding) écrits par requête
+DOCUMENT_WRITE_PAGE_SIZE = int(os.environ.get("DOCUMENT_WRITE_PAGE_SIZE", "50"))
+# Sans match_documents_filtered: nombre de candidats lus par résultat demandé avant filtrage
+FILTER_FALLBACK_OVERFETCH = 10
+# "vector" (par défaut): embeddings seuls; "hybrid": BM25 + embeddings fusionnés (services/hybrid_search.py),
+# avec l'index lexical de toute la table documents en mémoire dans chaque worker
+DOCUMENT_SEARCH_MODE = os.environ.get("DOCUMENT_SEARCH_MODE", "vector").strip().lower()
 
-if not supabase_url or not supabase_key:
-    logger.warning("Les variables d'environnement SUPABASE_URL et SUPABASE_KEY ne sont pas définies")
-    supabase = None
-else:
-    supabase = create_client(supabase_url, supabase_key)
+# Colonne content_hash et son index unique (clé des upserts de documents), aussi dans scripts/performance_indexes.sql
+DOCUMENTS_CONTENT_HASH_SQL = '''
+    ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_hash TEXT;
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_documents_content_hash ON documents (content_hash);
+'''
+# Erreurs PostgREST/PostgreSQL d'une table documents sans colonne content_hash ou sans index unique dessus
+MISSING_COLUMN_ERRORS = {'PGRST204', '42703'}
+MISSING_CONFLICT_TARGET_ERRORS = {'42P10'}
+
+
+def document_content_hash(content, metadata) -> str:
+    """Empreinte d'un document (contenu et métadonnées), clé des écritures idempotentes"""
+    return content_hash({"content": content, "metadata": metadata or {}})
 
 
 class SupabaseService:
@@ -49,20 +67,31 @@ class SupabaseService:
             if not url or not key:
                 raise ValueError("Les variables d'environnement SUPABASE_URL et SUPABASE_KEY sont requises")
             
-            self.supabase: Client = create_client(url, key)
-            # Client avec privilèges administratifs
-            self.supabase_admin: Client = create_client(url, service_key) if service_key else None
-            logger.info("Connexion à Supabase établie avec succès")
+            self._has_service_key = bool(service_key)
+            # Écriture des documents: "upsert" sur content_hash, ou "insert" (avec ou sans empreinte)
+            # tant que scripts/performance_indexes.sql n'est pas appliqué
+            self._documents_write_mode = 'upsert'
+            logger.info("Configuration Supabase chargée (clients créés au premier appel)")
         except Exception as e:
             logger.error(f"Erreur lors de l'initialisation de Supabase: {str(e)}")
             raise
     
+    @property
+    def supabase(self) -> PooledPostgrestClient:
+        """Client partagé (pool de connexions), créé au premier appel"""
+        return get_async_client()
+    
+    @property
+    def supabase_admin(self) -> Optional[PooledPostgrestClient]:
+        """Client avec privilèges administratifs, ou None sans SUPABASE_SERVICE_KEY"""
+        return get_async_client(admin=True) if self._has_service_key else None
+    
     # Méthodes pour les tâches
     
     async def get_tasks_by_theme(self, theme: str):
         """Récupère toutes les tâches pour un thème donné"""
         try:
-            response = self.supabase.table('tasks').select('*').eq('theme', theme).execute()
+            response = await self.supabase.table('tasks').select('*').eq('theme', theme).execute()
             return response.data
         except Exception as e:
             logger.error(f"Erreur lors de la récupération des tâches pour le thème '{theme}': {str(e)}")
@@ -71,7 +100,7 @@ class SupabaseService:
     async def create_task(self, task_data):
         """Crée une nouvelle tâche dans Supabase"""
         try:
-            response = self.supabase.table('tasks').insert(task_data).execute()
+            response = await self.supabase.table('tasks').insert(task_data).execute()
             return response.data[0] if response.data else None
         except Exception as e:
             logger.error(f"Erreur lors de la création d'une tâche: {str(e)}")
@@ -80,7 +109,7 @@ class SupabaseService:
     async def update_task(self, task_id, update_data):
         """Met à jour une tâche existante"""
         try:
-            response = self.supabase.table('tasks').update(update_data).eq('id', task_id).execute()
+            response = await self.supabase.table('tasks').update(update_data).eq('id', task_id).execute()
             return response.data[0] if response.data else None
         except Exception as e:
             logger.error(f"Erreur lors de la mise à jour de la tâche {task_id}: {str(e)}")
@@ -89,7 +118,7 @@ class SupabaseService:
     async def delete_task(self, task_id):
         """Supprime une tâche"""
         try:
-            self.supabase.table('tasks').delete().eq('id', task_id).execute()
+            await self.supabase.table('tasks').delete().eq('id', task_id).execute()
             return True
         except Exception as e:
             logger.error(f"Erreur lors de la suppression de la tâche {task_id}: {str(e)}")
@@ -100,19 +129,50 @@ class SupabaseService:
     async def get_all_themes(self):
         """Récupère tous les thèmes distincts"""
         try:
-            response = self.supabase.table('tasks').select('theme').execute()
+            response = await self.supabase.table('tasks').select('theme').execute()
             themes = set([item.get('theme') for item in response.data if item.get('theme')])
             return list(themes)
         except Exception as e:
             logger.error(f"Erreur lors de la récupération des thèmes: {str(e)}")
             return []
     
+    async def get_pending_tasks_for_recommendation(self, limit=20, user_id=None):
+        """
+        Récupère les tâches non complétées les plus prioritaires, classées et limitées côté base
+        (fonction SQL pending_tasks_for_recommendation, voir scripts/performance_indexes.sql)
+
+        Args:
+            limit: Nombre maximum de tâches
+            user_id: Restreindre aux tâches d'un utilisateur (toutes si None)
+
+        Returns:
+            Liste des tâches en attente, de la plus à la moins prioritaire
+        """
+        try:
+            response = await self.supabase.rpc(
+                'pending_tasks_for_recommendation',
+                {'p_limit': limit, 'p_user_id': user_id}
+            ).execute()
+            return response.data
+        except Exception as e:
+            logger.warning(f"Fonction pending_tasks_for_recommendation indisponible, tri par deadline uniquement: {str(e)}")
+
+        try:
+            query = self.supabase.table('tasks').select('*').not_.is_('completed', 'true')
+            if user_id:
+                query = query.eq('user_id', user_id)
+            response = await order_by(query, 'deadline', 'id').limit(limit).execute()
+            return response.data
+        except Exception as e:
+            logger.error(f"Erreur lors de la récupération des tâches à recommander: {str(e)}")
+            return []
+
     # Méthodes pour les catégories
     
     async def get_user_categories(self, user_id: str):
         """Récupère les catégories d'un utilisateur spécifique"""
         try:
-            response = self.supabase.table('categories').select('*').eq('user_id', user_id).execute()
+            response = await self.supabase.table('categories').select('*').eq('user_id', user_id).execute()
             return response.data
         except Exception as e:
             logger.error(f"Erreur lors de la récupération des catégories: {str(e)}")
@@ -121,7 +181,7 @@ class SupabaseService:
     async def create_category(self, category_data):
         """Crée une nouvelle catégorie"""
         try:
-            response = self.supabase.table('categories').insert(category_data).execute()
+            response = await self.supabase.table('categories').insert(category_data).execute()
             return response.data[0] if response.data else None
         except Exception as e:
             logger.error(f"Erreur lors de la création d'une catégorie: {str(e)}")
@@ -130,7 +190,7 @@ class SupabaseService:
     async def delete_category(self, category_id):
         """Supprime une catégorie"""
         try:
-            self.supabase.table('categories').delete().eq('id', category_id).execute()
+            await self.supabase.table('categories').delete().eq('id', category_id).execute()
             return True
         except Exception as e:
             logger.error(f"Erreur lors de la suppression de la catégorie {category_id}: {str(e)}")
@@ -143,7 +203,7 @@ class SupabaseService:
         Récupère tous les agents depuis Supabase
         """
         try:
-            response = self.supabase.table('agents').select('*').execute()
+            response = await self.supabase.table('agents').select('*').execute()
             return response.data
         except Exception as e:
             logger.error(f"Erreur lors de la récupération des agents: {str(e)}")
@@ -154,7 +214,7 @@ class SupabaseService:
         Récupère un agent par son ID
         """
         try:
-            response = self.supabase.table('agents').select('*').eq('id', agent_id).execute()
+            response = await self.supabase.table('agents').select('*').eq('id', agent_id).execute()
             if response.data and len(response.data) > 0:
                 return response.data[0]
             return None
@@ -167,7 +227,7 @@ class SupabaseService:
         Crée un nouvel agent dans Supabase
         """
         try:
-            response = self.supabase.table('agents').insert(agent_data).execute()
+            response = await self.supabase.table('agents').insert(agent_data).execute()
             return response.data
         except Exception as e:
             logger.error(f"Erreur lors de la création de l'agent: {str(e)}")
@@ -176,7 +236,7 @@ class SupabaseService:
     async def update_agent(self, agent_id, update_data):
         """Met à jour un agent existant"""
         try:
-            response = self.supabase.table('agents').update(update_data).eq('id', agent_id).execute()
+            response = await self.supabase.table('agents').update(update_data).eq('id', agent_id).execute()
             return response.data[0] if response.data else None
         except Exception as e:
             logger.error(f"Erreur lors de la mise à jour de l'agent {agent_id}: {str(e)}")
@@ -185,7 +245,7 @@ class SupabaseService:
     async def delete_agent(self, agent_id):
         """Supprime un agent"""
         try:
-            self.supabase.table('agents').delete().eq('id', agent_id).execute()
+            await self.supabase.table('agents').delete().eq('id', agent_id).execute()
             return True
         except Exception as e:
             logger.error(f"Erreur lors de la suppression de l'agent {agent_id}: {str(e)}")
@@ -196,7 +256,7 @@ class SupabaseService:
     async def create_conversation(self, conversation_data):
         """Crée une nouvelle conversation"""
         try:
-            response = self.supabase.table('conversations').insert(conversation_data).execute()
+            response = await self.supabase.table('conversations').insert(conversation_data).execute()
             return response.data[0] if response.data else None
         except Exception as e:
             logger.error(f"Erreur lors de la création d'une conversation: {str(e)}")
@@ -205,7 +265,7 @@ class SupabaseService:
     async def get_conversations_by_user(self, user_id):
         """Récupère toutes les conversations d'un utilisateur"""
         try:
-            response = self.supabase.table('conversations').select('*').eq('user_id', user_id).order('created_at', desc=True).execute()
+            response = await self.supabase.table('conversations').select('*').eq('user_id', user_id).order('created_at', desc=True).execute()
             return response.data
         except Exception as e:
             logger.error(f"Erreur lors de la récupération des conversations: {str(e)}")
@@ -214,17 +274,67 @@ class SupabaseService:
     async def get_conversation_by_id(self, conversation_id):
         """Récupère une conversation par son ID"""
         try:
-            response = self.supabase.table('conversations').select('*').eq('id', conversation_id).execute()
+            response = await self.supabase.table('conversations').select('*').eq('id', conversation_id).execute()
             return response.data[0] if response.data else None
         except Exception as e:
             logger.error(f"Erreur lors de la récupération de la conversation {conversation_id}: {str(e)}")
             return None
     
+    async def get_conversation_with_agent(self, conversation_id):
+        """
+        Récupère une conversation et son agent en une seule requête (jointure PostgREST sur agent_id)
+        
+        Returns:
+            (conversation, agent), chacun pouvant être None
+        """
+        try:
+            response = await self.supabase.table('conversations').select('*, agents(*)').eq('id', conversation_id).execute()
+            if not response.data:
+                return None, None
+            conversation = response.data[0]
+            agent = conversation.pop('agents', None)
+            return conversation, agent
+        except Exception as e:
+            logger.error(f"Erreur lors de la récupération de la conversation {conversation_id} et de son agent: {str(e)}")
+            return None, None
+    
+    async def update_conversation(self, conversation_id, update_data):
+        """Met à jour une conversation (ex: résumé des échanges)"""
+        try:
+            response = await self.supabase.table('conversations').update(update_data).eq('id', conversation_id).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            logger.error(f"Erreur lors de la mise à jour de la conversation {conversation_id}: {str(e)}")
+            return None
+    
+    async def update_conversation_summary(self, conversation_id, summary, summarized_until, previous_summarized_until=None):
+        """
+        Enregistre le résumé d'une conversation seulement si summarized_until vaut toujours
+        previous_summarized_until (la valeur lue avant le calcul du résumé)
+        
+        Returns:
+            La conversation mise à jour, ou None si le résumé a été modifié entre-temps
+        """
+        try:
+            query = self.supabase.table('conversations').update({
+                "summary": summary,
+                "summarized_until": summarized_until,
+            }).eq('id', conversation_id)
+            if previous_summarized_until:
+                query = query.eq('summarized_until', previous_summarized_until)
+            else:
+                query = query.is_('summarized_until', 'null')
+            response = await query.execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            logger.error(f"Erreur lors de la mise à jour du résumé de la conversation {conversation_id}: {str(e)}")
+            return None
+    
     async def delete_conversation(self, conversation_id):
         """Supprime une conversation et tous ses messages"""
         try:
             # Supabase gèrera la suppression en cascade si définie dans la base de données
-            self.supabase.table('conversations').delete().eq('id', conversation_id).execute()
+            await self.supabase.table('conversations').delete().eq('id', conversation_id).execute()
             return True
         except Exception as e:
             logger.error(f"Erreur lors de la suppression de la conversation {conversation_id}: {str(e)}")
@@ -235,16 +345,112 @@ class SupabaseService:
     async def add_message(self, message_data):
         """Ajoute un nouveau message à une conversation"""
         try:
-            response = self.supabase.table('messages').insert(message_data).execute()
+            response = await self.supabase.table('messages').insert(message_data).execute()
             return response.data[0] if response.data else None
         except Exception as e:
             logger.error(f"Erreur lors de l'ajout d'un message: {str(e)}")
             return None
     
+    async def add_messages(self, messages_data):
+        """Ajoute plusieurs messages en une seule insertion (dans l'ordre de la liste)"""
+        try:
+            response = await self.supabase.table('messages').insert(messages_data).execute()
+            return response.data or []
+        except Exception as e:
+            logger.error(f"Erreur lors de l'ajout de {len(messages_data)} messages: {str(e)}")
+            return []
+    
+    async def get_recent_messages(self, conversation_id, limit=10):
+        """
+        Récupère les derniers messages d'une conversation (fenêtre de contexte) sans charger tout l'historique
+        
+        Args:
+            conversation_id: ID de la conversation
+            limit: Nombre maximum de messages à retourner
+        
+        Returns:
+            Les messages retenus, du plus ancien au plus récent
+        """
+        try:
+            query = self.supabase.table('messages').select('id,role,content,created_at').eq('conversation_id', conversation_id)
+            response = await order_by(query, 'created_at.desc', 'id.desc').limit(limit).execute()
+            return list(reversed(response.data))
+        except Exception as e:
+            logger.error(f"Erreur lors de la récupération des derniers messages: {str(e)}")
+            return []
+    
+    async def get_messages_to_summarize(self, conversation_id, after=None, keep_recent=10, limit=50):
+        """
+        Récupère les messages pas encore résumés qui sont sortis de la fenêtre des keep_recent derniers messages
+        
+        Args:
+            conversation_id: ID de la conversation
+            after: Date du dernier message déjà intégré au résumé (None: aucun)
+            keep_recent: Taille de la fenêtre de messages récents envoyée telle quelle au modèle
+            limit: Nombre maximum de messages à retourner
+        
+        Returns:
+            Les messages, du plus ancien au plus récent
+        """
+        try:
+            # Plus récent message hors de la fenêtre
+            query = self.supabase.table('messages').select('created_at').eq('conversation_id', conversation_id)
+            response = await order_by(query, 'created_at.desc', 'id.desc').range(keep_recent, keep_recent).execute()
+            if not response.data:
+                return []
+            cutoff = response.data[0]['created_at']
+            
+            query = self.supabase.table('messages').select('id,role,content,created_at') \
+                .eq('conversation_id', conversation_id).lte('created_at', cutoff)
+            if after:
+                query = query.gt('created_at', after)
+            response = await order_by(query, 'created_at.asc', 'id.asc').limit(limit).execute()
+            return response.data
+        except Exception as e:
+            logger.error(f"Erreur lors de la récupération des messages à résumer: {str(e)}")
+            return []
+    
+    async def get_messages_page(self, conversation_id, limit=50, cursor=None):
+        """
+        Récupère une page de messages d'une conversation, en remontant du plus récent au plus ancien
+        (pagination keyset sur created_at, id)
+        
+        Args:
+            conversation_id: ID de la conversation
+            limit: Nombre maximum de messages à retourner
+            cursor: Clés de tri {"created_at", "id"} du plus ancien message de la page précédente
+        
+        Returns:
+            Tuple (messages de la page du plus ancien au plus récent, clés de tri de la page suivante ou None)
+        """
+        try:
+            query = self.supabase.table('messages').select('*').eq('conversation_id', conversation_id)
+            
+            # Reprise avant le plus ancien message de la page précédente
+            if cursor:
+                created_at, message_id = cursor['created_at'], str(uuid.UUID(str(cursor['id'])))
+                query = or_filter(
+                    query,
+                    f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{message_id})'
+                )
+            
+            # Une ligne de plus pour savoir s'il existe une page suivante
+            response = await order_by(query, 'created_at.desc', 'id.desc').limit(limit + 1).execute()
+            messages = response.data
+            
+            next_cursor = None
+            if len(messages) > limit:
+                messages = messages[:limit]
+                next_cursor = {"created_at": messages[-1]["created_at"], "id": messages[-1]["id"]}
+            return list(reversed(messages)), next_cursor
+        except Exception as e:
+            logger.error(f"Erreur lors de la récupération d'une page de messages: {str(e)}")
+            raise
+    
     async def get_messages_by_conversation(self, conversation_id):
         """Récupère tous les messages d'une conversation"""
         try:
-            response = self.supabase.table('messages').select('*').eq('conversation_id', conversation_id).order('created_at', asc=True).execute()
+            response = await self.supabase.table('messages').select('*').eq('conversation_id', conversation_id).order('created_at').execute()
             return response.data
         except Exception as e:
             logger.error(f"Erreur lors de la récupération des messages: {str(e)}")
@@ -257,7 +463,7 @@ class SupabaseService:
         try:
             # Utiliser une commande PostgreSQL pour vérifier l'existence de la table
             query = f"SELECT to_regclass('public.{table_name}')"
-            response = self.supabase.rpc('execute_sql', {'query': query}).execute()
+            response = await self.supabase.rpc('execute_sql', {'query': query}).execute()
             
             # Si la réponse contient une valeur non nulle, la table existe
             return response.data and response.data[0] and response.data[0]['to_regclass'] is not None
@@ -281,6 +487,13 @@ class SupabaseService:
                 if not await self.check_table_exists(table):
                     missing_tables.append(table)
             
+            # Table documents antérieure aux écritures idempotentes: ajouter content_hash
+            if 'documents' not in missing_tables:
+                try:
+                    await self.supabase_admin.rpc('execute_sql', {'query': DOCUMENTS_CONTENT_HASH_SQL}).execute()
+                except Exception as e:
+                    logger.error(f"Erreur lors de l'ajout de la colonne content_hash: {str(e)}")
+            
             # Si toutes les tables existent, ne rien faire
             if not missing_tables:
                 logger.info("Toutes les tables existent déjà")
@@ -292,7 +505,7 @@ class SupabaseService:
             # Créer l'extension vector si elle n'existe pas déjà
             if 'documents' in missing_tables:
                 try:
-                    self.supabase_admin.rpc('execute_sql', {'query': 'CREATE EXTENSION IF NOT EXISTS vector;'}).execute()
+                    await self.supabase_admin.rpc('execute_sql', {'query': 'CREATE EXTENSION IF NOT EXISTS vector;'}).execute()
                     logger.info("Extension vector créée ou déjà existante")
                 except Exception as e:
                     logger.error(f"Erreur lors de la création de l'extension vector: {str(e)}")
@@ -301,23 +514,24 @@ class SupabaseService:
             # Créer les tables manquantes
             for table in missing_tables:
                 if table == 'documents':
-                    self.supabase_admin.rpc('execute_sql', {'query': '''
+                    await self.supabase_admin.rpc('execute_sql', {'query': '''
                         CREATE TABLE IF NOT EXISTS documents (
                             id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
                             content TEXT NOT NULL,
                             metadata JSONB,
                             embedding VECTOR(1536),
+                            content_hash TEXT,
                             created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
                             updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
                         );
                         
                         CREATE INDEX IF NOT EXISTS documents_embedding_idx ON documents 
                         USING ivfflat (embedding vector_cosine_ops) WITH (lists = 100);
-                    '''}).execute()
+                    ''' + DOCUMENTS_CONTENT_HASH_SQL}).execute()
                     logger.info("Table documents créée avec succès")
                 
                 elif table == 'conversation_histories':
-                    self.supabase_admin.rpc('execute_sql', {'query': '''
+                    await self.supabase_admin.rpc('execute_sql', {'query': '''
                         CREATE TABLE IF NOT EXISTS conversation_histories (
                             id TEXT PRIMARY KEY,
                             agent_id TEXT NOT NULL,
@@ -333,7 +547,7 @@ class SupabaseService:
                     logger.info("Table conversation_histories créée avec succès")
                 
                 elif table == 'weekly_strategies':
-                    self.supabase_admin.rpc('execute_sql', {'query': '''
+                    await self.supabase_admin.rpc('execute_sql', {'query': '''
                         CREATE TABLE IF NOT EXISTS weekly_strategies (
                             id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
                             user_id TEXT NOT NULL,
@@ -368,50 +582,284 @@ class SupabaseService:
             Le document stocké ou None en cas d'erreur
         """
         try:
-            response = self.supabase.table('documents').insert({
-                'content': document_data['content'],
-                'metadata': document_data['metadata'],
-                'embedding': document_data['embedding']
-            }).execute()
-            
+            stored = await self.upsert_documents_page([document_data])
             logger.info(f"Document stocké avec succès")
-            return response.data[0] if response.data else None
+            return stored[0] if stored else None
             
         except Exception as e:
             logger.error(f"Erreur lors du stockage du document: {str(e)}")
             return None
     
-    async def store_documents_batch(self, documents_data):
+    async def store_documents_batch(self, documents_data, page_size=DOCUMENT_WRITE_PAGE_SIZE):
         """
-        Stocke plusieurs documents en une seule requête
+        Stocke plusieurs documents par pages de taille bornée (une requête par page):
+        l'échec d'une page n'empêche pas l'écriture des autres
         
         Args:
             documents_data: Liste de dictionnaires document_data
+            page_size: Nombre de documents par requête
             
         Returns:
-            Liste des documents stockés ou liste vide en cas d'erreur
+            Liste des documents stockés (ceux des pages en échec sont absents)
         """
-        try:
-            # Préparer les données pour l'insertion
-            documents_to_insert = []
-            for doc in documents_data:
-                documents_to_insert.append({
-                    'content': doc['content'],
-                    'metadata': doc['metadata'],
-                    'embedding': doc['embedding']
-                })
-            
-            # Insérer tous les documents en une seule requête
-            response = self.supabase.table('documents').insert(documents_to_insert).execute()
+        stored = []
+        for start in range(0, len(documents_data), page_size):
+            page = documents_data[start:start + page_size]
+            try:
+                stored.extend(await self.upsert_documents_page(page))
+            except Exception as e:
+                logger.error(f"Erreur lors du stockage des documents {start} à {start + len(page) - 1}: {str(e)}")
+        
+        logger.info(f"{len(stored)}/{len(documents_data)} documents stockés avec succès")
+        return stored
+    
+    async def upsert_documents_page(self, documents_data):
+        """
+        Écrit une page de documents en une requête. L'écriture est idempotente: chaque document
+        est identifié par l'empreinte de son contenu et de ses métadonnées (colonne content_hash)
+        
+        Args:
+            documents_data: Liste de dictionnaires (content, metadata, embedding, content_hash optionnel)
             
-            logger.info(f"{len(documents_to_insert)} documents stockés avec succès")
-            return response.data if response.data else []
+        Returns:
+            Liste des documents écrits
+        
+        Raises:
+            Exception: Si l'écriture échoue (à l'appelant de réessayer ou d'abandonner)
+        """
+        from .vector_codec import embedding_columns
+
+        rows = [
+            {
+                'content': doc['content'],
+                'metadata': doc['metadata'],
+                **embedding_columns(doc['embedding']),
+                'content_hash': doc.get('content_hash') or document_content_hash(doc['content'], doc['metadata'])
+            }
+            for doc in documents_data
+        ]
+        if not rows:
+            return []
+        while True:
+            try:
+                response = await self._write_documents(rows)
+                break
+            except APIError as e:
+                if not self._downgrade_documents_writes(e):
+                    raise
+        documents = self._with_sent_embeddings(response.data or [], rows)
+        self._index_documents(documents)
+        return documents
+
+    async def _write_documents(self, rows):
+        """Requête d'écriture d'une page de documents selon le mode d'écriture courant"""
+        from .vector_codec import EMBEDDING_STORAGE_FORMAT
+
+        columns = 'id,content,metadata,content_hash,updated_at'
+        if self._documents_write_mode == 'upsert':
+            query = self.supabase.table('documents').upsert(rows, on_conflict='content_hash')
+        elif self._documents_write_mode == 'insert':
+            query = self.supabase.table('documents').insert(rows)
+        else:
+            rows = [{key: value for key, value in row.items() if key != 'content_hash'} for row in rows]
+            query = self.supabase.table('documents').insert(rows)
+            columns = 'id,content,metadata,updated_at'
+        if EMBEDDING_STORAGE_FORMAT != 'vector':
+            # embedding_packed est vidé par le trigger et l'embedding est déjà connu:
+            # inutile de le renvoyer en texte pgvector
+            query = returning(query, columns)
+        return await query.execute()
+
+    def _downgrade_documents_writes(self, error) -> bool:
+        """
+        Passe aux insertions simples si la table documents n'a pas la colonne content_hash ou son
+        index unique (scripts/performance_indexes.sql non appliqué)
+
+        Returns:
+            True si le mode d'écriture a changé (la page peut être réécrite), False sinon
+        """
+        mentions_content_hash = 'content_hash' in f"{error.message} {error.details} {error.hint}"
+        if (
+            error.code in MISSING_COLUMN_ERRORS and mentions_content_hash
+            and self._documents_write_mode != 'insert_without_hash'
+        ):
+            self._documents_write_mode = 'insert_without_hash'
+        elif error.code in MISSING_CONFLICT_TARGET_ERRORS and self._documents_write_mode == 'upsert':
+            self._documents_write_mode = 'insert'
+        else:
+            return False
+        logger.warning(
+            f"Table documents sans colonne ou index unique content_hash ({error.code}): écritures non "
+            f"idempotentes ({self._documents_write_mode}) jusqu'à l'application de scripts/performance_indexes.sql"
+        )
+        return True
+    
+    async def get_existing_content_hashes(self, content_hashes):
+        """
+        Retourne les empreintes déjà présentes dans la table documents
+        
+        Args:
+            content_hashes: Liste d'empreintes (document_content_hash)
             
+        Returns:
+            Ensemble des empreintes existantes
+        """
+        if not content_hashes or self._documents_write_mode == 'insert_without_hash':
+            return set()
+        response = await self.supabase.table('documents').select('content_hash').in_(
+            'content_hash', list(content_hashes)
+        ).execute()
+        return {row['content_hash'] for row in response.data}
+    
+    async def delete_documents_by_key(self, document_key):
+        """Supprime tous les chunks d'un document ingéré (métadonnée document_key)"""
+        try:
+            await self.supabase.table('documents').delete().eq('metadata->>document_key', document_key).execute()
+            return True
         except Exception as e:
-            logger.error(f"Erreur lors du stockage par lots des documents: {str(e)}")
-            return []
+            logger.error(f"Erreur lors de la suppression des chunks du document {document_key}: {str(e)}")
+            raise
     
-    async def search_documents(self, query_embedding, filters=None, limit=5):
+    async def get_document_ingestion(self, document_key):
+        """Récupère la progression de l'ingestion d'un document, ou None"""
+        try:
+            response = await self.supabase.table('document_ingestions').select('*').eq('document_key', document_key).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            logger.error(f"Erreur lors de la récupération de l'ingestion {document_key}: {str(e)}")
+            raise
+    
+    async def save_document_ingestion(self, ingestion_data):
+        """Crée ou met à jour la progression de l'ingestion d'un document (clé: document_key)"""
+        try:
+            response = await self.supabase.table('document_ingestions').upsert(
+                ingestion_data, on_conflict='document_key'
+            ).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            logger.error(f"Erreur lors de l'enregistrement de l'ingestion {ingestion_data.get('document_key')}: {str(e)}")
+            raise
+
+    async def claim_document_ingestion(self, ingestion_data):
+        """
+        Crée la progression de l'ingestion d'un document si la clé est libre
+        (INSERT ... ON CONFLICT (document_key) DO NOTHING)
+
+        Returns:
+            La progression créée, ou None si une progression existe déjà pour ce document_key
+        """
+        try:
+            response = await self.supabase.table('document_ingestions').upsert(
+                ingestion_data, on_conflict='document_key', ignore_duplicates=True
+            ).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            logger.error(f"Erreur lors de la réservation de l'ingestion {ingestion_data.get('document_key')}: {str(e)}")
+            raise
+
+    async def take_over_document_ingestion(self, document_key, expected_updated_at, ingestion_data):
+        """
+        Met à jour la progression d'une ingestion seulement si elle n'a pas changé depuis sa lecture
+        (updated_at identique): un seul des appels concurrents reprend le document
+
+        Returns:
+            La progression mise à jour, ou None si un autre appel l'a modifiée entre-temps
+        """
+        try:
+            response = await self.supabase.table('document_ingestions').update(ingestion_data).eq(
+                'document_key', document_key
+            ).eq('updated_at', expected_updated_at).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            logger.error(f"Erreur lors de la reprise de l'ingestion {document_key}: {str(e)}")
+            raise
+
+    def _with_sent_embeddings(self, documents, rows):
+        """
+        Renseigne le champ embedding des documents écrits au format compact, renvoyés sans
+        embedding: il est repris des lignes envoyées (par content_hash, sinon dans l'ordre d'envoi)
+        """
+        packed = {row['content_hash']: row['embedding_packed'] for row in rows if 'embedding_packed' in row}
+        for position, doc in enumerate(documents):
+            if 'embedding' not in doc and packed:
+                doc['embedding'] = packed.get(doc.get('content_hash'), rows[position].get('embedding_packed'))
+        return documents
+
+    def _index_documents(self, documents):
+        """Reporte les documents écrits dans les index en mémoire (vectoriel, lexical) déjà chargés"""
+        from .vector_index import vector_index
+        from .lexical_index import lexical_index
+
+        for index in (vector_index, lexical_index):
+            if not index.loaded or not documents:
+                continue
+            try:
+                index.upsert(documents)
+            except Exception as e:
+                logger.error(f"Erreur lors de la mise à jour de l'index {index.name}: {str(e)}")
+
+    def _documents_query(self, fields=None):
+        """
+        Requête de lecture des documents avec leurs clés de synchronisation (id, updated_at)
+        """
+        columns = list(fields) if fields else ['id', 'content', 'metadata', 'embedding', 'updated_at']
+        for column in ('id', 'updated_at'):
+            if column not in columns:
+                columns.append(column)
+        return self.supabase.table('documents').select(",".join(columns))
+
+    async def get_documents_page(self, limit=1000, cursor=None, fields=None):
+        """
+        Récupère une page de documents triés par date de mise à jour croissante (pagination keyset
+        sur updated_at, id), pour charger puis synchroniser l'index vectoriel local
+
+        Args:
+            limit: Nombre maximum de documents à retourner
+            cursor: Clés de tri {"updated_at", "id"} du dernier document déjà lu
+            fields: Liste des colonnes à retourner (toutes si None)
+
+        Returns:
+            Tuple (liste des documents, clés de tri de la page suivante ou None)
+        """
+        try:
+            query = self._documents_query(fields)
+
+            # Reprise après le dernier document lu
+            if cursor:
+                updated_at, document_id = cursor['updated_at'], str(uuid.UUID(str(cursor['id'])))
+                query = or_filter(
+                    query,
+                    f'updated_at.gt."{updated_at}",and(updated_at.eq."{updated_at}",id.gt.{document_id})'
+                )
+
+            response = await order_by(query, 'updated_at.asc', 'id.asc').limit(limit).execute()
+            documents = response.data
+
+            next_cursor = cursor
+            if documents:
+                next_cursor = {"updated_at": documents[-1]["updated_at"], "id": documents[-1]["id"]}
+            return documents, next_cursor
+        except Exception as e:
+            logger.error(f"Erreur lors de la récupération d'une page de documents: {str(e)}")
+            raise
+
+    async def get_documents_by_ids(self, document_ids, fields=None):
+        """
+        Récupère des documents par identifiant (mêmes colonnes que get_documents_page)
+
+        Args:
+            document_ids: Identifiants des documents
+            fields: Liste des colonnes à retourner (toutes si None)
+        """
+        try:
+            query = self._documents_query(fields)
+            response = await query.in_('id', [str(document_id) for document_id in document_ids]).execute()
+            return response.data
+        except Exception as e:
+            logger.error(f"Erreur lors de la récupération de {len(document_ids)} documents: {str(e)}")
+            raise
+
+    async def search_documents(self, query_embedding, filters=None, limit=5, match_threshold=None):
         """
         Recherche des documents similaires à un embedding de requête
         
@@ -419,33 +867,42 @@ class SupabaseService:
             query_embedding: Vecteur d'embedding pour la recherche
             filters: Dictionnaire de filtres à appliquer sur les métadonnées
             limit: Nombre maximum de résultats à retourner
+            match_threshold: Similarité minimale (DOCUMENT_MATCH_THRESHOLD si None)
             
         Returns:
             Liste des documents similaires
+            
+        Raises:
+            ValueError: Si un filtre n'est pas une valeur scalaire ou une liste de valeurs scalaires
         """
+        from .vector_index import vector_index
+        from .document_index import metadata_filter_values
+
+        metadata_filter_values(filters)
+        if match_threshold is None:
+            match_threshold = DOCUMENT_MATCH_THRESHOLD
+
+        # Index local en mémoire si activé (repli sur le RPC en cas d'erreur)
+        if vector_index.enabled:
+            try:
+                results = await vector_index.query(query_embedding, filters, limit, match_threshold=match_threshold)
+                logger.info(f"Recherche de documents similaires (index local) réussie: {len(results)} résultats")
+                return results
+            except Exception as e:
+                logger.error(f"Erreur de l'index vectoriel local, repli sur match_documents: {str(e)}")
+
+        if filters:
+            return await self._search_documents_filtered(query_embedding, filters, limit, match_threshold)
+
         try:
-            # Construire la requête de base
-            match_query = self.supabase.rpc(
+            response = await self.supabase.rpc(
                 'match_documents',
                 {
                     'query_embedding': query_embedding,
-                    'match_threshold': 0.5,
+                    'match_threshold': match_threshold,
                     'match_count': limit
                 }
-            )
-            
-            # Appliquer les filtres si fournis
-            if filters and isinstance(filters, dict):
-                for key, value in filters.items():
-                    if isinstance(value, list):
-                        # Pour les listes, utiliser l'opérateur @> (contains)
-                        match_query = match_query.filter(f"metadata->>'{key}'", "in", value)
-                    else:
-                        # Pour les valeurs simples
-                        match_query = match_query.filter(f"metadata->>'{key}'", "eq", value)
-            
-            # Exécuter la requête
-            response = match_query.execute()
+            ).execute()
             
             logger.info(f"Recherche de documents similaires réussie: {len(response.data)} résultats")
             return response.data
@@ -453,10 +910,60 @@ class SupabaseService:
         except Exception as e:
             logger.error(f"Erreur lors de la recherche de documents similaires: {str(e)}")
             return []
+
+    async def _search_documents_filtered(self, query_embedding, filters, limit, match_threshold):
+        """
+        Recherche par similarité parmi les documents dont les métadonnées satisfont les filtres.
+        Les filtres sont appliqués dans la base avant le classement (fonction SQL
+        match_documents_filtered, voir scripts/performance_indexes.sql): la valeur texte de la
+        métadonnée (metadata->>'clé') est comparée à la valeur, ou à chaque valeur d'une liste.
+        """
+        from .document_index import metadata_filter_values
+
+        accepted = metadata_filter_values(filters)
+        if any(not values for values in accepted.values()):
+            return []
+
+        try:
+            response = await self.supabase.rpc(
+                'match_documents_filtered',
+                {
+                    'query_embedding': query_embedding,
+                    'match_threshold': match_threshold,
+                    'match_count': limit,
+                    'filter': accepted
+                }
+            ).execute()
+            logger.info(f"Recherche filtrée de documents similaires réussie: {len(response.data)} résultats")
+            return response.data
+        except Exception as e:
+            logger.warning(f"Fonction match_documents_filtered indisponible, filtrage après match_documents: {str(e)}")
+
+        # Repli: sur-échantillonner les documents les plus proches puis filtrer (résultats possiblement incomplets)
+        try:
+            from .document_index import metadata_text
+
+            response = await self.supabase.rpc(
+                'match_documents',
+                {
+                    'query_embedding': query_embedding,
+                    'match_threshold': match_threshold,
+                    'match_count': limit * FILTER_FALLBACK_OVERFETCH
+                }
+            ).execute()
+            documents = [
+                doc for doc in response.data
+                if all(metadata_text((doc.get('metadata') or {}).get(key)) in values for key, values in accepted.items())
+            ]
+            return documents[:limit]
+        except Exception as e:
+            logger.error(f"Erreur lors de la recherche de documents similaires: {str(e)}")
+            return []
     
     async def search_documents_by_text(self, query_text, filters=None, limit=5):
         """
-        Recherche des documents similaires à une requête textuelle
+        Recherche des documents pertinents pour une requête textuelle
+        (recherche hybride lexicale et vectorielle, ou vectorielle seule selon DOCUMENT_SEARCH_MODE)
         
         Args:
             query_text: Texte de la requête
@@ -465,12 +972,24 @@ class SupabaseService:
             
         Returns:
             Liste des documents similaires
+            
+        Raises:
+            ValueError: Si un filtre n'est pas une valeur scalaire ou une liste de valeurs scalaires
         """
+        from .document_index import metadata_filter_values
+
+        metadata_filter_values(filters)
         try:
+            if DOCUMENT_SEARCH_MODE == "hybrid":
+                from .hybrid_search import hybrid_retriever
+                return await hybrid_retriever.search(query_text, filters, limit)
+
             from .embedding_service import embedding_service
             
             # Générer l'embedding pour la requête
-            query_embedding = embedding_service.get_embedding(query_text)
+            query_embedding = (await embedding_service.get_embeddings([query_text]))[0]
+            if query_embedding is None:
+                return []
             
             # Utiliser la méthode de recherche par embedding
             return await self.search_documents(query_embedding, filters, limit)
@@ -498,11 +1017,11 @@ class SupabaseService:
             conversation_id = f"{agent_id}_{user_id}"
             
             # Vérifier si la conversation existe déjà
-            response = self.supabase.table('conversation_histories').select('*').eq('id', conversation_id).execute()
+            response = await self.supabase.table('conversation_histories').select('*').eq('id', conversation_id).execute()
             
             if response.data and len(response.data) > 0:
                 # Mettre à jour la conversation existante
-                response = self.supabase.table('conversation_histories').update({
+                response = await self.supabase.table('conversation_histories').update({
                     'messages': messages,
                     'updated_at': datetime.now().isoformat()
                 }).eq('id', conversation_id).execute()
@@ -510,7 +1029,7 @@ class SupabaseService:
                 logger.info(f"Historique de conversation mis à jour: {conversation_id}")
             else:
                 # Créer une nouvelle entrée
-                response = self.supabase.table('conversation_histories').insert({
+                response = await self.supabase.table('conversation_histories').insert({
                     'id': conversation_id,
                     'agent_id': agent_id,
                     'user_id': user_id,
@@ -541,7 +1060,7 @@ class SupabaseService:
             conversation_id = f"{agent_id}_{user_id}"
             
             # Récupérer la conversation
-            response = self.supabase.table('conversation_histories').select('*').eq('id', conversation_id).execute()
+            response = await self.supabase.table('conversation_histories').select('*').eq('id', conversation_id).execute()
             
             if response.data and len(response.data) > 0:
                 logger.info(f"Historique de conversation récupéré: {conversation_id}")
@@ -578,7 +1097,7 @@ class SupabaseService:
                 strategy_data['platform'] = 'linkedin'
             
             # Insérer la stratégie
-            response = self.supabase.table('weekly_strategies').insert(strategy_data).execute()
+            response = await self.supabase.table('weekly_strategies').insert(strategy_data).execute()
             
             logger.info(f"Stratégie hebdomadaire stockée avec succès pour la semaine {strategy_data['week_number']}")
             return response.data[0] if response.data else None
@@ -617,7 +1136,7 @@ class SupabaseService:
                 .eq('platform', platform)
             
             # Exécuter la requête
-            response = query.execute()
+            response = await query.execute()
             
             if response.data and len(response.data) > 0:
                 logger.info(f"Stratégie hebdomadaire récupérée pour la semaine {week_number}")
@@ -635,16 +1154,70 @@ class SupabaseService:
     async def get_all_tasks(self):
         """Récupère toutes les tâches sans filtrer par thème"""
         try:
-            response = self.supabase.table('tasks').select('*').order('created_at', desc=True).execute()
+            response = await self.supabase.table('tasks').select('*').order('created_at', desc=True).execute()
             return response.data
         except Exception as e:
             logger.error(f"Erreur lors de la récupération de toutes les tâches: {str(e)}")
             return []
 
+    async def get_tasks_page(self, limit=100, cursor=None, fields=None, filters=None):
+        """
+        Récupère une page de tâches triées par date de création décroissante (pagination keyset)
+
+        Args:
+            limit: Nombre maximum de tâches à retourner
+            cursor: Clés de tri {"created_at", "id"} de la dernière tâche de la page précédente
+            fields: Liste des colonnes à retourner (toutes si None)
+            filters: Filtres optionnels (user_id, completed, theme, category, eisenhower,
+                     deadline_from, deadline_to)
+
+        Returns:
+            Tuple (liste des tâches, clés de tri de la page suivante ou None)
+
+        Raises:
+            Exception: Si la lecture échoue (une page vide signifierait à tort la fin de la liste)
+        """
+        try:
+            filters = filters or {}
+            query = self.supabase.table('tasks').select(",".join(fields) if fields else '*')
+
+            # Filtres appliqués côté base de données
+            for column in ('user_id', 'theme', 'category', 'eisenhower'):
+                if filters.get(column) is not None:
+                    query = query.eq(column, filters[column])
+            if filters.get('completed') is not None:
+                query = query.eq('completed', 'true' if filters['completed'] else 'false')
+            if filters.get('deadline_from'):
+                query = query.gte('deadline', filters['deadline_from'])
+            if filters.get('deadline_to'):
+                query = query.lte('deadline', filters['deadline_to'])
+
+            # Reprise après la dernière ligne de la page précédente
+            if cursor:
+                created_at, task_id = cursor['created_at'], cursor['id']
+                query = or_filter(
+                    query,
+                    f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{task_id})'
+                )
+
+            # Une ligne de plus pour savoir s'il existe une page suivante
+            query = order_by(query, 'created_at.desc', 'id.desc')
+            response = await query.limit(limit + 1).execute()
+            tasks = response.data
+
+            next_cursor = None
+            if len(tasks) > limit:
+                tasks = tasks[:limit]
+                next_cursor = {"created_at": tasks[-1]["created_at"], "id": tasks[-1]["id"]}
+            return tasks, next_cursor
+        except Exception as e:
+            logger.error(f"Erreur lors de la récupération d'une page de tâches: {str(e)}")
+            raise
+
     async def get_task_by_id(self, task_id):
         """Récupère une tâche par son ID"""
         try:
-            response = self.supabase.table('tasks').select('*').eq('id', task_id).execute()
+            response = await self.supabase.table('tasks').select('*').eq('id', task_id).execute()
             return response.data[0] if response.data else None
         except Exception as e:
             logger.error(f"Erreur lors de la récupération de la tâche {task_id}: {str(e)}")
@@ -653,7 +1226,7 @@ class SupabaseService:
     async def update_task_by_id(self, task_id, update_data):
         """Met à jour une tâche existante par son ID"""
         try:
-            response = self.supabase.table('tasks').update(update_data).eq('id', task_id).execute()
+            response = await self.supabase.table('tasks').update(update_data).eq('id', task_id).execute()
             return response.data[0] if response.data else None
         except Exception as e:
             logger.error(f"Erreur lors de la mise à jour de la tâche {task_id}: {str(e)}")
@@ -662,7 +1235,7 @@ class SupabaseService:
     async def delete_task_by_id(self, task_id):
         """Supprime une tâche par son ID"""
         try:
-            self.supabase.table('tasks').delete().eq('id', task_id).execute()
+            await self.supabase.table('tasks').delete().eq('id', task_id).execute()
             return True
         except Exception as e:
             logger.error(f"Erreur lors de la suppression de la tâche {task_id}: {str(e)}")
@@ -671,10 +1244,7 @@ class SupabaseService:
     async def get_user_habits(self, user_id: str) -> List[Dict[str, Any]]:
         """Récupère toutes les habitudes d'un utilisateur"""
         try:
-            if not supabase:
-                raise Exception("Supabase n'est pas configuré")
-            
-            response = supabase.table('habits').select('*').eq('user_id', user_id).execute()
+            response = await self.supabase.table('habits').select('*').eq('user_id', user_id).execute()
             return response.data
         except Exception as e:
             logger.error(f"Erreur lors de la récupération des habitudes: {str(e)}")
@@ -683,10 +1253,7 @@ class SupabaseService:
     async def get_habit_by_id(self, habit_id: int) -> Optional[Dict[str, Any]]:
         """Récupère une habitude par son ID"""
         try:
-            if not supabase:
-                raise Exception("Supabase n'est pas configuré")
-            
-            response = supabase.table('habits').select('*').eq('id', habit_id).execute()
+            response = await self.supabase.table('habits').select('*').eq('id', habit_id).execute()
             return response.data[0] if response.data else None
         except Exception as e:
             logger.error(f"Erreur lors de la récupération de l'habitude {habit_id}: {str(e)}")
@@ -695,10 +1262,7 @@ class SupabaseService:
     async def add_habit(self, habit_data: Dict[str, Any]) -> Dict[str, Any]:
         """Ajoute une nouvelle habitude"""
         try:
-            if not supabase:
-                raise Exception("Supabase n'est pas configuré")
-            
-            response = supabase.table('habits').insert(habit_data).execute()
+            response = await self.supabase.table('habits').insert(habit_data).execute()
             return response.data[0] if response.data else None
         except Exception as e:
             logger.error(f"Erreur lors de l'ajout de l'habitude: {str(e)}")
@@ -707,26 +1271,44 @@ class SupabaseService:
     async def update_habit(self, habit_id: int, habit_data: Dict[str, Any]) -> Dict[str, Any]:
         """Met à jour une habitude existante"""
         try:
-            if not supabase:
-                raise Exception("Supabase n'est pas configuré")
-            
-            response = supabase.table('habits').update(habit_data).eq('id', habit_id).execute()
+            response = await self.supabase.table('habits').update(habit_data).eq('id', habit_id).execute()
             return response.data[0] if response.data else None
         except Exception as e:
             logger.error(f"Erreur lors de la mise à jour de l'habitude {habit_id}: {str(e)}")
             raise
     
+    async def update_habit_streak(
+        self,
+        habit_id: int,
+        streak_state: Dict[str, Any],
+        previous_state: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Écrit le nouvel état de streak d'une habitude si l'état stocké est toujours previous_state
+        (mise à jour conditionnelle: deux complétions simultanées ne s'écrasent pas)
+
+        Returns:
+            La ligne mise à jour, ou None si l'état a été modifié entre-temps
+        """
+        try:
+            query = self.supabase.table('habits').update(streak_state).eq('id', habit_id)
+            for column in ('last_completion_date', 'completion_count'):
+                value = previous_state.get(column)
+                query = query.is_(column, 'null') if value is None else query.eq(column, value)
+            response = await query.execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            logger.error(f"Erreur lors de la mise à jour du streak de l'habitude {habit_id}: {str(e)}")
+            raise
+    
     async def delete_habit(self, habit_id: int) -> bool:
         """Supprime une habitude"""
         try:
-            if not supabase:
-                raise Exception("Supabase n'est pas configuré")
-            
             # Supprimer d'abord les complétions associées
             await self.delete_habit_completions(habit_id)
             
             # Puis supprimer l'habitude
-            response = supabase.table('habits').delete().eq('id', habit_id).execute()
+            response = await self.supabase.table('habits').delete().eq('id', habit_id).execute()
             return len(response.data) > 0
         except Exception as e:
             logger.error(f"Erreur lors de la suppression de l'habitude {habit_id}: {str(e)}")
@@ -735,22 +1317,50 @@ class SupabaseService:
     async def get_habit_completions(self, habit_id: int) -> List[Dict[str, Any]]:
         """Récupère toutes les complétions d'une habitude"""
         try:
-            if not supabase:
-                raise Exception("Supabase n'est pas configuré")
-            
-            response = supabase.table('habit_completions').select('*').eq('habit_id', habit_id).execute()
+            response = await self.supabase.table('habit_completions').select('*').eq('habit_id', habit_id).execute()
             return response.data
         except Exception as e:
             logger.error(f"Erreur lors de la récupération des complétions pour l'habitude {habit_id}: {str(e)}")
             raise
     
+    async def get_completions_for_habits(
+        self,
+        habit_ids: List[int],
+        since: Optional[datetime] = None,
+        page_size: int = 1000
+    ) -> List[Dict[str, Any]]:
+        """
+        Récupère en une requête (paginée) les complétions de plusieurs habitudes
+
+        Args:
+            habit_ids: IDs des habitudes
+            since: Ne charger que les complétions à partir de cette date
+            page_size: Taille des pages (PostgREST limite le nombre de lignes par réponse)
+
+        Returns:
+            Liste des complétions ({"habit_id", "completion_date"})
+        """
+        if not habit_ids:
+            return []
+        try:
+            completions = []
+            while True:
+                query = self.supabase.table('habit_completions').select('habit_id,completion_date').in_('habit_id', habit_ids)
+                if since:
+                    query = query.gte('completion_date', since.isoformat())
+                query = order_by(query, 'habit_id', 'completion_date', 'id')
+                response = await query.range(len(completions), len(completions) + page_size - 1).execute()
+                completions.extend(response.data)
+                if len(response.data) < page_size:
+                    return completions
+        except Exception as e:
+            logger.error(f"Erreur lors de la récupération des complétions des habitudes {habit_ids}: {str(e)}")
+            raise
+
     async def add_habit_completion(self, completion_data: Dict[str, Any]) -> Dict[str, Any]:
         """Ajoute une nouvelle complétion d'habitude"""
         try:
-            if not supabase:
-                raise Exception("Supabase n'est pas configuré")
-            
-            response = supabase.table('habit_completions').insert(completion_data).execute()
+            response = await self.supabase.table('habit_completions').insert(completion_data).execute()
             return response.data[0] if response.data else None
         except Exception as e:
             logger.error(f"Erreur lors de l'ajout de la complétion: {str(e)}")
@@ -759,10 +1369,7 @@ class SupabaseService:
     async def delete_habit_completions(self, habit_id: int) -> bool:
         """Supprime toutes les complétions d'une habitude"""
         try:
-            if not supabase:
-                raise Exception("Supabase n'est pas configuré")
-            
-            response = supabase.table('habit_completions').delete().eq('habit_id', habit_id).execute()
+            response = await self.supabase.table('habit_completions').delete().eq('habit_id', habit_id).execute()
             return len(response.data) > 0
         except Exception as e:
             logger.error(f"Erreur lors de la suppression des complétions pour l'habitude {habit_id}: {str(e)}")
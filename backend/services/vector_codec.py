@@ -0,0 +1,71 @@
+"""
+Encodage compact des embeddings échangés avec la table documents.
+
+Par défaut (EMBEDDING_STORAGE_FORMAT=vector), un embedding est transmis sous forme de liste JSON
+de floats (environ 20 Ko pour 1536 dimensions). Les formats compacts transmettent une chaîne
+base64 dans la colonne embedding_packed, décodée côté base par un trigger qui remplit la colonne
+embedding puis vide embedding_packed (voir scripts/performance_indexes.sql): seul le VECTOR est
+stocké, et la recherche est inchangée.
+- "float16": "f16:<base64>" (demi-précision, 2 octets par dimension, ~4 Ko);
+- "int8": "i8:<échelle>:<base64>" (quantification symétrique, 1 octet par dimension, ~2 Ko).
+Les lectures renvoient le texte pgvector "[...]"; decode_embedding accepte indifféremment ce texte,
+les chaînes compactes ou une liste.
+"""
+import os
+import json
+import base64
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+
+EMBEDDING_STORAGE_FORMATS = ("vector", "float16", "int8")
+EMBEDDING_STORAGE_FORMAT = os.environ.get("EMBEDDING_STORAGE_FORMAT", "vector").strip().lower()
+if EMBEDDING_STORAGE_FORMAT not in EMBEDDING_STORAGE_FORMATS:
+    raise ValueError(
+        f"EMBEDDING_STORAGE_FORMAT invalide: {EMBEDDING_STORAGE_FORMAT} (valeurs possibles: {', '.join(EMBEDDING_STORAGE_FORMATS)})"
+    )
+
+FLOAT16_PREFIX = "f16:"
+INT8_PREFIX = "i8:"
+
+
+def encode_embedding(embedding, storage_format: str) -> str:
+    """
+    Encode un embedding en chaîne compacte
+
+    Args:
+        embedding: Liste ou tableau de floats
+        storage_format: "float16" ou "int8"
+
+    Returns:
+        La chaîne encodée (préfixée par son format)
+    """
+    vector = np.asarray(embedding, dtype=np.float32)
+    if storage_format == "float16":
+        return FLOAT16_PREFIX + base64.b64encode(vector.astype("<f2").tobytes()).decode("ascii")
+    if storage_format == "int8":
+        scale = float(np.abs(vector).max()) / 127.0 or 1.0
+        codes = np.clip(np.rint(vector / scale), -127, 127).astype(np.int8)
+        return f"{INT8_PREFIX}{scale!r}:" + base64.b64encode(codes.tobytes()).decode("ascii")
+    raise ValueError(f"Format d'embedding compact inconnu: {storage_format}")
+
+
+def decode_embedding(value: Union[str, List[float], np.ndarray]) -> np.ndarray:
+    """Décode un embedding (chaîne compacte, texte pgvector ou liste) en float32"""
+    if isinstance(value, str):
+        if value.startswith(FLOAT16_PREFIX):
+            return np.frombuffer(base64.b64decode(value[len(FLOAT16_PREFIX):]), dtype="<f2").astype(np.float32)
+        if value.startswith(INT8_PREFIX):
+            scale, payload = value[len(INT8_PREFIX):].split(":", 1)
+            codes = np.frombuffer(base64.b64decode(payload), dtype=np.int8)
+            return codes.astype(np.float32) * np.float32(scale)
+        return np.array(json.loads(value), dtype=np.float32)
+    return np.asarray(value, dtype=np.float32)
+
+
+def embedding_columns(embedding, storage_format: Optional[str] = None) -> Dict[str, Any]:
+    """Colonnes à écrire dans la table documents pour un embedding, selon le format de stockage (EMBEDDING_STORAGE_FORMAT si None)"""
+    storage_format = storage_format or EMBEDDING_STORAGE_FORMAT
+    if storage_format == "vector":
+        return {"embedding": embedding.tolist() if isinstance(embedding, np.ndarray) else embedding}
+    return {"embedding_packed": encode_embedding(embedding, storage_format)}
@@ -0,0 +1,326 @@
+"""
+Index vectoriel local (en mémoire) des documents, alternative au RPC match_documents.
+
+Activé avec VECTOR_INDEX_BACKEND=local. L'index est chargé depuis la table documents au démarrage
+du worker puis synchronisé avec elle en tâche de fond (voir services/document_index.py). Les écritures faites par ce
+processus (store_document, store_documents_batch) y sont reportées immédiatement.
+
+Deux représentations selon la taille du corpus:
+- exacte (flat): matrice float32 normalisée, recherche par produit matriciel;
+- IVF int8 (à partir de VECTOR_INDEX_IVF_MIN_DOCUMENTS): vecteurs quantifiés en int8 (4x moins
+  de mémoire) et répartis en listes par k-means; une recherche ne parcourt que les
+  VECTOR_INDEX_NPROBE listes les plus proches de la requête.
+
+Les filtres sur les métadonnées sont appliqués avant le classement (index inversé clé/valeur).
+Un filtre très sélectif est évalué exactement sur les seuls documents retenus.
+"""
+import os
+import time
+import logging
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from services.document_index import DocumentIndex, ensure_capacity
+from services.vector_codec import decode_embedding
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# "rpc" (par défaut): match_documents; "local": index en mémoire, avec repli sur le RPC
+VECTOR_INDEX_BACKEND = os.environ.get("VECTOR_INDEX_BACKEND", "rpc").strip().lower()
+# Taille du corpus à partir de laquelle l'index passe en IVF int8
+IVF_MIN_DOCUMENTS = int(os.environ.get("VECTOR_INDEX_IVF_MIN_DOCUMENTS", "20000"))
+# Nombre de listes IVF parcourues par recherche
+IVF_NPROBE = int(os.environ.get("VECTOR_INDEX_NPROBE", "16"))
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_PER_LIST = 40
+# En dessous de ce nombre de documents retenus par les filtres, recherche exacte sur ces documents
+FILTER_EXACT_SCAN_MAX = 5000
+
+
+def parse_embedding(value) -> np.ndarray:
+    """Convertit un embedding renvoyé par PostgREST (texte pgvector "[...]", forme compacte ou liste) en float32"""
+    return decode_embedding(value)
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """Normalise des vecteurs (lignes) pour que le produit scalaire soit la similarité cosinus"""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def quantize(vectors: np.ndarray):
+    """Quantification int8 symétrique, avec une échelle par vecteur"""
+    scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def train_centroids(vectors: np.ndarray, n_lists: int, seed: int = 0) -> np.ndarray:
+    """k-means sphérique (vecteurs normalisés) sur un échantillon du corpus"""
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), n_lists * KMEANS_SAMPLE_PER_LIST)
+    sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+    centroids = sample[rng.choice(sample_size, n_lists, replace=False)].copy()
+
+    for _ in range(KMEANS_ITERATIONS):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        counts = np.bincount(assignment, minlength=n_lists)
+        # Les listes vides sont réinitialisées sur des points de l'échantillon
+        empty = np.flatnonzero(counts == 0)
+        sums[empty] = sample[rng.choice(sample_size, len(empty), replace=False)]
+        centroids = normalize(sums)
+    return centroids.astype(np.float32)
+
+
+def assign_lists(vectors: np.ndarray, centroids: np.ndarray, batch_size: int = 8192) -> np.ndarray:
+    """Liste IVF (centroïde le plus proche) de chaque vecteur"""
+    assignment = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), batch_size):
+        assignment[start:start + batch_size] = np.argmax(vectors[start:start + batch_size] @ centroids.T, axis=1)
+    return assignment
+
+
+class LocalVectorIndex(DocumentIndex):
+    """
+    Index vectoriel en mémoire des documents.
+    Les lignes supprimées sont marquées mortes puis compactées lors des reconstructions.
+    """
+
+    name = "vectoriel local"
+    FIELDS = ['id', 'content', 'metadata', 'embedding']
+
+    def __init__(self, ivf_min_documents: int = IVF_MIN_DOCUMENTS, nprobe: int = IVF_NPROBE):
+        self.ivf_min_documents = ivf_min_documents
+        self.nprobe = nprobe
+        super().__init__()
+        self._reset()
+
+    def _reset(self, dimension: Optional[int] = None):
+        self._reset_documents()
+        self.dimension = dimension
+        self.mode = "flat"
+        self.alive = np.zeros(0, dtype=bool)
+        # Représentation exacte
+        self.vectors = np.zeros((0, dimension or 0), dtype=np.float32)
+        # Représentation IVF int8
+        self.codes = np.zeros((0, dimension or 0), dtype=np.int8)
+        self.scales = np.zeros(0, dtype=np.float32)
+        self.assignment = np.zeros(0, dtype=np.int32)
+        self.centroids: Optional[np.ndarray] = None
+        self._trained_size = 0
+
+    # Construction et mises à jour
+
+    def build(self, documents: List[Dict[str, Any]]):
+        """Reconstruit l'index à partir d'une liste de documents (id, content, metadata, embedding)"""
+        vectors = [parse_embedding(doc["embedding"]) for doc in documents if doc.get("embedding") is not None]
+        self._reset(len(vectors[0]) if vectors else self.dimension)
+        if not vectors:
+            return
+        documents = [doc for doc in documents if doc.get("embedding") is not None]
+        matrix = normalize(np.vstack(vectors).astype(np.float32))
+
+        for row, doc in enumerate(documents):
+            self._set_row_fields(row, doc)
+        self.size = len(documents)
+        self.alive = np.ones(self.size, dtype=bool)
+
+        if self.size >= self.ivf_min_documents:
+            self._train(matrix)
+        else:
+            self.vectors = matrix
+
+    def upsert(self, documents: List[Dict[str, Any]]):
+        """Ajoute ou remplace des documents (une ligne vivante par identifiant)"""
+        documents = [doc for doc in documents if doc.get("embedding") is not None]
+        if not documents:
+            return
+        matrix = normalize(np.vstack([parse_embedding(doc["embedding"]) for doc in documents]))
+        if self.dimension is None:
+            self._reset(matrix.shape[1])
+        if matrix.shape[1] != self.dimension:
+            raise ValueError(f"Dimension d'embedding inattendue: {matrix.shape[1]} (index: {self.dimension})")
+
+        rows = []
+        for doc in documents:
+            doc_id = str(doc["id"])
+            if doc_id in self.rows:
+                row = self.rows[doc_id]
+                self._unindex_metadata(row)
+            else:
+                row = self.size
+                self.size += 1
+            self._set_row_fields(row, doc)
+            rows.append(row)
+
+        rows = np.array(rows, dtype=np.int64)
+        self.alive = ensure_capacity(self.alive, self.size)
+        self.alive[rows] = True
+        if self.mode == "flat":
+            self.vectors = ensure_capacity(self.vectors, self.size)
+            self.vectors[rows] = matrix
+        else:
+            self._store_quantized(rows, matrix)
+        self._maybe_rebuild()
+
+    def remove(self, document_ids):
+        """Retire des documents de l'index"""
+        for doc_id in document_ids:
+            row = self._release_row(doc_id)
+            if row is not None:
+                self.alive[row] = False
+        self._maybe_rebuild()
+
+    def _store_quantized(self, rows: np.ndarray, matrix: np.ndarray):
+        codes, scales = quantize(matrix)
+        self.codes = ensure_capacity(self.codes, self.size)
+        self.scales = ensure_capacity(self.scales, self.size)
+        self.assignment = ensure_capacity(self.assignment, self.size)
+        self.codes[rows] = codes
+        self.scales[rows] = scales
+        self.assignment[rows] = assign_lists(matrix, self.centroids)
+
+    def _train(self, matrix: np.ndarray):
+        """Passe en IVF int8: entraîne les centroïdes et quantifie les vecteurs (lignes 0..size)"""
+        live = np.flatnonzero(self.alive[:self.size])
+        n_lists = max(16, int(np.sqrt(len(live))))
+        self.centroids = train_centroids(matrix[live], min(n_lists, len(live)))
+        self.mode = "ivf"
+        self._trained_size = len(live)
+        self.codes = np.zeros((self.size, self.dimension), dtype=np.int8)
+        self.scales = np.zeros(self.size, dtype=np.float32)
+        self.assignment = np.zeros(self.size, dtype=np.int32)
+        self._store_quantized(np.arange(self.size), matrix[:self.size])
+        self.vectors = np.zeros((0, self.dimension), dtype=np.float32)
+
+    def _dense_vectors(self) -> np.ndarray:
+        """Vecteurs float32 des lignes 0..size (déquantifiés en IVF)"""
+        if self.mode == "flat":
+            return self.vectors[:self.size]
+        return normalize(self.codes[:self.size].astype(np.float32) * self.scales[:self.size, None])
+
+    def _maybe_rebuild(self):
+        """Compacte l'index, change de représentation ou réentraîne les listes IVF si nécessaire"""
+        live_count = len(self.rows)
+        dead_count = self.size - live_count
+        needs_ivf = self.mode == "flat" and live_count >= self.ivf_min_documents
+        needs_flat = self.mode == "ivf" and live_count < self.ivf_min_documents // 2
+        needs_retrain = self.mode == "ivf" and live_count > 4 * self._trained_size
+        needs_compaction = dead_count > max(1024, self.size // 4)
+        if not (needs_ivf or needs_flat or needs_retrain or needs_compaction):
+            return
+
+        started = time.perf_counter()
+        live = np.flatnonzero(self.alive[:self.size])
+        matrix = self._dense_vectors()[live]
+        documents = [
+            {"id": self.ids[row], "content": self.contents[row], "metadata": self.metadata[row]}
+            for row in live.tolist()
+        ]
+        previous_mode, previous_centroids, previous_trained = self.mode, self.centroids, self._trained_size
+
+        self._reset(self.dimension)
+        for row, doc in enumerate(documents):
+            self._set_row_fields(row, doc)
+        self.size = len(documents)
+        self.alive = np.ones(self.size, dtype=bool)
+
+        if (previous_mode == "ivf" and not needs_flat) or needs_ivf:
+            if previous_mode == "ivf" and not needs_retrain:
+                # Simple compaction: les centroïdes restent valables
+                self.mode, self.centroids, self._trained_size = "ivf", previous_centroids, previous_trained
+                self._store_quantized(np.arange(self.size), matrix)
+            else:
+                self._train(matrix)
+        else:
+            self.vectors = matrix
+        logger.info(
+            f"Index vectoriel local reconstruit ({self.mode}, {self.size} documents) "
+            f"en {(time.perf_counter() - started) * 1000:.0f} ms"
+        )
+
+    # Recherche
+
+    def _score(self, rows: np.ndarray, query: np.ndarray) -> np.ndarray:
+        if self.mode == "flat":
+            return self.vectors[rows] @ query
+        return (self.codes[rows].astype(np.float32) @ query) * self.scales[rows]
+
+    def search(
+        self,
+        query_embedding,
+        limit: int = 5,
+        filters: Optional[Dict[str, Any]] = None,
+        match_threshold: float = 0.0,
+    ) -> List[Dict[str, Any]]:
+        """
+        Recherche les documents les plus similaires à un embedding
+
+        Args:
+            query_embedding: Embedding de la requête
+            limit: Nombre maximum de résultats
+            filters: Filtres sur les métadonnées (valeur exacte ou liste de valeurs acceptées)
+            match_threshold: Similarité cosinus minimale
+
+        Returns:
+            Documents (id, content, metadata, similarity) par similarité décroissante
+        """
+        if not self.rows or limit <= 0:
+            return []
+        query = normalize(parse_embedding(query_embedding))
+
+        candidates = self._filter_rows(filters)
+        if candidates is not None and len(candidates) == 0:
+            return []
+
+        if self.mode == "flat":
+            if candidates is None:
+                scores = self.vectors[:self.size] @ query
+                scores[~self.alive[:self.size]] = -np.inf
+                candidates = np.arange(self.size)
+            else:
+                scores = self._score(candidates, query)
+        else:
+            if candidates is None or len(candidates) > FILTER_EXACT_SCAN_MAX:
+                # Listes IVF les plus proches de la requête
+                nprobe = min(self.nprobe, len(self.centroids))
+                probed = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+                in_probed = np.isin(self.assignment[:self.size], probed) & self.alive[:self.size]
+                if candidates is None:
+                    candidates = np.flatnonzero(in_probed)
+                else:
+                    candidates = candidates[in_probed[candidates]]
+            scores = self._score(candidates, query)
+
+        if match_threshold:
+            # Même comparaison stricte que match_documents (similarité > match_threshold)
+            scores = np.where(scores > match_threshold, scores, -np.inf)
+        k = min(limit, len(candidates))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        results = []
+        for i in top.tolist():
+            if not np.isfinite(scores[i]):
+                break
+            results.append(self._document(int(candidates[i]), similarity=float(scores[i])))
+        return results
+
+    async def query(self, query_embedding, filters=None, limit=5, match_threshold=0.0):
+        """Recherche après s'être assuré que l'index est chargé"""
+        await self.ensure_ready()
+        return self.search(query_embedding, limit=limit, filters=filters, match_threshold=match_threshold)
+
+    @property
+    def enabled(self) -> bool:
+        return VECTOR_INDEX_BACKEND == "local"
+
+
+# Instance partagée de l'index
+vector_index = LocalVectorIndex()
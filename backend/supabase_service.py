@@ -2,13 +2,12 @@
 Service pour gérer les interactions avec Supabase.
 Ce module fournit des fonctions pour interagir avec les tables Supabase.
 """
-from supabase import create_client
 import os
 from dotenv import load_dotenv
 import logging
+from services.container import container
 
 # Configuration du logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Chargement des variables d'environnement
@@ -19,15 +18,33 @@ SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
 
-# Création du client Supabase
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-supabase_admin = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+
+
+def _create_client(key):
+    from supabase import create_client
+
+    return create_client(SUPABASE_URL, key)
+
+
+# Clients Supabase, créés au premier appel
+_client = container.register("supabase_sync.default", lambda: _create_client(SUPABASE_KEY))
+_admin_client = container.register("supabase_sync.admin", lambda: _create_client(SUPABASE_SERVICE_KEY))
+
+
+def get_client():
+    """Client Supabase (clé anon)"""
+    return _client.get()
+
+
+def get_admin_client():
+    """Client Supabase avec la clé de service"""
+    return _admin_client.get()
 
 
 def get_user_tasks(user_id):
     """Récupère les tâches d'un utilisateur spécifique"""
     try:
-        response = supabase.table("tasks").select("*").eq("user_id", user_id).execute()
+        response = get_client().table("tasks").select("*").eq("user_id", user_id).execute()
         return response.data
     except Exception as e:
         logger.error(f"Erreur lors de la récupération des tâches: {e}")
@@ -37,7 +54,7 @@ def get_user_tasks(user_id):
 def add_task(task_data):
     """Ajoute une nouvelle tâche"""
     try:
-        response = supabase.table("tasks").insert(task_data).execute()
+        response = get_client().table("tasks").insert(task_data).execute()
         return response.data[0] if response.data else None
     except Exception as e:
         logger.error(f"Erreur lors de l'ajout d'une tâche: {e}")
@@ -47,7 +64,7 @@ def add_task(task_data):
 def update_task(task_id, task_data):
     """Met à jour une tâche existante"""
     try:
-        response = supabase.table("tasks").update(task_data).eq("id", task_id).execute()
+        response = get_client().table("tasks").update(task_data).eq("id", task_id).execute()
         return response.data[0] if response.data else None
     except Exception as e:
         logger.error(f"Erreur lors de la mise à jour d'une tâche: {e}")
@@ -57,7 +74,7 @@ def update_task(task_id, task_data):
 def delete_task(task_id):
     """Supprime une tâche"""
     try:
-        supabase.table("tasks").delete().eq("id", task_id).execute()
+        get_client().table("tasks").delete().eq("id", task_id).execute()
         return True
     except Exception as e:
         logger.error(f"Erreur lors de la suppression d'une tâche: {e}")
@@ -67,7 +84,7 @@ def delete_task(task_id):
 def get_user_categories(user_id):
     """Récupère les catégories d'un utilisateur spécifique"""
     try:
-        response = supabase.table("categories").select("*").eq("user_id", user_id).execute()
+        response = get_client().table("categories").select("*").eq("user_id", user_id).execute()
         return response.data
     except Exception as e:
         logger.error(f"Erreur lors de la récupération des catégories: {e}")
@@ -77,7 +94,7 @@ def get_user_categories(user_id):
 def add_category(category_data):
     """Ajoute une nouvelle catégorie"""
     try:
-        response = supabase.table("categories").insert(category_data).execute()
+        response = get_client().table("categories").insert(category_data).execute()
         return response.data[0] if response.data else None
     except Exception as e:
         logger.error(f"Erreur lors de l'ajout d'une catégorie: {e}")
@@ -87,7 +104,7 @@ def add_category(category_data):
 def delete_category(category_id):
     """Supprime une catégorie"""
     try:
-        supabase.table("categories").delete().eq("id", category_id).execute()
+        get_client().table("categories").delete().eq("id", category_id).execute()
         return True
     except Exception as e:
         logger.error(f"Erreur lors de la suppression d'une catégorie: {e}")
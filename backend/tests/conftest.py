@@ -0,0 +1,17 @@
+"""
+Configuration commune des tests: le dossier backend est importable et les services peuvent être
+importés sans configuration réelle (aucun client n'est créé à l'import).
+"""
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+for name, value in {
+    "SUPABASE_URL": "https://example.supabase.co",
+    "SUPABASE_KEY": "test",
+    "SUPABASE_SERVICE_KEY": "test",
+    "OPENAI_API_KEY": "test",
+}.items():
+    os.environ.setdefault(name, value)
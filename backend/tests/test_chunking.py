@@ -0,0 +1,49 @@
+"""
+Tests du découpage des documents (EmbeddingService.iter_chunks) avec un tokenizer caractère par
+caractère: la taille d'un chunk en tokens est alors exactement sa longueur.
+"""
+import random
+
+import pytest
+
+from services.embedding_service import EmbeddingService
+
+
+class CharTokenizer:
+    def encode(self, text):
+        return [ord(c) for c in text]
+
+    def decode(self, tokens):
+        return "".join(chr(t) for t in tokens)
+
+
+class CharEmbeddingService(EmbeddingService):
+    @property
+    def tokenizer(self):
+        return CharTokenizer()
+
+
+def random_document(rng):
+    paragraphs = []
+    for _ in range(rng.randint(1, 12)):
+        sentences = [
+            " ".join("x" * rng.randint(1, 12) for _ in range(rng.randint(1, 25))) + "."
+            for _ in range(rng.randint(1, 8))
+        ]
+        paragraphs.append(" ".join(sentences))
+    return "\n\n".join(paragraphs)
+
+
+@pytest.mark.parametrize("chunk_size,chunk_overlap", [(120, 30), (60, 0), (200, 80)])
+def test_chunks_never_exceed_chunk_size(chunk_size, chunk_overlap):
+    service = CharEmbeddingService(api_key="test")
+    service.chunk_size, service.chunk_overlap = chunk_size, chunk_overlap
+    rng = random.Random(chunk_size)
+
+    for _ in range(200):
+        document = random_document(rng)
+        chunks = list(service.iter_chunks(document))
+        assert chunks
+        for chunk in chunks:
+            assert len(chunk["content"]) <= chunk_size, chunk["content"]
+        assert [chunk["metadata"]["chunk_index"] for chunk in chunks] == list(range(len(chunks)))
@@ -0,0 +1,59 @@
+"""
+Tests du contexte des conversations: un message sorti de la fenêtre récente reste dans l'historique
+tant qu'il n'est pas résumé, et un résumé concurrent n'écrase pas celui d'un autre worker.
+"""
+from datetime import datetime, timedelta, timezone
+
+from services import context_builder
+from services.context_builder import HISTORY_WINDOW, SUMMARY_MIN_BATCH, refresh_summary, unsummarized_messages
+from services.supabase_service import supabase_service
+
+START = datetime(2026, 10, 17, 12, 0, tzinfo=timezone.utc)
+
+
+def messages(count):
+    return [
+        {"id": str(i), "role": "user" if i % 2 == 0 else "assistant", "content": f"message {i}",
+         "created_at": (START + timedelta(seconds=i)).isoformat()}
+        for i in range(count)
+    ]
+
+
+def test_messages_waiting_for_a_summary_stay_in_the_history():
+    history = messages(HISTORY_WINDOW + SUMMARY_MIN_BATCH + 20)
+    summarized = 20
+    summarized_until = history[summarized - 1]["created_at"]
+
+    kept = unsummarized_messages(history, summarized_until)
+
+    # Les messages sortis de la fenêtre sans atteindre un lot de résumé sont conservés
+    assert kept == history[summarized:]
+    assert len(kept) == HISTORY_WINDOW + SUMMARY_MIN_BATCH
+    assert unsummarized_messages(history, None) == history
+
+
+async def test_concurrent_summary_does_not_overwrite(monkeypatch):
+    conversation = {"id": "c", "summary": None, "summarized_until": None}
+    stored = dict(conversation)
+    history = messages(HISTORY_WINDOW + SUMMARY_MIN_BATCH)
+
+    async def get_messages_to_summarize(conversation_id, after=None, keep_recent=10, limit=50):
+        return history[:SUMMARY_MIN_BATCH]
+
+    async def chat(messages, **kwargs):
+        # Un autre worker enregistre son résumé pendant l'appel au modèle
+        stored.update({"summary": "résumé concurrent", "summarized_until": history[SUMMARY_MIN_BATCH - 1]["created_at"]})
+        return "résumé"
+
+    async def update_conversation_summary(conversation_id, summary, summarized_until, previous_summarized_until=None):
+        if stored["summarized_until"] != previous_summarized_until:
+            return None
+        stored.update({"summary": summary, "summarized_until": summarized_until})
+        return dict(stored)
+
+    monkeypatch.setattr(supabase_service, "get_messages_to_summarize", get_messages_to_summarize)
+    monkeypatch.setattr(supabase_service, "update_conversation_summary", update_conversation_summary)
+    monkeypatch.setattr(context_builder.llm_gateway, "chat", chat)
+
+    assert await refresh_summary(conversation) is None
+    assert stored["summary"] == "résumé concurrent"
@@ -0,0 +1,190 @@
+"""
+Tests des index en mémoire de la table documents. Synchronisation: une écriture validée
+après une synchronisation, avec un updated_at antérieur au curseur, finit dans l'index.
+Filtres: égalité des valeurs texte (metadata->>'clé'), comme le RPC match_documents_filtered.
+Entretien: chargement au démarrage et synchronisation en fond, jamais sur le chemin d'une recherche.
+"""
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from services import document_index
+from services.document_index import DocumentIndex
+from services.supabase_service import supabase_service
+
+START = datetime(2026, 10, 17, 12, 0, tzinfo=timezone.utc)
+
+
+class RowsIndex(DocumentIndex):
+    """Index minimal: seules les lignes de la classe de base"""
+
+    def build(self, documents):
+        self._reset_documents()
+        self.upsert(documents)
+
+    def upsert(self, documents):
+        for doc in documents:
+            row = self.rows.get(str(doc["id"]))
+            if row is None:
+                row = len(self.ids)
+            else:
+                self._unindex_metadata(row)
+            self._set_row_fields(row, doc)
+
+    def remove(self, document_ids):
+        for doc_id in document_ids:
+            self._release_row(doc_id)
+
+
+@pytest.fixture
+def table(monkeypatch):
+    """Table documents simulée: liste de lignes validées, lues par pages keyset (updated_at, id)"""
+    rows = []
+
+    def sort_key(doc):
+        return datetime.fromisoformat(doc["updated_at"]), doc["id"]
+
+    async def get_documents_page(limit=1000, cursor=None, fields=None):
+        ordered = sorted(rows, key=sort_key)
+        if cursor:
+            after = (datetime.fromisoformat(cursor["updated_at"]), str(cursor["id"]))
+            ordered = [doc for doc in ordered if sort_key(doc) > after]
+        page = [dict(doc) for doc in ordered[:limit]]
+        next_cursor = {"updated_at": page[-1]["updated_at"], "id": page[-1]["id"]} if page else cursor
+        return page, next_cursor
+
+    async def get_documents_by_ids(document_ids, fields=None):
+        wanted = set(document_ids)
+        return [dict(doc) for doc in rows if doc["id"] in wanted]
+
+    monkeypatch.setattr(supabase_service, "get_documents_page", get_documents_page)
+    monkeypatch.setattr(supabase_service, "get_documents_by_ids", get_documents_by_ids)
+    monkeypatch.setattr(document_index, "SYNC_OVERLAP", 30)
+    return rows
+
+
+def commit(rows, seconds, content):
+    doc_id = str(uuid.uuid4())
+    updated_at = (START + timedelta(seconds=seconds)).isoformat()
+    rows.append({"id": doc_id, "content": content, "metadata": {}, "updated_at": updated_at})
+    return doc_id
+
+
+async def test_sync_reads_late_commits_within_overlap(table):
+    commit(table, 0, "initial")
+    index = RowsIndex()
+    await index.load()
+
+    commit(table, 100, "sync")
+    await index.sync()
+    # Transaction commencée avant la synchronisation précédente, validée après
+    late = commit(table, 90, "en retard")
+    await index.sync()
+
+    assert late in index.rows
+    assert len(index) == 3
+
+
+async def test_sync_cursor_does_not_drift_back_on_empty_pages(table):
+    commit(table, 0, "initial")
+    index = RowsIndex()
+    await index.load()
+    cursor = index._cursor
+
+    for _ in range(5):
+        await index.sync()
+
+    assert index._cursor == cursor
+
+
+async def test_reconcile_adds_commits_older_than_overlap(table):
+    commit(table, 0, "initial")
+    index = RowsIndex()
+    await index.load()
+    commit(table, 500, "sync")
+    await index.sync()
+
+    very_late = commit(table, 100, "transaction longue")
+    deleted = next(doc for doc in table if doc["content"] == "initial")
+    table.remove(deleted)
+    await index.sync()
+    assert very_late not in index.rows
+
+    await index.reconcile()
+    assert very_late in index.rows
+    assert deleted["id"] not in index.rows
+
+
+def test_filters_compare_text_values():
+    index = RowsIndex()
+    index.build([
+        {"id": "a", "content": "", "metadata": {"page": "42", "draft": False}},
+        {"id": "b", "content": "", "metadata": {"page": 42, "draft": "false"}},
+        {"id": "c", "content": "", "metadata": {"page": 7}},
+    ])
+
+    assert list(index._filter_rows({"page": 42})) == [0, 1]
+    assert list(index._filter_rows({"page": ["42", 7]})) == [0, 1, 2]
+    assert list(index._filter_rows({"draft": False})) == [0, 1]
+    assert list(index._filter_rows({"page": []})) == []
+
+
+@pytest.mark.parametrize("filters", [{"page": {"gt": 3}}, {"page": None}, {"page": [1, [2]]}])
+async def test_non_scalar_filters_are_rejected(filters):
+    with pytest.raises(ValueError):
+        document_index.metadata_filter_values(filters)
+    with pytest.raises(ValueError):
+        await supabase_service.search_documents([0.0] * 1536, filters)
+
+
+async def test_search_path_never_waits_for_index_upkeep(table, monkeypatch):
+    commit(table, 0, "initial")
+    index = RowsIndex()
+    monkeypatch.setattr(document_index, "SYNC_INTERVAL", 3600)
+    await index.start()
+    try:
+        assert index.loaded and len(index) == 1
+
+        reads = []
+        original = supabase_service.get_documents_page
+
+        async def counting_page(*args, **kwargs):
+            reads.append(args)
+            return await original(*args, **kwargs)
+
+        monkeypatch.setattr(supabase_service, "get_documents_page", counting_page)
+        index._last_sync = index._last_reconcile = 0.0
+        await index.ensure_ready()
+        # La synchronisation due est laissée à la tâche de fond
+        assert reads == []
+    finally:
+        await index.stop()
+
+
+async def test_unloaded_index_is_reported_to_the_caller(table, monkeypatch):
+    async def failing_page(*args, **kwargs):
+        raise RuntimeError("base indisponible")
+
+    monkeypatch.setattr(supabase_service, "get_documents_page", failing_page)
+    monkeypatch.setattr(document_index, "SYNC_INTERVAL", 3600)
+    index = RowsIndex()
+    await index.start()
+    try:
+        with pytest.raises(RuntimeError):
+            await index.ensure_ready()
+    finally:
+        await index.stop()
+
+
+def test_local_vector_threshold_is_strict_like_match_documents():
+    from services.vector_index import LocalVectorIndex
+
+    index = LocalVectorIndex()
+    index.build([
+        {"id": "a", "content": "", "metadata": {}, "embedding": [1.0, 0.0]},
+        {"id": "b", "content": "", "metadata": {}, "embedding": [0.6, 0.8]},
+    ])
+
+    results = index.search([1.0, 0.0], limit=5, match_threshold=0.6)
+    assert [doc["id"] for doc in results] == ["a"]
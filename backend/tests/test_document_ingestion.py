@@ -0,0 +1,92 @@
+"""
+Tests de la réservation d'une ingestion (DocumentIngestionService.prepare): de deux envois
+simultanés du même document, un seul obtient la progression, l'autre reçoit IngestionInProgress.
+"""
+import asyncio
+
+import pytest
+
+from services.document_ingestion import DocumentIngestionService, IngestionInProgress
+from services.supabase_service import supabase_service
+
+
+@pytest.fixture
+def ingestions(monkeypatch):
+    """Table document_ingestions simulée, chaque requête rendant la main à la boucle comme un appel réseau"""
+    rows = {}
+    deleted = []
+
+    async def get_document_ingestion(document_key):
+        await asyncio.sleep(0)
+        row = rows.get(document_key)
+        return dict(row) if row else None
+
+    async def claim_document_ingestion(ingestion_data):
+        await asyncio.sleep(0)
+        if ingestion_data["document_key"] in rows:
+            return None
+        rows[ingestion_data["document_key"]] = dict(ingestion_data)
+        return dict(ingestion_data)
+
+    async def take_over_document_ingestion(document_key, expected_updated_at, ingestion_data):
+        await asyncio.sleep(0)
+        row = rows.get(document_key)
+        if row is None or row["updated_at"] != expected_updated_at:
+            return None
+        row.update(ingestion_data)
+        return dict(row)
+
+    async def delete_documents_by_key(document_key):
+        deleted.append(document_key)
+        return True
+
+    monkeypatch.setattr(supabase_service, "get_document_ingestion", get_document_ingestion)
+    monkeypatch.setattr(supabase_service, "claim_document_ingestion", claim_document_ingestion)
+    monkeypatch.setattr(supabase_service, "take_over_document_ingestion", take_over_document_ingestion)
+    monkeypatch.setattr(supabase_service, "delete_documents_by_key", delete_documents_by_key)
+    return rows, deleted
+
+
+async def prepare_concurrently(source_hashes):
+    service = DocumentIngestionService()
+    return await asyncio.gather(
+        *(service.prepare("doc", source_hash) for source_hash in source_hashes),
+        return_exceptions=True,
+    )
+
+
+async def test_concurrent_new_uploads_claim_the_key_once(ingestions):
+    results = await prepare_concurrently(["a", "b"])
+
+    assert sum(isinstance(result, dict) for result in results) == 1
+    assert sum(isinstance(result, IngestionInProgress) for result in results) == 1
+
+
+@pytest.mark.parametrize("source_hashes", [["old", "old"], ["new", "new"], ["old", "new"]])
+async def test_concurrent_retries_take_over_a_failed_ingestion_once(ingestions, source_hashes):
+    rows, deleted = ingestions
+    rows["doc"] = {
+        "document_key": "doc", "source_hash": "old", "status": "failed",
+        "chunks_committed": 3, "updated_at": "2026-10-17T12:00:00+00:00",
+    }
+
+    results = await prepare_concurrently(source_hashes)
+
+    winners = [result for result in results if isinstance(result, dict)]
+    assert len(winners) == 1
+    assert winners[0]["status"] == "pending"
+    assert sum(isinstance(result, IngestionInProgress) for result in results) == 1
+    assert len(deleted) == (winners[0]["source_hash"] != "old")
+
+
+async def test_completed_ingestion_of_same_file_is_returned(ingestions):
+    rows, deleted = ingestions
+    rows["doc"] = {
+        "document_key": "doc", "source_hash": "a", "status": "completed",
+        "chunks_committed": 3, "updated_at": "2026-10-17T12:00:00+00:00",
+    }
+
+    result = await DocumentIngestionService().prepare("doc", "a")
+
+    assert result["status"] == "completed"
+    assert not deleted
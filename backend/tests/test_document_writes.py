@@ -0,0 +1,117 @@
+"""
+Tests de l'écriture des documents (SupabaseService.upsert_documents_page) sur une table documents
+créée sans la colonne content_hash ou sans son index unique: repli sur des insertions simples.
+Au format compact, embedding_packed n'est pas conservé mais l'embedding écrit reste indexé.
+"""
+from types import SimpleNamespace
+
+import httpx
+import numpy as np
+import pytest
+from postgrest.exceptions import APIError
+
+from services import vector_codec
+from services.supabase_service import SupabaseService, supabase_service
+
+
+class FakeDocumentsTable:
+    """Table documents simulée, avec ou sans colonne et index unique content_hash"""
+
+    def __init__(self, has_column, has_unique_index):
+        self.has_column = has_column
+        self.has_unique_index = has_unique_index
+        self.rows = []
+        self.requests = []
+
+    def table(self, name):
+        assert name == "documents"
+        return self
+
+    def upsert(self, rows, on_conflict=""):
+        return self._query("upsert", rows, on_conflict)
+
+    def insert(self, rows):
+        return self._query("insert", rows, None)
+
+    def _query(self, method, rows, on_conflict):
+        async def execute():
+            self.requests.append(method)
+            if any("content_hash" in row for row in rows) and not self.has_column:
+                raise APIError({"code": "PGRST204", "message": "Could not find the 'content_hash' column of 'documents'"})
+            if on_conflict and not self.has_unique_index:
+                raise APIError({"code": "42P10", "message": "there is no unique or exclusion constraint matching the ON CONFLICT specification"})
+            stored = [{"id": str(len(self.rows) + i), **self._trigger(row)} for i, row in enumerate(rows)]
+            self.rows.extend(stored)
+            columns = query.params.get("select")
+            if columns:
+                return SimpleNamespace(data=[{key: row[key] for key in columns.split(",") if key in row} for row in stored])
+            return SimpleNamespace(data=stored)
+
+        query = SimpleNamespace(execute=execute, params=httpx.QueryParams())
+        return query
+
+    @staticmethod
+    def _trigger(row):
+        """Comme documents_set_embedding: embedding_packed est décodé dans embedding, puis vidé"""
+        row = dict(row)
+        packed = row.pop("embedding_packed", None)
+        if packed is not None:
+            row["embedding"] = vector_codec.decode_embedding(packed).tolist()
+        return {**row, "embedding_packed": None}
+
+
+@pytest.fixture
+def documents_table(monkeypatch):
+    def install(has_column, has_unique_index):
+        fake = FakeDocumentsTable(has_column, has_unique_index)
+        monkeypatch.setattr(SupabaseService, "supabase", property(lambda self: fake))
+        monkeypatch.setattr(supabase_service, "_documents_write_mode", "upsert")
+        return fake
+
+    return install
+
+
+DOCUMENTS = [{"content": "texte", "metadata": {"source": "test"}, "embedding": [0.0] * 4}]
+
+
+@pytest.mark.parametrize("has_column,has_unique_index,mode", [
+    (True, True, "upsert"),
+    (True, False, "insert"),
+    (False, False, "insert_without_hash"),
+])
+async def test_documents_are_written_whatever_the_schema(documents_table, has_column, has_unique_index, mode):
+    table = documents_table(has_column, has_unique_index)
+
+    assert len(await supabase_service.upsert_documents_page(DOCUMENTS)) == 1
+    first_page_requests = len(table.requests)
+    assert len(await supabase_service.upsert_documents_page(DOCUMENTS)) == 1
+
+    assert supabase_service._documents_write_mode == mode
+    # Le mode d'écriture est retenu: la seconde page est écrite en une requête
+    assert table.requests[first_page_requests:] == ["upsert" if mode == "upsert" else "insert"]
+
+
+async def test_other_errors_are_raised(documents_table, monkeypatch):
+    table = documents_table(True, True)
+
+    async def failing(rows):
+        raise APIError({"code": "23502", "message": "null value in column \"content\""})
+
+    monkeypatch.setattr(supabase_service, "_write_documents", failing)
+    with pytest.raises(APIError):
+        await supabase_service.upsert_documents_page(DOCUMENTS)
+    assert supabase_service._documents_write_mode == "upsert"
+    assert not table.rows
+
+
+async def test_compact_embeddings_are_indexed_without_being_stored(documents_table, monkeypatch):
+    table = documents_table(True, True)
+    monkeypatch.setattr(vector_codec, "EMBEDDING_STORAGE_FORMAT", "float16")
+    documents = [{**DOCUMENTS[0], "embedding": [0.5, -0.25, 0.0, 1.0]}]
+
+    written = await supabase_service.upsert_documents_page(documents)
+
+    assert table.rows[0]["embedding_packed"] is None
+    assert table.rows[0]["embedding"] == [0.5, -0.25, 0.0, 1.0]
+    # L'embedding n'est pas renvoyé par la base: celui envoyé est repris pour l'index
+    assert np.array_equal(vector_codec.decode_embedding(written[0]["embedding"]), [0.5, -0.25, 0.0, 1.0])
@@ -0,0 +1,73 @@
+"""
+Tests du niveau disque du cache des embeddings partagé entre workers: chaque DiskTier a son
+propre index des emplacements, comme un worker uvicorn, sur les mêmes fichiers.
+"""
+import multiprocessing
+
+import numpy as np
+
+from services.embedding_cache import DiskTier, embedding_key
+
+DIMENSION = 8
+
+
+def vector_for(text):
+    return np.full(DIMENSION, float(len(text)), dtype=np.float32)
+
+
+def write_keys(directory, texts):
+    disk = DiskTier(directory, DIMENSION, max_entries=64)
+    for text in texts:
+        disk.put(embedding_key("model", text), vector_for(text))
+    disk.flush()
+
+
+def test_reused_slot_is_not_returned_for_another_text(tmp_path):
+    first = DiskTier(str(tmp_path), DIMENSION)
+    second = DiskTier(str(tmp_path), DIMENSION)
+    key_a, key_b = embedding_key("model", "a"), embedding_key("model", "bb")
+
+    first.put(key_a, vector_for("a"))
+    # Le second worker ne connaît pas l'emplacement de "a": il ne doit pas l'écraser
+    second.put(key_b, vector_for("bb"))
+
+    assert np.array_equal(first.get(key_a), vector_for("a"))
+    assert np.array_equal(second.get(key_b), vector_for("bb"))
+    assert np.array_equal(second.get(key_a), vector_for("a"))
+
+
+def test_stale_index_entry_is_a_miss(tmp_path):
+    first = DiskTier(str(tmp_path), DIMENSION, max_entries=4)
+    second = DiskTier(str(tmp_path), DIMENSION, max_entries=4)
+    key_a = embedding_key("model", "a")
+    first.put(key_a, vector_for("a"))
+
+    # Le second worker remplit le cache et évince l'entrée du premier
+    for i in range(8):
+        second.put(embedding_key("model", "x" * (i + 2)), vector_for("x" * (i + 2)))
+
+    vector = first.get(key_a)
+    assert vector is None or np.array_equal(vector, vector_for("a"))
+
+
+def test_concurrent_workers_never_read_another_text(tmp_path):
+    texts = [f"texte {i} " + "x" * i for i in range(200)]
+    context = multiprocessing.get_context("fork")
+    workers = [
+        context.Process(target=write_keys, args=(str(tmp_path), texts[i::2] + texts[:20]))
+        for i in range(2)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    reader = DiskTier(str(tmp_path), DIMENSION, max_entries=64)
+    hits = 0
+    for text in texts:
+        vector = reader.get(embedding_key("model", text))
+        if vector is not None:
+            hits += 1
+            assert np.array_equal(vector, vector_for(text)), text
+    assert hits > 0
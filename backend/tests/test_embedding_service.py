@@ -0,0 +1,62 @@
+"""
+Tests de EmbeddingService.get_embeddings: la tokenisation et les accès au cache (disque compris)
+se font dans un thread, hors de la boucle d'événements.
+"""
+import threading
+
+from services import embedding_service as embedding_module
+from services.embedding_cache import EmbeddingCache
+from services.embedding_service import EmbeddingService
+from services.llm_gateway import llm_gateway
+
+
+class RecordingTokenizer:
+    def __init__(self, threads):
+        self.threads = threads
+
+    def encode(self, text):
+        self.threads.append(threading.get_ident())
+        return [ord(c) for c in text]
+
+    def decode(self, tokens):
+        return "".join(chr(t) for t in tokens)
+
+
+async def test_tokenization_and_cache_run_off_the_event_loop(tmp_path, monkeypatch):
+    threads = []
+    cache = EmbeddingCache(directory=str(tmp_path))
+    cache_threads = []
+    original_get, original_put = cache.get, cache.put
+
+    def get(model, text):
+        cache_threads.append(threading.get_ident())
+        return original_get(model, text)
+
+    def put(model, text, embedding):
+        cache_threads.append(threading.get_ident())
+        original_put(model, text, embedding)
+
+    monkeypatch.setattr(cache, "get", get)
+    monkeypatch.setattr(cache, "put", put)
+    monkeypatch.setattr(embedding_module, "embedding_cache", cache)
+
+    async def embeddings(inputs, model):
+        return [[float(len(text)), 1.0] for text in inputs]
+
+    monkeypatch.setattr(llm_gateway, "embeddings", embeddings)
+
+    class Service(EmbeddingService):
+        @property
+        def tokenizer(self):
+            return RecordingTokenizer(threads)
+
+    service = Service(api_key="test")
+    loop_thread = threading.get_ident()
+
+    first = await service.get_embeddings(["un", "deux", "un"])
+    second = await service.get_embeddings(["deux"])
+
+    assert first == [[2.0, 1.0], [4.0, 1.0], [2.0, 1.0]]
+    assert second == [[4.0, 1.0]]
+    assert threads and loop_thread not in threads
+    assert cache_threads and loop_thread not in cache_threads
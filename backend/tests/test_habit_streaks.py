@@ -0,0 +1,175 @@
+"""
+Tests des streaks d'habitudes: la mise à jour incrémentale (advance_streak), appliquée complétion
+par complétion, doit toujours produire le même état que le recalcul complet (compute_streak_state),
+et complete_habit ne doit modifier l'état qu'après l'écriture de la complétion.
+"""
+import random
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from services.habit_streaks import (
+    STREAK_MAX_GAP_DAYS,
+    EMPTY_STREAK_STATE,
+    advance_streak,
+    compute_habits_streaks,
+    compute_streak_state,
+    current_streak,
+)
+from services.habits_service import habits_service
+from services.supabase_service import supabase_service
+
+HISTORIES_PER_SEED = 25
+
+
+def random_history(rng):
+    """Historique de complétions trié (doublons le même jour, trous de 0 à 10 jours, avec ou sans heure)"""
+    current = datetime(2020, 1, 1) + timedelta(days=rng.randint(0, 1000))
+    history = []
+    for _ in range(rng.randint(0, 60)):
+        current += timedelta(days=rng.choice([0, 0, 1, 1, 1, 2, 3, rng.randint(4, 10)]),
+                             hours=rng.randint(0, 3))
+        history.append(current.isoformat() if rng.random() < 0.5 else current.date().isoformat())
+    return history
+
+
+def fold(history):
+    state = dict(EMPTY_STREAK_STATE)
+    for completion_date in history:
+        state = advance_streak(state, completion_date)
+    return state
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_incremental_state_matches_full_recompute(seed):
+    rng = random.Random(seed)
+    for _ in range(HISTORIES_PER_SEED):
+        history = random_history(rng)
+        assert fold(history) == compute_streak_state(history), history
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_current_streak_matches_vectorized_statistics(seed):
+    rng = random.Random(seed)
+    for _ in range(HISTORIES_PER_SEED):
+        history = random_history(rng)
+        reference_date = date(2020, 1, 1) + timedelta(days=rng.randint(0, 1500))
+        history = [d for d in history if datetime.fromisoformat(d).date() <= reference_date]
+        stats = compute_habits_streaks(
+            ({"habit_id": 1, "completion_date": d} for d in history), [1], window_days=30,
+            reference_date=reference_date
+        )[1]
+        state = fold(history)
+        assert current_streak(state, reference_date) == stats["current_streak"], (history, reference_date)
+        assert state["longest_streak"] == stats["longest_streak"]
+
+
+def test_current_streak_resets_after_gap():
+    today = date(2026, 10, 17)
+    history = [(today - timedelta(days=days)).isoformat() for days in (40, 39, 38)]
+    state = compute_streak_state(history)
+
+    assert state["streak"] == 3
+    assert current_streak(state, today) == 0
+    assert current_streak(state, today - timedelta(days=38 - STREAK_MAX_GAP_DAYS)) == 3
+    stats = compute_habits_streaks(
+        ({"habit_id": 1, "completion_date": d} for d in history), [1], window_days=60, reference_date=today
+    )[1]
+    assert (stats["current_streak"], stats["longest_streak"]) == (0, 3)
+
+
+@pytest.fixture
+def habit_store(monkeypatch):
+    """Tables habits et habit_completions simulées en mémoire"""
+    store = {"habit": {"id": 1, "name": "Lecture", **EMPTY_STREAK_STATE}, "completions": [], "writes": []}
+
+    async def get_habit_by_id(habit_id):
+        return dict(store["habit"])
+
+    async def add_habit_completion(completion):
+        store["writes"].append("completion")
+        store["completions"].append(completion)
+        return completion
+
+    async def update_habit_streak(habit_id, streak_state, previous_state):
+        store["writes"].append("streak")
+        if any(store["habit"].get(c) != previous_state.get(c) for c in ("last_completion_date", "completion_count")):
+            return None
+        store["habit"].update(streak_state)
+        return dict(store["habit"])
+
+    async def get_habit_completions(habit_id):
+        return list(store["completions"])
+
+    async def update_habit(habit_id, data):
+        store["writes"].append("recompute")
+        store["habit"].update(data)
+        return dict(store["habit"])
+
+    monkeypatch.setattr(supabase_service, "get_habit_by_id", get_habit_by_id)
+    monkeypatch.setattr(supabase_service, "add_habit_completion", add_habit_completion)
+    monkeypatch.setattr(supabase_service, "update_habit_streak", update_habit_streak)
+    monkeypatch.setattr(supabase_service, "get_habit_completions", get_habit_completions)
+    monkeypatch.setattr(supabase_service, "update_habit", update_habit)
+    return store
+
+
+async def test_complete_habit_writes_completion_before_streak(habit_store):
+    result = await habits_service.complete_habit(1, "user")
+
+    assert habit_store["writes"] == ["completion", "streak"]
+    assert result["streak"]["current_streak"] == 1
+    assert habit_store["habit"]["completion_count"] == 1
+
+
+async def test_complete_habit_keeps_streak_when_completion_fails(habit_store, monkeypatch):
+    async def failing_completion(completion):
+        raise RuntimeError("insert failed")
+
+    monkeypatch.setattr(supabase_service, "add_habit_completion", failing_completion)
+    with pytest.raises(RuntimeError):
+        await habits_service.complete_habit(1, "user")
+
+    assert habit_store["writes"] == []
+    assert habit_store["habit"]["completion_count"] == 0
+
+
+async def test_complete_habit_recomputes_when_state_changed_concurrently(habit_store, monkeypatch):
+    yesterday = (date.today() - timedelta(days=1)).isoformat()
+    habit_store["completions"].append({"habit_id": 1, "completion_date": yesterday})
+    read_state = dict(habit_store["habit"])
+    # Une autre requête a enregistré la complétion d'hier entre la lecture et l'écriture
+    habit_store["habit"].update(compute_streak_state([yesterday]))
+
+    async def get_stale_habit(habit_id):
+        return dict(read_state)
+
+    monkeypatch.setattr(supabase_service, "get_habit_by_id", get_stale_habit)
+    result = await habits_service.complete_habit(1, "user")
+
+    assert habit_store["writes"] == ["completion", "streak", "recompute"]
+    assert result["streak"]["current_streak"] == 2
+    assert habit_store["habit"]["completion_count"] == 2
+
+
+async def test_detailed_stats_take_streaks_from_full_history(monkeypatch):
+    today = date.today()
+    history = [(today - timedelta(days=offset)).isoformat() for offset in range(30)]
+    habit = {"id": 1, "name": "Lecture", "user_id": "user", **compute_streak_state(history)}
+
+    async def get_user_habits(user_id):
+        return [dict(habit)]
+
+    async def get_completions_for_habits(habit_ids, since=None):
+        return [
+            {"habit_id": 1, "completion_date": day}
+            for day in history if datetime.fromisoformat(day) >= since.replace(hour=0, minute=0, second=0, microsecond=0)
+        ]
+
+    monkeypatch.setattr(supabase_service, "get_user_habits", get_user_habits)
+    monkeypatch.setattr(supabase_service, "get_completions_for_habits", get_completions_for_habits)
+    stats = await habits_service.get_detailed_habit_stats("user", "week")
+
+    assert stats["streaks"][0]["current_streak"] == 30
+    assert stats["streaks"][0]["longest_streak"] == 30
+    assert stats["streaks"][0]["completion_rate"] == 1.0
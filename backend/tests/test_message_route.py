@@ -0,0 +1,64 @@
+"""
+Tests de POST /api/messages: le message utilisateur est enregistré pendant l'appel au modèle,
+la réponse dans une écriture séparée, et aucun des deux n'est perdu si une écriture échoue.
+"""
+import asyncio
+
+import pytest
+
+from routes import ai_agents
+from services.supabase_service import supabase_service
+
+DATA = {"conversation_id": "c", "content": "Bonjour"}
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    """Conversation, agent et table messages simulés; journal des événements dans l'ordre"""
+    state = {"events": [], "fail_user_write": False, "saved": []}
+
+    async def get_conversation_with_agent(conversation_id):
+        return {"id": conversation_id, "agent_id": "a"}, {"id": "a", "prompt": "Tu es un assistant."}
+
+    async def get_recent_messages(conversation_id, limit=10):
+        return []
+
+    async def add_messages(messages):
+        roles = [message["role"] for message in messages]
+        state["events"].append(("write", roles))
+        await asyncio.sleep(0)
+        if roles == ["user"] and state["fail_user_write"]:
+            return []
+        state["saved"].extend(messages)
+        return messages
+
+    async def generate_response(**kwargs):
+        state["events"].append(("llm", "start"))
+        await asyncio.sleep(0.01)
+        state["events"].append(("llm", "end"))
+        return "Réponse"
+
+    monkeypatch.setattr(supabase_service, "get_conversation_with_agent", get_conversation_with_agent)
+    monkeypatch.setattr(supabase_service, "get_recent_messages", get_recent_messages)
+    monkeypatch.setattr(supabase_service, "add_messages", add_messages)
+    monkeypatch.setattr(ai_agents, "generate_response", generate_response)
+    monkeypatch.setattr(ai_agents, "schedule_summary_refresh", lambda conversation: None)
+    return state
+
+
+async def test_user_message_is_written_during_generation(backend):
+    result = await ai_agents.add_message(dict(DATA))
+
+    assert backend["events"].index(("write", ["user"])) < backend["events"].index(("llm", "end"))
+    assert backend["events"][-1] == ("write", ["assistant"])
+    assert result["user_message"]["role"] == "user"
+    assert result["assistant_message"]["content"] == "Réponse"
+
+
+async def test_failed_user_write_is_retried_with_the_reply(backend):
+    backend["fail_user_write"] = True
+
+    result = await ai_agents.add_message(dict(DATA))
+
+    assert [message["role"] for message in backend["saved"]] == ["user", "assistant"]
+    assert result["user_message"]["content"] == "Bonjour"
@@ -0,0 +1,42 @@
+"""
+Tests de GET /api/tasks: une requête sans limit ni cursor lit une seule page de TASKS_PAGE_SIZE
+tâches, et une erreur de la base donne une 500 plutôt qu'une liste tronquée.
+"""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routes import todos
+from services.supabase_service import supabase_service
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(todos.router, prefix="/api")
+    return TestClient(app)
+
+
+def test_default_request_reads_one_page(client, monkeypatch):
+    calls = []
+
+    async def get_tasks_page(limit=100, cursor=None, fields=None, filters=None):
+        calls.append((limit, cursor))
+        return [{"id": 1, "created_at": "2026-10-17T12:00:00+00:00"}], {"created_at": "2026-10-17T12:00:00+00:00", "id": 1}
+
+    monkeypatch.setattr(supabase_service, "get_tasks_page", get_tasks_page)
+    response = client.get("/api/tasks")
+
+    assert response.status_code == 200
+    assert calls == [(todos.TASKS_PAGE_SIZE, None)]
+    assert response.json()["next_cursor"]
+
+
+def test_database_error_is_a_500(client, monkeypatch):
+    async def get_tasks_page(**kwargs):
+        raise RuntimeError("connexion perdue")
+
+    monkeypatch.setattr(supabase_service, "get_tasks_page", get_tasks_page)
+    response = client.get("/api/tasks")
+
+    assert response.status_code == 500
@@ -20,7 +20,8 @@ function App() {
   const [sidebarOpen, setSidebarOpen] = useState(false); // Pour mobile
   const [loading, setLoading] = useState(true);
   
-  // Fonction pour charger les tâches depuis l'API
+  // Fonction pour charger les tâches depuis l'API (première page: les plus récentes;
+  // la liste complète est parcourue page par page via next_cursor dans la page Tâches)
   const loadTasks = async () => {
     console.log('🔄 [Frontend] Chargement des tâches depuis /api/tasks...');
     try {
@@ -73,7 +73,7 @@ const ApiTest = () => {
       results.push({
         test: 'Liste des tâches',
         status: '✅ Succès',
-        data: `${allTasksResponse.data?.length || 0} tâches dans la base`
+        data: `${allTasksResponse.data?.tasks?.length || 0} tâches (première page)`
       });
     } catch (error) {
       results.push({
@@ -4,6 +4,7 @@ import { themeService } from '../services/api';
 
 const Tasks = () => {
   const [tasks, setTasks] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null); // Curseur de la page suivante (null: dernière page)
   const [isLoading, setIsLoading] = useState(false);
   const [error, setError] = useState(null);
   const [filter, setFilter] = useState('all'); // 'all', 'active', 'completed'
@@ -29,20 +30,26 @@ const Tasks = () => {
     fetchTasks();
   }, []);
 
-  const fetchTasks = async () => {
+  // Première page des tâches, ou page suivante (ajoutée à la liste) si un curseur est fourni
+  const fetchTasks = async (cursor = null) => {
     setIsLoading(true);
     setError(null);
     try {
-      const response = await fetch('/api/tasks');
+      const url = cursor ? `/api/tasks?cursor=${encodeURIComponent(cursor)}` : '/api/tasks';
+      const response = await fetch(url);
       if (response.ok) {
         const data = await response.json();
-        setTasks(data.tasks || []);
+        setTasks(prevTasks => cursor ? [...prevTasks, ...(data.tasks || [])] : (data.tasks || []));
+        setNextCursor(data.next_cursor || null);
       } else {
         throw new Error('Erreur lors du chargement');
       }
     } catch (err) {
       setError('Erreur lors du chargement des tâches.');
-      setTasks([]);
+      if (!cursor) {
+        setTasks([]);
+        setNextCursor(null);
+      }
     } finally {
       setIsLoading(false);
     }
@@ -391,6 +398,19 @@ const Tasks = () => {
             </div>
           )}
           
+          {/* Page suivante */}
+          {nextCursor && (
+            <div className="mt-4 flex justify-center">
+              <button
+                className="px-4 py-2 text-sm font-medium text-gray-700 bg-white border border-gray-300 rounded-md hover:bg-gray-50 disabled:opacity-50"
+                onClick={() => fetchTasks(nextCursor)}
+                disabled={isLoading}
+              >
+                {isLoading ? 'Chargement...' : 'Charger plus de tâches'}
+              </button>
+            </div>
+          )}
+          
           {/* Bouton d'ajout */}
           <div className="mt-8 flex justify-center">
             <button 